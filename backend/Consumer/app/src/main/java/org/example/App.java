@@ -60,7 +60,7 @@ public class App {
                                 String username = message.getUsername();
 
                                 // Enviar dados para a API Flask
-                                SendToApi.sendToApi(username, msgContent, apiUrl);
+                                SendToApi.sendToApi(message, apiUrl);
 
                                 // Log da mensagem recebida
                                 System.out.println("Received User with ID: " + username);
@@ -100,7 +100,7 @@ public class App {
                                 String username = message.getUsername();
 
                                 // Enviar dados para a API Flask
-                                SendToApi.sendToApi(username, msgContent, apiUrl);
+                                SendToApi.sendToApi(message, apiUrl);
 
                                 // Log da mensagem recebida
                                 System.out.println("Received name: " + username);
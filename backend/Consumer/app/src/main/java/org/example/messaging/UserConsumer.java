@@ -67,9 +67,11 @@ public class UserConsumer  implements AutoCloseable {
                     // Recuperando os parâmetros da mensagem
                     String username = message.getStringProperty("username"); // Nome de usuário
                     String msgContent = message.getStringProperty("message"); // Mensagem
+                    String trace = message.getStringProperty("trace"); // Contexto de rastreamento
+                    String idempotencyKey = message.getStringProperty("idempotency_key"); // Descarte de duplicadas
             
                     // Criando uma nova instância da classe Message
-                    Message userMsg = new Message(username, msgContent);
+                    Message userMsg = new Message(username, msgContent, trace, idempotencyKey);
 
                     if (userMsg != null) {
                         // Armazena a mensagem recebida
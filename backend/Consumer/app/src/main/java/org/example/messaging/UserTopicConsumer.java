@@ -88,8 +88,10 @@ public class UserTopicConsumer implements AutoCloseable {
                 if (userMsg != null) {
                     String username = userMsg.getStringProperty("username"); // Nome de usuário
                     String msgContent = userMsg.getStringProperty("message"); // Mensagem
+                    String trace = userMsg.getStringProperty("trace"); // Contexto de rastreamento
+                    String idempotencyKey = userMsg.getStringProperty("idempotency_key"); // Descarte de duplicadas
 
-                    Message Msg = new Message(username, msgContent);
+                    Message Msg = new Message(username, msgContent, trace, idempotencyKey);
                     if (Msg != null) {
                         // Armazena a mensagem recebida
                         messageList.add(Msg);
@@ -7,6 +7,12 @@ public class Message {
     private String username;
     private String message;
 
+    // Contexto de rastreamento vindo do produtor (pode ser nulo)
+    private String trace;
+
+    // Chave de idempotência da outbox da API Flask (pode ser nula)
+    private String idempotencyKey;
+
     // Construtor padrão
     public Message() {
     }
@@ -18,6 +24,14 @@ public class Message {
 
     }
 
+    // Construtor com o contexto de rastreamento e a chave de idempotência
+    public Message(String username, String message, String trace, String idempotencyKey) {
+        this.username = username;
+        this.message = message;
+        this.trace = trace;
+        this.idempotencyKey = idempotencyKey;
+    }
+
     // Getters e Setters
     public String getUsername() {
         return username;
@@ -35,6 +49,22 @@ public class Message {
         this.message = message;
     }
 
+    public String getTrace() {
+        return trace;
+    }
+
+    public void setTrace(String trace) {
+        this.trace = trace;
+    }
+
+    public String getIdempotencyKey() {
+        return idempotencyKey;
+    }
+
+    public void setIdempotencyKey(String idempotencyKey) {
+        this.idempotencyKey = idempotencyKey;
+    }
+
 
     @Override
     public String toString() {
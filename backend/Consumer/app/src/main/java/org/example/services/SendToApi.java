@@ -4,12 +4,26 @@ import java.io.OutputStream;
 import java.net.HttpURLConnection;
 import java.net.URL;
 
+import org.example.models.Message;
+
 public class SendToApi {
     // Método para enviar mensagens consumidas para a API Flask
-    public static void sendToApi(String username, String message, String apiUrl) {
+    public static void sendToApi(Message msg, String apiUrl) {
         try {
             // Criar objeto JSON corretamente formatado
-            String jsonInputString = String.format("{\"username\": \"%s\", \"message\": \"%s\"}", username, message);
+            String jsonInputString = String.format("{\"username\": \"%s\", \"message\": \"%s\"",
+                msg.getUsername(), msg.getMessage());
+
+            // O contexto de rastreamento (hexadecimal e '-') volta para a API medir a entrega
+            if (msg.getTrace() != null) {
+                jsonInputString += String.format(", \"trace\": \"%s\"", msg.getTrace());
+            }
+
+            // A chave de idempotência (UUID) permite à API descartar mensagens republicadas
+            if (msg.getIdempotencyKey() != null) {
+                jsonInputString += String.format(", \"idempotency_key\": \"%s\"", msg.getIdempotencyKey());
+            }
+            jsonInputString += "}";
             
             System.out.println("URL da API: " + apiUrl); // Adicionando um log para depuração
 
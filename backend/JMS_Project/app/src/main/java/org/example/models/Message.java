@@ -14,6 +14,12 @@ public class Message {
     private String name;
     private String type; // Enum para definir o tipo de destino (QUEUE ou TOPIC)
 
+    // Chave de idempotência gerada pela outbox da API Flask (entrega at-least-once)
+    private String idempotencyKey;
+
+    // Contexto de rastreamento gerado no send_message da API Flask (repassado sem alteração)
+    private String trace;
+
     // Construtor padrão
     public Message() {
     }
@@ -75,6 +81,22 @@ public class Message {
         this.type = type;
     }
 
+    public String getIdempotencyKey() {
+        return idempotencyKey;
+    }
+
+    public void setIdempotencyKey(String idempotencyKey) {
+        this.idempotencyKey = idempotencyKey;
+    }
+
+    public String getTrace() {
+        return trace;
+    }
+
+    public void setTrace(String trace) {
+        this.trace = trace;
+    }
+
     @Override
     public String toString() {
         return "Message{" +
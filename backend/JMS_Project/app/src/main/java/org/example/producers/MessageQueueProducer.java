@@ -92,6 +92,16 @@ public class MessageQueueProducer implements AutoCloseable {
             msg.setStringProperty("username", message.getUsername());
             msg.setStringProperty("message", message.getMessage());
 
+            // Repassa a chave de idempotência para os consumidores descartarem duplicadas
+            if (message.getIdempotencyKey() != null) {
+                msg.setStringProperty("idempotency_key", message.getIdempotencyKey());
+            }
+
+            // Repassa o contexto de rastreamento (trace id e instantes de envio) até a API Flask
+            if (message.getTrace() != null) {
+                msg.setStringProperty("trace", message.getTrace());
+            }
+
             // Envia a mensagem para a fila através do produtor
             producer.send(msg);
         } catch (Exception ex) {
@@ -1,63 +1,311 @@
 import os
 import json
+import uuid
+import threading
+import time
+import weakref
+import click
 import requests
+from datetime import timedelta
 from flask_cors import CORS
 from dotenv import load_dotenv
-from flask import Flask, flash, jsonify, make_response, request, session
+from flask import (Blueprint, Flask, Response, current_app, flash, g, jsonify, make_response, request, session,
+                   stream_with_context)
 
 from flask_socketio import SocketIO, emit, join_room, leave_room
-from werkzeug.security import check_password_hash, generate_password_hash
+
+# Carregar variáveis de ambiente do arquivo .env antes dos módulos locais, que
+# leem as suas configurações (os.getenv) na importação
+load_dotenv()
 
 from models import (GroupMessage,  # Importa o banco e as classes de modelo
                     MessageQueue, MessageTopic, TopicMembership, Friends,
-                    User, FriendList, LinkQueue, db, create_triggers, 
-                    and_, or_, distinct, joinedload, text)
+                    User, FriendList, LinkQueue, Outbox, ReadCursor, UserConversation, db, make_pair_key,
+                    and_, or_, distinct, insert, joinedload, text, select, values, column, true)
 
 from get_ip import get_local_ip
+from java_client import JavaClient, JavaServiceUnavailable
+from stomp_publisher import StompPublisher
+from room_subscriber import RoomSubscriber
+from outbox_relay import OutboxRelay
+from ttl_cache import TTLCache
+from http_cache import ResponseCache
+from wire_format import msgpack_packet_class
+from metrics import instrument as instrument_metrics, registry as metrics_registry
+from tracing import mark_published, parse as parse_trace, record as record_hop, record_delivery, start_trace
+from password_pool import PasswordPool, PasswordPoolBusy
+from migrations import database_url, migrate
+from socket_manager import client_manager
+from emit_coalescer import EmitCoalescer
+from read_cursors import ReadCursorWriter, read_counts
+from message_search import MAX_PAGE_SIZE as SEARCH_MAX_PAGE_SIZE, PAGE_SIZE as SEARCH_PAGE_SIZE, search_messages
+from message_export import export_messages, gzip_jsonl
+from partitions import TABLES as PARTITIONABLE_TABLES, hot_since, is_partitioned
 
-# Carregar variáveis de ambiente do arquivo .env
-load_dotenv()
+# Rotas da API; o app é montado por create_app
+api = Blueprint('api', __name__, cli_group=None)
+socketio = SocketIO()
 
-app = Flask(__name__)
 
-# Configuração para permitir solicitações de qualquer origem
-CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
-app.config['SECRET_KEY'] = os.urandom(24)
+def lazy(factory):
+    """Cria o objeto na primeira chamada e reaproveita nas seguintes (um por processo)."""
+    lock = threading.Lock()
+    holder = []
 
-IP = get_local_ip()
-API_URL = [f'http://{IP}:8080', f'http://{IP}:8081']  # A URL do seu serviço Java
-BROKER_URL = f"tcp://{IP}:61616"
-Flask_URL = f'http://{IP}:5000/messages'
+    def get():
+        if not holder:
+            with lock:
+                if not holder:
+                    holder.append(factory())
+        return holder[0]
 
+    return get
 
-# Inicializa o status de conexão
-status = "disconnected"
 
+# O IP local só é descoberto quando algum serviço precisa dele
+local_ip = lazy(get_local_ip)
+
+
+def broker_url():
+    return current_app.config['BROKER_URL'] or f'tcp://{local_ip()}:61616'
+
+
+def flask_url():
+    return current_app.config['FLASK_URL'] or f'http://{local_ip()}:5000/messages'
+
+
+def stomp_host():
+    return current_app.config['STOMP_HOST'] or local_ip()
+
+
+# Um cliente (pool de conexões + circuit breaker) por serviço Java
+@lazy
+def _java_clients():
+    urls = current_app.config['JAVA_API_URLS'] or [f'http://{local_ip()}:8080', f'http://{local_ip()}:8081']
+    return [JavaClient(url) for url in urls]
+
+
+def java_api(index):
+    return _java_clients()[index]
+
+
+# Hashing e verificação de senhas fora do worker, em um pool de processos
+password_pool = PasswordPool()
+
+# Cache das resoluções usuário -> id e usuário -> chat usadas no envio de mensagens
+resolve_cache = TTLCache()
+
+# Corpos já serializados (e comprimidos) das páginas de histórico, com ETag e 304
+response_cache = ResponseCache()
+
+STOMP_PORT = int(os.getenv('STOMP_PORT', 61613))
+
+
+@lazy
+def stomp_publisher():
+    return StompPublisher(
+        stomp_host(), STOMP_PORT, os.getenv('STOMP_USER'), os.getenv('STOMP_PASSWORD')
+    )
+
+
+# Eventos emitidos pelo servidor, por nome (para o /metrics)
+socket_emits = metrics_registry.counter('socketio_emits_total', 'Eventos emitidos pelo servidor.', ('event',))
+
+
+def emit_to_room(event, data, room):
+    socket_emits.inc((event,))
+    socketio.emit(event, data, room=room)
+
+
+def emit_to_local_room(event, data, room):
+    # Só para os sockets deste processo, sem passar pelo SOCKETIO_MESSAGE_QUEUE
+    socket_emits.inc((event,))
+    socketio.emit(event, data, room=room, ignore_queue=True)
+
+
+# Mensagens entregues às salas; com EMIT_COALESCE_MS > 0 são agrupadas por sala
+room_emitter = EmitCoalescer(emit_to_room)
+# Mensagens que cada processo recebe por conta própria (tópicos assinados via STOMP)
+local_room_emitter = EmitCoalescer(emit_to_local_room)
+
+
+# Chaves de idempotência já entregues: a outbox publica at-least-once e uma
+# mensagem republicada chega de novo pelo consumidor Java ou pelo STOMP
+DELIVERED_KEYS = int(os.getenv('DELIVERY_SEEN_KEYS', os.getenv('STOMP_SEEN_KEYS', 10000)))
+DELIVERED_KEYS_TTL = float(os.getenv('DELIVERY_SEEN_TTL', 3600))
+delivered_keys = TTLCache(maxsize=DELIVERED_KEYS, ttl=DELIVERED_KEYS_TTL)
+
+
+def deliver_message(room, data, trace=None, idempotency_key=None, local=False):
+    """Entrega na sala uma mensagem vinda do broker (consumidor Java ou STOMP).
+
+    local=True emite só para os sockets deste processo. Retorna False se a
+    mensagem já tinha sido entregue (mesma idempotency_key).
+    """
+    if idempotency_key and not delivered_keys.add(idempotency_key):
+        return False
+
+    emitter = local_room_emitter if local else room_emitter
+    context = parse_trace(trace)
+    if context is None:
+        emitter.add(room, data)
+        return True
+
+    # Mensagem rastreada: trecho do broker até aqui e, depois do emit, a entrega
+    arrived_at = time.time()
+    if context['published_at'] is not None:
+        record_hop(context, 'broker', context['published_at'], arrived_at)
+    emitter.add(room, data, lambda: record_delivery(context, arrived_at, room=room))
+    return True
+
+
+@lazy
+def room_subscriber():
+    # Com SOCKETIO_MESSAGE_QUEUE, todo processo com sockets na sala de um grupo
+    # assina o tópico e recebe a sua própria cópia: emite só para os sockets
+    # locais, senão cada socket receberia uma cópia por processo. Uma fila
+    # entrega cada mensagem a um único processo, que emite para todos os nós.
+    shared = bool(current_app.config['SOCKETIO_MESSAGE_QUEUE'])
+
+    def on_message(room, data, trace, idempotency_key, topic):
+        deliver_message(room, data, trace, idempotency_key, local=shared and topic)
 
-# Verifica se está rodando em um ambiente Docker
-if os.environ.get('DB_URL'):
-    # Configuração para Docker
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DB_URL')
-else:
-    # Configuração para ambiente local
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
+    return RoomSubscriber(
+        stomp_host(), STOMP_PORT, on_message,
+        os.getenv('STOMP_USER'), os.getenv('STOMP_PASSWORD')
+    )
 
 
-# Inicializa o banco de dados
-db.init_app(app)
+HISTORY_HOT_MARGIN = timedelta(hours=1)
 
+# Verificado uma vez por processo: converter as tabelas exige reiniciar os workers
+partitioned_tables = lazy(lambda: {table for table in PARTITIONABLE_TABLES
+                                   if is_partitioned(db.session.connection(), table)})
 
-with app.app_context():
-    db.create_all()
-    create_triggers(db)
+
+# Inicializa o status de conexão
+status = "disconnected"
 
 
-@app.route('/test', methods=['GET'])
+def default_config():
+    return {
+        # 'production' (padrão) exige SECRET_KEY; 'development' aceita uma chave aleatória
+        'APP_ENV': os.getenv('APP_ENV', 'production').lower(),
+        'SECRET_KEY': os.getenv('SECRET_KEY'),
+        # DB_URL no Docker, DATABASE_URL no ambiente local
+        'SQLALCHEMY_DATABASE_URI': database_url(),
+        # URLs dos serviços; vazias são montadas com o IP local no primeiro uso
+        'JAVA_API_URLS': [url for url in os.getenv('JAVA_API_URLS', '').split(',') if url] or None,
+        'BROKER_URL': os.getenv('BROKER_URL'),
+        'FLASK_URL': os.getenv('FLASK_URL'),
+        'STOMP_HOST': os.getenv('STOMP_HOST'),
+        'MIGRATE_ON_START': os.getenv('MIGRATE_ON_START') == '1',
+        # Pool de conexões do banco por processo; com workers 'gthread' as
+        # requisições acima de pool_size + max_overflow esperam até pool_timeout
+        'SQLALCHEMY_ENGINE_OPTIONS': {
+            'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+            'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            'pool_pre_ping': True,
+        },
+        # None escolhe o modo automaticamente ('threading' sem eventlet/gevent)
+        'SOCKETIO_ASYNC_MODE': os.getenv('SOCKETIO_ASYNC_MODE') or None,
+        # Limite de sockets abertos por processo; acima disso a conexão é recusada
+        'SOCKETIO_MAX_CONNECTIONS': int(os.getenv('SOCKETIO_MAX_CONNECTIONS', 900)),
+        # Broker para os emits chegarem a todos os workers/nós ('kafka://host:9092');
+        # vazio mantém as salas só na memória do processo
+        'SOCKETIO_MESSAGE_QUEUE': os.getenv('SOCKETIO_MESSAGE_QUEUE'),
+        # 'msgpack' troca o formato dos pacotes do Socket.IO (todos os clientes
+        # precisam usar socket.io-msgpack-parser); 'default' mantém JSON
+        'SOCKETIO_SERIALIZER': os.getenv('SOCKETIO_SERIALIZER', 'default'),
+        # Latência por rota, consultas ao banco e chamadas ao Java em /metrics; 0 desliga
+        'METRICS_ENABLED': os.getenv('METRICS_ENABLED', '1') == '1',
+        # Publicação das mensagens: 'java' (via serviço Java) ou 'stomp' (direto no ActiveMQ)
+        'PUBLISH_MODE': os.getenv('PUBLISH_MODE', 'java').lower(),
+        # Consumo: 'java' (consumidor Java + POST em /messages/<value>) ou 'stomp'
+        # (o próprio Flask assina os chats e emite direto para as salas)
+        'CONSUME_MODE': os.getenv('CONSUME_MODE', 'java').lower(),
+        # Relay da outbox em uma thread de cada processo; 0 para rodar só via `flask outbox-relay`
+        'OUTBOX_RELAY_IN_PROCESS': os.getenv('OUTBOX_RELAY_IN_PROCESS', '1') == '1',
+        # Limite de mensagens por requisição em /send_messages
+        'MAX_BULK_MESSAGES': int(os.getenv('MAX_BULK_MESSAGES', 500)),
+        # Tamanho das páginas do histórico de mensagens (paginação por cursor)
+        'HISTORY_PAGE_SIZE': int(os.getenv('HISTORY_PAGE_SIZE', 50)),
+        'HISTORY_MAX_PAGE_SIZE': int(os.getenv('HISTORY_MAX_PAGE_SIZE', 200)),
+        # Com as mensagens particionadas por mês (partitions.py), o histórico lê só os
+        # meses recentes até acabarem; as partições antigas só nas páginas seguintes (0 desliga)
+        'HISTORY_HOT_MONTHS': int(os.getenv('HISTORY_HOT_MONTHS', 3)),
+    }
+
+
+# Apps criados neste processo; um único hook de fork descarta as conexões de todos
+created_apps = weakref.WeakSet()
+
+
+def dispose_engines():
+    # Um processo filho (fork) não pode reaproveitar as conexões abertas pelo pai;
+    # close=False deixa as conexões do pai intactas para ele continuar usando
+    for app in list(created_apps):
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=dispose_engines)
+
+
+def create_app(config=None):
+    """
+    Monta o app Flask. config sobrescreve as chaves lidas do ambiente.
+
+    Nada aqui acessa a rede ou o banco (exceto com MIGRATE_ON_START): IP
+    local, clientes do serviço Java e conexões STOMP são criados no primeiro
+    uso, e o pool do banco abre conexões sob demanda.
+    """
+    app = Flask(__name__)
+    app.config.update(default_config())
+    app.config.update(config or {})
+
+    if not app.config['SECRET_KEY']:
+        if app.config['APP_ENV'] == 'production':
+            raise RuntimeError('SECRET_KEY não definida (obrigatória com APP_ENV=production).')
+        # Sem SECRET_KEY cada processo assina as sessões com uma chave própria
+        print('Aviso: SECRET_KEY não definida, usando uma chave aleatória (sessões não valem entre workers).')
+        app.config['SECRET_KEY'] = os.urandom(24)
+
+    # Configuração para permitir solicitações de qualquer origem
+    CORS(app)
+    socketio_options = {}
+    if app.config['SOCKETIO_MESSAGE_QUEUE']:
+        socketio_options['client_manager'] = client_manager(app.config['SOCKETIO_MESSAGE_QUEUE'])
+    if app.config['SOCKETIO_SERIALIZER'] == 'msgpack':
+        socketio_options['serializer'] = msgpack_packet_class()
+    socketio.init_app(app, cors_allowed_origins="*", async_mode=app.config['SOCKETIO_ASYNC_MODE'],
+                      **socketio_options)
+
+    # Inicializa o banco de dados
+    db.init_app(app)
+    created_apps.add(app)
+    if app.config['METRICS_ENABLED']:
+        with app.app_context():
+            instrument_metrics(app, db.engines.values())
+
+    app.register_blueprint(api)
+
+    # As migrações rodam fora dos workers (python migrations.py); MIGRATE_ON_START
+    # aplica as pendentes aqui mesmo, sob o advisory lock das migrações
+    if app.config['MIGRATE_ON_START']:
+        with app.app_context():
+            migrate(db.engine)
+
+    return app
+
+
+@api.route('/test', methods=['GET'])
 def test():
     return make_response(jsonify({'message': 'test route'}), 200)
 
-@app.route('/users', methods=['GET'])
+@api.route('/users', methods=['GET'])
 def get_users():
     try:
         users = User.query.all()
@@ -69,7 +317,7 @@ def get_users():
             jsonify({'message': f'error retrieving users: {e}'}), 500
         )
 
-@app.route('/users/update_user', methods=['PUT'])
+@api.route('/users/update_user', methods=['PUT'])
 def update_username():
     try:
         # Verifica se o usuário está logado
@@ -88,21 +336,32 @@ def update_username():
             if existing_user and existing_user.id != user.id:
                 return make_response(jsonify({'message': 'username already taken'}), 409)
 
+            old_username = user.username
+
             # Atualiza o nome de usuário
             user.username = new_username
+
+            # Atualiza o nome exibido nas conversas dos amigos
+            UserConversation.query.filter_by(peer_id=user.id).update({'title': new_username})
             if 'password' in data:
-                user.password_hash = generate_password_hash(data['password'])
+                user.password_hash = password_pool.hash_password(data['password'])
 
             db.session.commit()
+            invalidate_user_cache(user.id, old_username, new_username)
+            if new_username != old_username:
+                bump_profile_version()
             return make_response(jsonify({'message': 'user updated'}), 200)
 
         return make_response(jsonify({'message': 'user not found'}), 404)
 
+    except PasswordPoolBusy as e:
+        db.session.rollback()
+        return make_response(jsonify({'message': str(e)}), 503)
     except Exception as e:
         return make_response(jsonify({'message': 'error updating user', 'error': str(e)}), 500)
 
 
-@app.route('/user/delete', methods=['POST'])  # Alterando para POST
+@api.route('/user/delete', methods=['POST'])  # Alterando para POST
 def delete_user():
     try:
         # Verifica se o usuário está logado
@@ -124,6 +383,8 @@ def delete_user():
         if user:
             db.session.delete(user)  # Deleta o usuário
             db.session.commit()  # Confirma a deleção
+            invalidate_user_cache(session['id_user'], username)
+            bump_profile_version()
             return make_response(jsonify({'message': 'user deleted successfully'}), 200)
 
         return make_response(jsonify({'message': 'user not found'}), 404)
@@ -134,20 +395,37 @@ def delete_user():
 
 
 
+def query_inbox(user_id, limit=None):
+    """Conversas do usuário (resumo em user_conversation) ordenadas por atividade."""
+    query = (
+        UserConversation.query
+        .filter_by(user_id=user_id)
+        .order_by(UserConversation.last_message_at.desc().nulls_last())
+    )
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
 def validate_user(username, password):
     try:
         user = User.query.filter_by(
             username=username
         ).first()  # Busca o usuário no banco de dados
-        if user and check_password_hash(
+        if user and password_pool.check_password(
             user.password_hash, password
         ):  # Verifica a senha
+            # Refaz o hash se os parâmetros configurados mudaram (salvo no commit do login)
+            if password_pool.needs_rehash(user.password_hash):
+                user.password_hash = password_pool.hash_password(password)
             return user  # Retorna o objeto do usuário se a senha for válida
         return None
+    except PasswordPoolBusy:
+        raise
     except Exception as e:
         raise ValueError(f"Erro na validação do usuario: {e}") 
 
-@app.route('/register', methods=['GET', 'POST'])
+@api.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         try:
@@ -162,7 +440,7 @@ def register():
             # Criação do novo usuário
             new_user = User(
                 username=data['username'].upper(),  # Armazenando o nome de usuário em maiúsculas
-                password=data['password']  # Considerar usar hash aqui
+                password_hash=password_pool.hash_password(data['password'])
             )
             db.session.add(new_user)
             db.session.commit()  # Commit da sessão do banco de dados
@@ -173,13 +451,16 @@ def register():
             flash('Registro de usuário bem-sucedido!')  # Mensagem de sucesso
             return make_response(jsonify({'message': 'Registro bem-sucedido!'}), 201)  # Código de sucesso 201
         
+        except PasswordPoolBusy as e:
+            db.session.rollback()
+            return make_response(jsonify({'message': str(e)}), 503)
         except Exception as e:
             db.session.rollback()  # Se houver erro, faz rollback
             return make_response(jsonify({'message': f'Erro ao tentar registrar usuário: {e}'}), 500)
 
     return make_response(jsonify({'error': 'Método não suportado.'}), 405)
 
-@app.route('/logout', methods=['POST'])
+@api.route('/logout', methods=['POST'])
 def logout():
     if 'id_user' in session:
         try:
@@ -201,7 +482,7 @@ def logout():
         flash('Não há usuário logado.', 'info')  # Mensagem de informação
         return make_response(jsonify({'error': 'Nenhum usuário logado.'}), 400)
 
-@app.route('/login', methods=['GET', 'POST'])
+@api.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         try:
@@ -223,94 +504,20 @@ def login():
                 user.is_online = True  # Define is_online como True
                 db.session.commit()  # Salva a alteração no banco de dados
                 
-                query_queue = f"""
-                SELECT 
-                    u.username AS user_username,
-                    lq.name AS queue_name,
-                    mq.message AS last_message,
-                    mq.timestamp AS last_message_timestamp,
-                    CASE 
-                        WHEN u.id = lq.user_one THEN u2.username  -- Captura o nome do amigo se o usuário for 'user_one'
-                        ELSE u1.username  -- Captura o nome do amigo se o usuário for 'user_two'
-                    END AS friend_name
-                FROM 
-                    "User" u
-                JOIN 
-                    link_queue lq ON u.id = lq.user_one OR u.id = lq.user_two
-                LEFT JOIN 
-                    last_message_queue lmq ON lq.name = lmq.id_from
-                LEFT JOIN 
-                    message_queue mq ON lmq.id_last_message = mq.id
-                LEFT JOIN 
-                    "User" u1 ON u1.id = lq.user_one  -- Amigo potencial, se `user_one`
-                LEFT JOIN 
-                    "User" u2 ON u2.id = lq.user_two  -- Amigo potencial, se `user_two`
-                WHERE 
-                    u.id = '{user.id}';
-                """
-                # Executa a consulta na view e converte para uma lista de dicionários
-                results_queue = db.session.execute(text(query_queue)).fetchall()
-
-                query_topic = f"""
-                SELECT 
-                    u.username AS user_username,
-                    mt.group_name AS topic_name,
-                    gm.message AS last_message,
-                    gm.timestamp AS last_message_timestamp
-                FROM 
-                    "User" u
-                JOIN 
-                    topic_membership tm ON u.id = tm.user_id
-                JOIN 
-                    message_topic mt ON tm.topic_id = mt.name
-                LEFT JOIN 
-                    last_message_topic lmt ON mt.name = lmt.id_from
-                LEFT JOIN 
-                    group_message gm ON lmt.id_last_message = gm.id
-                WHERE 
-                    u.id = '{user.id}'; 
-                """
-                # Executa a consulta na view e converte para uma lista de dicionários
-                results_topic = db.session.execute(text(query_topic)).fetchall()
-
-
-                print(results_topic)
-                print(results_queue)
-
-                # Criar uma lista para os chats
-                chats = []
-
-                # Adicionar resultados da consulta de filas
-                for user_username, topic_name, last_message, timestamp in results_topic:
-                    chats.append({
-                        #'user_username': user_username,
-                        'topic_name': topic_name,
-                        'last_message': last_message,
-                        #'timestamp': timestamp.isoformat()  # Converter para string
-                    })
-
-                # Adicionar resultados da consulta de tópicos
-                for user_username, queue_name, last_message, timestamp, friend_name in results_queue:
-                    chats.append({
-                        #'user_username': user_username,
-                        'queue_name': queue_name,
-                        'last_message': last_message,
-                        #'timestamp': timestamp.isoformat() if timestamp else None,  # Converter para string ou None
-                        'friend_name': friend_name
-                    })
-
-                print(chats)
+                # Lista de chats do usuário, da atividade mais recente para a mais antiga
+                chats = [conversation.json() for conversation in query_inbox(user.id)]
 
                 info = ({'id_user': user.id, 'username': user.username})
 
-                return make_response(
-                    jsonify({'message': chats, 'session': info}), 200
-                )
+                return response_cache.respond_payload({'message': chats, 'session': info})
             else:
                 flash('Usuário ou senha incorretos.')
                 return make_response(
                     jsonify({'error': 'Usuário ou senha incorretos.'}), 401
                 )
+        except PasswordPoolBusy as e:
+            db.session.rollback()
+            return make_response(jsonify({'message': str(e)}), 503)
         except Exception as e:
             db.session.rollback()  # Se houver erro, faz rollback
             return make_response(jsonify({'message': f'Erro no login de usuário: {e}'}), 500)
@@ -319,7 +526,25 @@ def login():
 
 
 from flask import request, session, jsonify, make_response
-@app.route('/create_group', methods=['POST'])
+@api.route('/inbox', methods=['GET', 'POST'])
+def inbox():
+    data = request.args.to_dict() if request.method == 'GET' else request.get_json()
+
+    session['id_user'] = data['id_user']
+
+    if 'id_user' not in session:
+        return make_response(jsonify({'error': 'Você precisa estar logado para ver suas conversas.'}), 401)
+
+    try:
+        limit = int(data.get('limit') or 0) or None
+        chats = [conversation.json() for conversation in query_inbox(session['id_user'], limit)]
+        # ETag pelo conteúdo: sem mudanças o cliente recebe 304 em vez da lista
+        return response_cache.respond_payload({'message': chats})
+    except Exception as e:
+        return make_response(jsonify({'message': f'Erro ao carregar conversas: {e}'}), 500)
+
+
+@api.route('/create_group', methods=['POST'])
 def create_group():
 
     data = request.get_json()
@@ -351,7 +576,6 @@ def create_group():
         # Verifica se todos os amigos estão na lista de amigos do usuário
         amigos_validos = []
         for amigo in amigos:
-            print(amigo)
             # Consulta para verificar a amizade
             friend = User.query.filter_by(username=amigo.upper()).first()
             if not friend:
@@ -382,6 +606,8 @@ def create_group():
         # Faz o commit das alterações no banco de dados
         db.session.commit()
 
+        resolve_cache.invalidate_where(lambda key: key[0] == 'TOPIC' and key[2] == group_name)
+
         # Retorna resposta de sucesso
         return make_response(jsonify({'message': 'Grupo criado com sucesso!'}), 201)
 
@@ -391,7 +617,7 @@ def create_group():
         return make_response(jsonify({'message': f'Erro ao tentar criar grupo: {e}'}), 500)
 
 
-@app.route('/add_friend', methods=['POST'])
+@api.route('/add_friend', methods=['POST'])
 def add_friend():
 
     data = request.get_json()
@@ -436,6 +662,10 @@ def add_friend():
         db.session.add(new_queue)
         db.session.commit()
 
+        # Chat 1:1 novo para os dois usuários
+        resolve_cache.invalidate(('QUEUE', friend_list.user_id, friend_username))
+        resolve_cache.invalidate(('QUEUE', friend.id, session['username'].upper()))
+
         return make_response(jsonify({'message': f'{friend_username} foi adicionado como amigo com sucesso!'}), 201)
 
     except Exception as e:
@@ -443,9 +673,186 @@ def add_friend():
         return make_response(jsonify({'message': f'Erro ao tentar adicionar amigo: {e}'}), 500)
 
 
-@app.route('/send_message', methods=['POST'])
+def find_link_queue(user_a, user_b):
+    """
+    Retorna o LinkQueue do chat 1:1 entre dois usuários (ou None).
+
+    A busca usa a chave canônica do par (uma consulta no índice único) e o
+    resultado fica em cache durante a requisição atual.
+    """
+    pair_key = make_pair_key(user_a, user_b)
+
+    if 'link_queues' not in g:
+        g.link_queues = {}
+
+    if pair_key not in g.link_queues:
+        g.link_queues[pair_key] = LinkQueue.query.filter_by(pair_key=pair_key).first()
+
+    return g.link_queues[pair_key]
+
+
+def publish_message(payload):
+    """
+    Publica a mensagem no broker de acordo com PUBLISH_MODE.
+
+    Retorna a tupla (resposta, status) no mesmo formato do serviço Java.
+    """
+    if current_app.config['PUBLISH_MODE'] == 'stomp':
+        stomp_publisher().publish(payload['type'], payload['name'], payload['username'], payload['message'], extra=payload)
+        return {
+            'status': 'success',
+            'message': f"{payload['type']} Message sent by {payload['username']}: {payload['message']}"
+        }, 200
+
+    # Envia a solicitação POST para o serviço Java
+    response = java_api(0).post('/send_message', json=payload)
+
+    if response.status_code == 200:
+        return response.json(), 200
+    return response.text, response.status_code
+
+
+def relay_publish(payload):
+    # Usado pelo relay da outbox: qualquer falha mantém a mensagem pendente
+    context = parse_trace(payload.get('trace'))
+    if context is not None:
+        published_at = time.time()
+        payload['trace'] = mark_published(payload['trace'], published_at)
+
+    response, status_code = publish_message(payload)
+    if status_code != 200:
+        raise RuntimeError(f'Falha ao publicar mensagem ({status_code}): {response}')
+
+    if context is not None:
+        record_hop(context, 'outbox', context['sent_at'], published_at)
+        record_hop(context, 'publish', published_at, mode=current_app.config['PUBLISH_MODE'])
+
+
+# Relay da outbox: roda em uma thread do próprio processo ou via `flask outbox-relay`
+outbox_relay = OutboxRelay(relay_publish)
+
+
+def start_background_workers(app):
+    """
+    Inicia as threads de fundo do processo; chamada uma vez por worker, depois
+    do fork (post_worker_init no gunicorn.conf.py, ou no __main__).
+
+    Com OUTBOX_RELAY_IN_PROCESS o relay roda desde o boot: mensagens pendentes
+    ou em espera (retry_at) de antes de um reinício saem sem depender de um
+    novo envio. O advisory lock mantém um só relay publicando entre os workers.
+    """
+    if app.config['OUTBOX_RELAY_IN_PROCESS']:
+        outbox_relay.start(app)
+
+
+@api.cli.command('outbox-relay')
+def outbox_relay_command():
+    """Publica continuamente as mensagens pendentes da outbox."""
+    outbox_relay.run_forever(current_app._get_current_object())
+
+
+@api.cli.command('outbox-requeue')
+def outbox_requeue_command():
+    """Devolve para a fila as mensagens da outbox no estado de falha."""
+    print(f'{outbox_relay.requeue_failed()} mensagens devolvidas para a fila.')
+
+
+@api.route('/outbox/status', methods=['GET'])
+def outbox_status():
+    try:
+        return make_response(jsonify(outbox_relay.stats()), 200)
+    except Exception as e:
+        return make_response(jsonify({'message': f'Erro ao consultar a outbox: {e}'}), 500)
+
+
+def resolve_user_id(username):
+    # Username -> id do usuário (None se não existir)
+    return resolve_cache.get_or_load(
+        ('user', username),
+        lambda: db.session.query(User.id).filter_by(username=username).scalar()
+    )
+
+
+def resolve_chat(user_id, msg_type, name):
+    """
+    Resolve o chat (LinkQueue.name ou MessageTopic.name) que o usuário pode acessar.
+
+    Retorna (chat, None) ou (None, (mensagem de erro, status)). Apenas as
+    resoluções bem-sucedidas ficam no cache, então uma nova amizade ou grupo
+    é vista na hora; remoções e renomeações invalidam o cache explicitamente.
+    """
+    if msg_type == 'QUEUE':
+        name = name.upper()
+
+    key = (msg_type, user_id, name)
+    chat = resolve_cache.get(key)
+    if chat is not None:
+        return chat, None
+
+    if msg_type == 'QUEUE':
+        friend_id = resolve_user_id(name)
+        if not friend_id:
+            return None, ('Usuário não encontrado', 404)
+
+        if not Friends.query.filter_by(id_user=user_id, id_friend=friend_id).first():
+            return None, ('Vocês não são amigos', 403)
+
+        result = find_link_queue(user_id, friend_id)
+        if not result:
+            return None, ('Você não tem permissão para acessar esse chat ou ele não existe', 403)
+        chat = result.name
+    else:
+        topic = MessageTopic.query.filter_by(group_name=name).first()
+        if not topic:
+            return None, ('Chat não encontrado!', 404)
+
+        if not TopicMembership.query.filter_by(topic_id=topic.name, user_id=user_id).first():
+            return None, ('Você não tem permissão para acessar esse chat', 403)
+        chat = topic.name
+
+    resolve_cache.set(key, chat)
+    return chat, None
+
+
+def invalidate_user_cache(*values):
+    # Remove do cache as entradas que citam algum dos ids/usernames informados
+    values = {value for value in values if value}
+    resolve_cache.invalidate_where(lambda key: any(part in values for part in key))
+
+
+def bump_profile_version():
+    # Nomes dos remetentes vão nas páginas do histórico: avança a versão (e a ETag) de todas.
+    # Depois do commit, senão uma leitura concorrente guardaria o nome antigo na versão nova
+    db.session.execute(text("SELECT nextval('profile_version')"))
+    db.session.commit()
+
+
+@api.route('/auth/status', methods=['GET'])
+def auth_status():
+    return make_response(jsonify(password_pool.status()), 200)
+
+
+@api.route('/cache/status', methods=['GET'])
+def cache_status():
+    return make_response(jsonify({**resolve_cache.stats(), 'responses': response_cache.stats()}), 200)
+
+
+def cache_counter(field):
+    def read():
+        return {(('cache', name),): cache.stats()[field]
+                for name, cache in (('resolve', resolve_cache), ('responses', response_cache.bodies))}
+    return read
+
+
+metrics_registry.value('cache_hits_total', 'counter', 'Acertos dos caches do processo.', cache_counter('hits'))
+metrics_registry.value('cache_misses_total', 'counter', 'Faltas dos caches do processo.', cache_counter('misses'))
+
+
+@api.route('/send_message', methods=['POST'])
 def send_message():
 
+    # Contexto de rastreamento (trace id + instante do envio), levado no payload até a entrega
+    trace = start_trace()
     data = request.get_json()
 
     session['id_user'] = data['id_user']
@@ -462,7 +869,7 @@ def send_message():
         username = session['username']
         user_id = session['id_user']
         
-        broker_url = BROKER_URL        
+        broker = broker_url()
 
         # Obtém os dados do JSON recebido
         
@@ -471,57 +878,21 @@ def send_message():
         msg_content = data.get('message')
         msg_type = data.get('type').upper()
 
-        print(session['chat'])
-
         if 'chat' not in session:
             return jsonify({'error': 'Você não se conectou ao chat ainda!'}), 404
 
         # Verifica se todos os dados necessários estão presentes
-        if not all([name, msg_content, broker_url, msg_type]):
+        if not all([name, msg_content, broker, msg_type]):
             return jsonify({'error': 'Todos os campos (name, message, brokerUrl e type) devem ser fornecidos.'}), 400
 
 
-        if msg_type == "QUEUE":
-                friend = User.query.filter_by(username=name.upper()).first()
-                if friend:
-                    friends = Friends.query.filter_by(id_user=user_id, id_friend=friend.id)
-                    if friends:
-                        
-                        query = (
-                            db.session.query(LinkQueue)
-                            .filter(
-                                or_(
-                                    (LinkQueue.user_one == user_id) & (LinkQueue.user_two == friend.id),
-                                    (LinkQueue.user_two == user_id) & (LinkQueue.user_one == friend.id)
-                                )
-                            )
-                        ) 
-
-
-                        result = query.first()  # Obtém o primeiro resultado correspondente, ou `None` se não encontrar
-                    else:
-                        return jsonify({'error': 'Vocês não são amigos'}), 403
-                else:
-                    return jsonify({'error': 'Usuário não encontrado'}), 404
-                
-                if not result:
-                    return jsonify({'error': 'Você não tem permissão para acessar esse chat ou ele não existe'}), 403
-        
-                name = result.name
-                
-        elif msg_type == "TOPIC":
-            topic = MessageTopic.query.filter_by(group_name=name).first()
-            if topic :        
-                result = TopicMembership.query.filter_by(user_id=user_id).first()
-                
-                if not result:
-                    return jsonify({'error': 'Você não tem permissão para acessar esse chat'}), 403
-        
-                name = topic.name
-            else:         
-                return jsonify({'error': 'Chat não encontrado!'}), 404
-        else:
+        if msg_type not in ('QUEUE', 'TOPIC'):
             return jsonify({'error': 'Tipo de chat inválido! Use QUEUE ou TOPIC.'}), 400
+
+        # Resolve o chat e a permissão do usuário (em cache após a primeira vez)
+        name, error = resolve_chat(user_id, msg_type, name)
+        if error:
+            return jsonify({'error': error[0]}), error[1]
         
 
         if name != session['chat']:
@@ -533,45 +904,277 @@ def send_message():
             'name': name,
             'username': username,  # Usa o username da sessão
             'message': msg_content,
-            'brokerUrl': broker_url,
+            'brokerUrl': broker,
             'type': msg_type
         }
+        if trace:
+            payload['trace'] = trace
 
-        # Envia a solicitação POST para o serviço Java
-        response = requests.post(f'{API_URL[0]}/send_message', json=payload)
+        # Grava a mensagem e a entrada da outbox na mesma transação;
+        # a publicação no broker é feita depois pelo relay da outbox
+        try:
+            # Verifica o tipo de mensagem e cria a instância apropriada
+            if msg_type == 'QUEUE':
+                new_message = MessageQueue(queue_name=name, sender_id=user_id, message=msg_content)
+            else:
+                new_message = GroupMessage(topic_id=name, sender_id=user_id, message=msg_content)
 
-        # Retorna a resposta do serviço Java
-        if response and response.status_code == 200:
-            try:
-                # Verifica o tipo de mensagem e cria a instância apropriada
-                if msg_type == 'QUEUE':
-                    new_message = MessageQueue(queue_name=name, sender_id=user_id, message=msg_content)
-                else:
-                    new_message = GroupMessage(topic_id=name, sender_id=user_id, message=msg_content)
-
-                # Adiciona e faz o commit da nova mensagem
-                db.session.add(new_message)
-                db.session.commit()
-
-            except Exception as e:
-                db.session.rollback()  # Desfaz a transação em caso de erro
-                return jsonify({'error': f'Falha ao enviar mensagem para o banco de dados: {str(e)}'}), 500
-
-            return jsonify({'response': response.json()}), 200
-            
-        else:
-            return jsonify({'error': f'Falha ao enviar mensagem: {response.text}'}), response.status_code
+            db.session.add(new_message)
+            db.session.flush()  # Obtém o id da mensagem antes do commit
+            message_id = new_message.id
+
+            payload['messageId'] = message_id
+            db.session.add(Outbox(chat_name=name, msg_type=msg_type,
+                                  message_id=message_id, payload=json.dumps(payload)))
+            db.session.commit()
+
+        except Exception as e:
+            db.session.rollback()  # Desfaz a transação em caso de erro
+            return jsonify({'error': f'Falha ao enviar mensagem para o banco de dados: {str(e)}'}), 500
+
+        if trace:
+            context = parse_trace(trace)
+            record_hop(context, 'send_message', context['sent_at'], type=msg_type)
+
+        outbox_relay.wake()
+
+        response = {
+            'status': 'success',
+            'message': f'{msg_type} Message queued by {username}: {msg_content}',
+            'id': message_id
+        }
+        return jsonify({'response': response}), 202
 
-    except requests.exceptions.RequestException as e:
-        return jsonify({'error': f'Erro de conexão com o serviço Java: {str(e)}'}), 500
     except Exception as e:
         return jsonify({'error': f'Ocorreu um erro inesperado: {str(e)}'}), 500
 
 
+@api.route('/send_messages', methods=['POST'])
+def send_messages():
+
+    sent_at = time.time()
+    data = request.get_json()
+
+    session['id_user'] = data['id_user']
+    session['username'] = data['username']
+
+    # Verifica se o usuário está logado
+    if 'id_user' not in session:
+        return jsonify({'error': 'Acesso negado: usuário não autenticado.'}), 403
+
+    items = data.get('messages')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'A lista de mensagens (messages) deve ser fornecida.'}), 400
+
+    max_bulk = current_app.config['MAX_BULK_MESSAGES']
+    if len(items) > max_bulk:
+        return jsonify({'error': f'Envie no máximo {max_bulk} mensagens por requisição.'}), 413
+
+    user_id = session['id_user']
+    username = session['username']
+
+    results = [None] * len(items)
+    chats = {}  # (tipo, nome) -> (chat, erro): cada conversa é autorizada uma única vez
+    accepted = {'QUEUE': [], 'TOPIC': []}  # tipo -> [(índice, chat, mensagem)]
+    outbox_rows = []
+    traces = []
+
+    try:
+        for index, item in enumerate(items):
+            item = item if isinstance(item, dict) else {}
+            name = item.get('name')
+            msg_content = item.get('message')
+            msg_type = (item.get('type') or '').upper()
+
+            if not all([name, msg_content]) or msg_type not in ('QUEUE', 'TOPIC'):
+                results[index] = {'index': index, 'status': 'error', 'code': 400,
+                                  'error': 'Os campos name, message e type (QUEUE ou TOPIC) devem ser fornecidos.'}
+                continue
+
+            if (msg_type, name) not in chats:
+                chats[(msg_type, name)] = resolve_chat(user_id, msg_type, name)
+
+            chat, error = chats[(msg_type, name)]
+            if error:
+                results[index] = {'index': index, 'status': 'error', 'code': error[1], 'error': error[0]}
+                continue
+
+            accepted[msg_type].append((index, chat, msg_content))
+
+        for msg_type, model, chat_column in (('QUEUE', MessageQueue, 'queue_name'),
+                                             ('TOPIC', GroupMessage, 'topic_id')):
+            rows = accepted[msg_type]
+            if not rows:
+                continue
+
+            # Um único INSERT de várias linhas por tabela (os triggers rodam uma vez por comando)
+            ids = db.session.scalars(
+                insert(model).returning(model.id, sort_by_parameter_order=True),
+                [{chat_column: chat, 'sender_id': user_id, 'message': msg_content}
+                 for _, chat, msg_content in rows]
+            ).all()
+
+            for (index, chat, msg_content), message_id in zip(rows, ids):
+                payload = {
+                    'name': chat,
+                    'username': username,
+                    'message': msg_content,
+                    'brokerUrl': broker_url(),
+                    'type': msg_type,
+                    'messageId': message_id
+                }
+                trace = start_trace(sent_at)
+                if trace:
+                    payload['trace'] = trace
+                    traces.append((trace, msg_type))
+                outbox_rows.append({
+                    'idempotency_key': str(uuid.uuid4()),
+                    'chat_name': chat,
+                    'msg_type': msg_type,
+                    'message_id': message_id,
+                    'payload': json.dumps(payload)
+                })
+                results[index] = {'index': index, 'status': 'success', 'id': message_id}
+
+        # As entradas da outbox vão na mesma transação; o relay publica em lote
+        if outbox_rows:
+            db.session.execute(insert(Outbox), outbox_rows)
+        db.session.commit()
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Falha ao enviar mensagens para o banco de dados: {str(e)}'}), 500
+
+    committed_at = time.time()
+    for trace, msg_type in traces:
+        record_hop(parse_trace(trace), 'send_message', sent_at, committed_at, type=msg_type)
+
+    if outbox_rows:
+        outbox_relay.wake()
+
+    # 202: todas aceitas, 207: aceitas em parte, 400: nenhuma aceita
+    if len(outbox_rows) == len(items):
+        status_code = 202
+    elif outbox_rows:
+        status_code = 207
+    else:
+        status_code = 400
+
+    return jsonify({'results': results}), status_code
+
+
+def parse_page_args(data):
+    """Extrai before_id, after_id e limit do JSON da requisição."""
+    before_id = data.get('before_id')
+    after_id = data.get('after_id')
+
+    if before_id is not None and after_id is not None:
+        raise ValueError('Use apenas um dos parametros (before_id ou after_id).')
+
+    limit = int(data.get('limit') or current_app.config['HISTORY_PAGE_SIZE'])
+    limit = max(1, min(limit, current_app.config['HISTORY_MAX_PAGE_SIZE']))
+
+    before_id = int(before_id) if before_id is not None else None
+    after_id = int(after_id) if after_id is not None else None
+
+    return before_id, after_id, limit
+
+
+def query_history(msg_type, name, before_id=None, after_id=None, limit=None):
+    """
+    Busca uma página do histórico de um chat usando paginação por cursor (keyset).
+
+    Sem cursor retorna a página mais recente. Com before_id retorna mensagens
+    mais antigas que o cursor e com after_id as mais novas. As mensagens são
+    sempre retornadas em ordem cronológica, junto com o next_cursor (ou None
+    quando não há mais páginas naquela direção).
+    """
+    limit = limit or current_app.config['HISTORY_PAGE_SIZE']
+    if msg_type == 'QUEUE':
+        model, chat_column = MessageQueue, MessageQueue.queue_name
+    else:
+        model, chat_column = GroupMessage, GroupMessage.topic_id
+
+    query = (
+        db.session.query(model.id, model.message, model.timestamp, model.sender_id, User.username)
+        .join(User, model.sender_id == User.id)
+        .filter(chat_column == name)
+    )
+
+    # Busca um registro a mais para saber se existe uma próxima página
+    if after_id is not None:
+        messages = query.filter(model.id > after_id).order_by(model.id.asc()).limit(limit + 1).all()
+    else:
+        if before_id is not None:
+            query = query.filter(model.id < before_id)
+        query = query.order_by(model.id.desc())
+
+        hot_months = current_app.config['HISTORY_HOT_MONTHS']
+        if hot_months > 0 and model.__tablename__ in partitioned_tables():
+            # O filtro no timestamp limita a leitura às partições dos meses recentes
+            since = hot_since(hot_months)
+            messages = (
+                query.add_columns((model.timestamp < since + HISTORY_HOT_MARGIN).label('near_cold'))
+                .filter(model.timestamp >= since).limit(limit + 1).all()
+            )
+            # As partições antigas só entram quando os meses recentes acabam ou a página
+            # chega perto do início deles: o timestamp é o início da transação e o id sai
+            # depois, então uma mensagem antiga pode ter id maior que as primeiras recentes
+            if len(messages) <= limit or messages[-1].near_cold:
+                older = query.filter(model.timestamp < since).limit(limit + 1).all()
+                messages = sorted(messages + older, key=lambda message: message.id, reverse=True)[:limit + 1]
+        else:
+            messages = query.limit(limit + 1).all()
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+
+    if after_id is None:
+        messages.reverse()
+
+    next_cursor = None
+    if has_more:
+        next_cursor = messages[-1].id if after_id is not None else messages[0].id
+
+    result = [{'id': message.id, 'message': message.message, 'timestamp': message.timestamp, 'username': message.username, 'sender_id': message.sender_id} for message in messages]
+
+    # read_by: quantos participantes já leram cada mensagem (pelas marcas em read_cursor)
+    read_counts(name, result)
+    for message in result:
+        del message['sender_id']
+
+    return result, next_cursor
+
+
+def history_version(user_id, name):
+    """
+    Versão do histórico de um chat visto pelo usuário, ou None se ele não participa.
+
+    Uma consulta pela chave de user_conversation: a última mensagem muda a
+    cada envio, a contagem/soma das marcas de read_cursor muda quando alguém
+    lê (read_by) e a sequência profile_version avança quando um usuário muda
+    de nome ou é apagado. Páginas com a mesma versão têm o mesmo conteúdo.
+    """
+    reads = select(ReadCursor.last_read_id).where(ReadCursor.conversation_id == name).subquery()
+    return db.session.execute(
+        select(UserConversation.last_message_id,
+               select(db.func.count()).select_from(reads).scalar_subquery().label('readers'),
+               select(db.func.coalesce(db.func.sum(reads.c.last_read_id), 0)).scalar_subquery().label('read_sum'),
+               db.literal_column('(SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM profile_version)').label('profiles'))
+        .where(UserConversation.user_id == user_id, UserConversation.conversation_id == name)
+    ).first()
+
+
+def history_response(key, version, build):
+    """Resposta de uma página do histórico: do response_cache quando há versão, senão direto."""
+    if version is None:
+        return make_response(jsonify(build()), 200)
+    return response_cache.respond((*key, tuple(version)), build)
+
+
 # Variável global para armazenar o status da conexão e o consumidor
 consumer = None
 
-@app.route('/connect', methods=['POST'])
+@api.route('/connect', methods=['POST'])
 def connect():
     global consumer, status
     data = request.get_json()
@@ -587,6 +1190,12 @@ def connect():
         status = "disconnect"
         return jsonify({"status": "error", "message": "Todos os campos (name e type) devem ser fornecidos."}), 400
 
+    try:
+
+        before_id, after_id, limit = parse_page_args(data)
+    except (TypeError, ValueError) as ex:
+        return jsonify({"status": "error", "message": f"Parametros de paginação inválidos. {ex}"}), 400
+
     try:
 
         type = data['type'].upper() 
@@ -599,17 +1208,8 @@ def connect():
             if not user:
                 return jsonify({"status": "error", "message": "Amigo não encontrado."}), 404
             
-            # Executa a consulta corretamente
-            query = (
-                db.session.query(LinkQueue)
-                .filter(
-                    or_(
-                        (LinkQueue.user_one == session['id_user']) & (LinkQueue.user_two == user.id),
-                        (LinkQueue.user_two == session['id_user']) & (LinkQueue.user_one == user.id)
-                    )
-                )
-            ) 
-            result = query.first()
+            # Busca o chat pela chave canônica do par
+            result = find_link_queue(session['id_user'], user.id)
             
             if not result:
                 return jsonify({"status": "error", "message": "Chat não encontrado."}), 404
@@ -617,15 +1217,6 @@ def connect():
             # Certifique-se de que a coluna name exista
             name = result.name
 
-            query = f"""
-            SELECT * FROM v_message_queue
-            WHERE queue_name = '{result.name}'
-            ORDER BY timestamp;
-            """
-            messages = db.session.execute(text(query)).fetchall()  # Executa a consulta na view
-            
-
-
         elif type == "TOPIC":
             group_name = data['name']
             topic = MessageTopic.query.filter_by(group_name=group_name).first()
@@ -633,44 +1224,52 @@ def connect():
                 return jsonify({"status": "error", "message": "Chat em grupo não encontrado."}), 404
             
             name = topic.name
+        else:
+            return jsonify({"status": "error", "message": "Tipo de chat inválido! Use QUEUE ou TOPIC."}), 400
 
-            messages = (
-                db.session.query(GroupMessage.id, GroupMessage.message, GroupMessage.timestamp, User.username)  # Incluindo username
-                .join(User, GroupMessage.sender_id == User.id)  # Realiza a junção
-                .filter(GroupMessage.topic_id == name)  # Filtra
-                .order_by(GroupMessage.timestamp)  # Ordena
-                .all()  # Executa a consulta
-            )
+        version = history_version(session['id_user'], name)
         
-        RECEIVE_URL = Flask_URL+"/"+name
+        RECEIVE_URL = flask_url()+"/"+name
 
         session['chat'] = name
 
-        print(f'name: {name}')
+        # Abrir a página mais recente do chat move a marca de leitura para a última mensagem;
+        # como no /mark_read, a gravação fica com o ReadCursorWriter, que avisa a sala ('read')
+        if before_id is None and after_id is None and version and version.last_message_id:
+            read_cursors.start(current_app._get_current_object())
+            read_cursors.mark(session['id_user'], name, version.last_message_id)
 
         payload = {
-            'brokerUrl': BROKER_URL,
+            'brokerUrl': broker_url(),
             'apiUrl': RECEIVE_URL,
             'name': name,
             'type': type,
         }
 
-        # Envia a solicitação POST para o serviço Java
-
         status = "connected"
-    
-        response = requests.post(f'{API_URL[1]}/connect', json=payload)
 
-        # Retorna a resposta do serviço Java
-        if response.status_code == 200:
-            result = [{'id': message.id, 'message': message.message, 'timestamp': message.timestamp, 'username': message.username} for message in messages]
-            
-            info = ({'id_user': session['id_user'], 'username': session['username'], 'chat': name})
-            return jsonify({'status': 'success', 'messages': result, "session": info}), 200
-        else:
-            status = "disconnect"
-            return jsonify({'error': f'Falha ao enviar mensagem: {response.text}'}), response.status_code
+        # No modo 'stomp' o chat é assinado quando o socket entra na sala (evento join)
+        if current_app.config['CONSUME_MODE'] == 'java':
+            # Envia a solicitação POST para o serviço Java
+            response = java_api(1).post('/connect', json=payload)
+
+            if response.status_code != 200:
+                status = "disconnect"
+                return jsonify({'error': f'Falha ao enviar mensagem: {response.text}'}), response.status_code
+
+        info = ({'id_user': session['id_user'], 'username': session['username'], 'chat': name})
+
+        def build():
+            messages, next_cursor = query_history(type, name, before_id, after_id, limit)
+            return {'status': 'success', 'messages': messages, 'next_cursor': next_cursor, "session": info}
+
+        return history_response(('connect', name, before_id, after_id, limit, info['id_user'], info['username']),
+                                version, build)
 
+    except JavaServiceUnavailable as ex:
+        status = "disconnect"
+
+        return jsonify({"status": "error", "message": str(ex)}), 503
     except Exception as ex:
         status = "disconnect"
 
@@ -678,9 +1277,11 @@ def connect():
 
 
 
-@app.route('/load_messages', methods=['POST'])
+@api.route('/load_messages', methods=['GET', 'POST'])
 def load_messages():
-    data = request.get_json()
+    # Via GET (parâmetros na URL) o navegador revalida a página com If-None-Match e recebe 304
+    # O chat e o usuário vêm da sessão gravada pelo /connect, nunca dos parâmetros
+    data = request.args.to_dict() if request.method == 'GET' else request.get_json()
 
     if 'chat' not in session:
         return jsonify({'status': 'error', 'message': 'Você não se conectou a nenhum chat'}), 400
@@ -704,41 +1305,37 @@ def load_messages():
             return jsonify({"status": "error", "message": "Erro requisição na requisição este tipo de requisição deve ser QUEUE!"}), 400
         
         friend = data.get('friend').upper()
+
+    try:
+        before_id, after_id, limit = parse_page_args(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': f'Parametros de paginação inválidos. {e}'}), 400
     
     try:
-        if type == 'QUEUE':
+        # Chat já resolvido (com acesso verificado) em uma requisição anterior: com a
+        # página sem mudanças, resta só a consulta da versão
+        key = (type, user, friend if type == 'QUEUE' else data.get('name'))
+        cached = resolve_cache.get(key)
+
+        if cached is not None:
+            if type == 'QUEUE' and session['chat'] != cached:
+                return jsonify({'status': 'error', 'message': 'Sala inválida.'}), 400
+            name = cached
+        elif type == 'QUEUE':
             friend = User.query.filter_by(username=friend).first()
 
             if not friend:
                 return jsonify({'status': 'error', 'message': 'Amigo não encontrado.'}), 404
             
-            query = (
-                db.session.query(LinkQueue)
-                .filter(
-                    or_(
-                        (LinkQueue.user_one == user) & (LinkQueue.user_two == friend.id),
-                        (LinkQueue.user_two == user) & (LinkQueue.user_one == friend.id)
-                    )
-                )
-            ) 
-            result = query.first()  
+            result = find_link_queue(user, friend.id)
 
             if not result:
                 return jsonify({'status': 'error', 'message': 'Chat não encontrado.'}), 404
 
             if session['chat'] != result.name:
                 return jsonify({'status': 'error', 'message': 'Sala inválida.'}), 400
-            
-            query = f"""
-            SELECT * FROM v_message_queue
-            WHERE queue_name = '{result.name}'
-            ORDER BY timestamp;
-            """
-            messages = db.session.execute(text(query)).fetchall()  # Executa a consulta na view
-            
 
-            if not result:
-                return jsonify({'status': 'error', 'message': 'Chat não encontrado.'}), 404
+            name = result.name
         elif type == 'TOPIC':
             group_name = name
             topic = MessageTopic.query.filter_by(group_name=group_name).first()
@@ -751,28 +1348,262 @@ def load_messages():
                 return jsonify({'status': 'error', 'message': 'Você não é membro deste chat.'}), 404
             
             name = topic.name
-            # Supondo que 'name' seja o ID do tópico que você está filtrando
-            # Consulta para pegar as mensagens, agora incluindo o username
-            messages = (
-                db.session.query(GroupMessage.id, GroupMessage.message, GroupMessage.timestamp, User.username)  # Incluindo username
-                .join(User, GroupMessage.sender_id == User.id)  # Realiza a junção
-                .filter(GroupMessage.topic_id == name)  # Filtra
-                .order_by(GroupMessage.timestamp)  # Ordena
-                .all()  # Executa a consulta
-            )
         else:
             return jsonify({'status': 'error', 'message': 'Tipo de chat inválido.'}), 400
 
-                    # Formata os resultados
-        result = [{'id': message.id, 'message': message.message, 'timestamp': message.timestamp, 'username': message.username} for message in messages]
+        resolve_cache.set(key, name)
+
+        # Busca apenas a página solicitada do histórico (ou reaproveita a da mesma versão)
+        def build():
+            messages, next_cursor = query_history(type, name, before_id, after_id, limit)
+            return {'status': 'success', 'messages': messages, 'next_cursor': next_cursor}
 
-        return jsonify({'status': 'success', 'messages': result}), 200
+        return history_response(('load_messages', name, before_id, after_id, limit),
+                                history_version(user, name), build)
 
     except Exception as e:
         return jsonify({'status': 'error', 'message': f'Erro de processamento: {e}'}), 400
     
 
-@app.route('/messages/<value>', methods=['POST'])
+def query_sync(marks, limit):
+    """
+    Busca as mensagens mais novas que a marca d'água de cada conversa.
+
+    marks é uma lista de (conversation_id, tipo, last_seen_id). Cada conversa
+    traz no máximo as limit mensagens mais recentes acima da marca, em uma
+    única consulta por tipo (LATERAL sobre o índice (chat, id)). Retorna
+    {conversation_id: (mensagens em ordem cronológica, truncado)}.
+    """
+    result = {}
+
+    for msg_type, model, chat_column in (('QUEUE', MessageQueue, MessageQueue.queue_name),
+                                         ('TOPIC', GroupMessage, GroupMessage.topic_id)):
+        rows = [(name, last_seen) for name, kind, last_seen in marks if kind == msg_type]
+        if not rows:
+            continue
+
+        marks_table = values(
+            column('conversation_id', db.String), column('last_id', db.Integer), name='marks'
+        ).data(rows)
+
+        # Um registro a mais por conversa indica que o delta foi truncado
+        newer = (
+            select(model.id, model.message, model.timestamp, model.sender_id)
+            .where(chat_column == marks_table.c.conversation_id, model.id > marks_table.c.last_id)
+            .order_by(model.id.desc())
+            .limit(limit + 1)
+            .lateral('newer')
+        )
+
+        messages = (
+            db.session.query(marks_table.c.conversation_id, newer.c.id, newer.c.message, newer.c.timestamp, User.username)
+            .select_from(marks_table)
+            .join(newer, true())
+            .join(User, User.id == newer.c.sender_id)
+            .all()
+        )
+
+        for message in messages:
+            result.setdefault(message.conversation_id, []).append(
+                {'id': message.id, 'message': message.message, 'timestamp': message.timestamp, 'username': message.username}
+            )
+
+    for name, chat_messages in result.items():
+        chat_messages.sort(key=lambda message: message['id'])
+        truncated = len(chat_messages) > limit
+        result[name] = (chat_messages[-limit:], truncated)
+
+    return result
+
+
+@api.route('/sync', methods=['POST'])
+def sync():
+    """
+    Sincroniza várias conversas em uma requisição (ex.: depois de reconectar).
+
+    Recebe {"conversations": {conversation_id: last_seen_id}} e retorna apenas
+    as conversas com mensagens novas. Quando há mais que limit mensagens
+    novas, vêm as mais recentes com "truncated": true; as anteriores são
+    buscadas em /load_messages com before_id = next_cursor.
+    """
+    data = request.get_json()
+
+    session['id_user'] = data['id_user']
+
+    if 'id_user' not in session:
+        return make_response(jsonify({'error': 'Você precisa estar logado para sincronizar as conversas.'}), 401)
+
+    seen = data.get('conversations')
+    if not isinstance(seen, dict):
+        return make_response(jsonify({'error': 'conversations deve ser um objeto {conversation_id: last_seen_id}.'}), 400)
+
+    try:
+        limit = int(data.get('limit') or current_app.config['HISTORY_PAGE_SIZE'])
+        limit = max(1, min(limit, current_app.config['HISTORY_MAX_PAGE_SIZE']))
+        seen = {name: int(last_seen or 0) for name, last_seen in seen.items()}
+    except (TypeError, ValueError) as e:
+        return make_response(jsonify({'error': f'Parametros inválidos. {e}'}), 400)
+
+    try:
+        # Só conversas do próprio usuário; o resumo diz se há algo novo sem ler as mensagens
+        conversations = UserConversation.query.filter(
+            UserConversation.user_id == session['id_user'],
+            UserConversation.conversation_id.in_(list(seen)),
+        ).all() if seen else []
+
+        marks = [
+            (conversation.conversation_id, conversation.conversation_type, seen[conversation.conversation_id])
+            for conversation in conversations
+            if (conversation.last_message_id or 0) > seen[conversation.conversation_id]
+        ]
+        deltas = query_sync(marks, limit)
+
+        changed = {}
+        for conversation in conversations:
+            if conversation.conversation_id not in deltas:
+                continue
+            chat_messages, truncated = deltas[conversation.conversation_id]
+            changed[conversation.conversation_id] = {
+                'type': conversation.conversation_type,
+                'messages': chat_messages,
+                'truncated': truncated,
+                'next_cursor': chat_messages[0]['id'] if truncated else None,
+                'last_message_id': conversation.last_message_id,
+                'unread_count': conversation.unread_count,
+            }
+
+        known = {conversation.conversation_id for conversation in conversations}
+        unknown = [name for name in seen if name not in known]
+
+        return make_response(jsonify({'conversations': changed, 'unknown': unknown}), 200)
+    except Exception as e:
+        return make_response(jsonify({'message': f'Erro ao sincronizar conversas: {e}'}), 500)
+
+
+@api.route('/search', methods=['GET', 'POST'])
+def search():
+    """
+    Busca textual nas conversas do usuário, ordenada por relevância.
+
+    GET /search?id_user=&q=&conversation_id=&cursor=&limit= (conversation_id,
+    cursor e limit opcionais); via POST os mesmos campos vão no corpo JSON.
+    Cada resultado traz "highlight", o trecho da mensagem (com HTML escapado)
+    e os termos encontrados entre <mark></mark>.
+    """
+    data = request.args.to_dict() if request.method == 'GET' else request.get_json()
+
+    if data and data.get('id_user'):
+        session['id_user'] = data['id_user']
+
+    if 'id_user' not in session:
+        return make_response(jsonify({'error': 'Você precisa estar logado para buscar mensagens.'}), 401)
+
+    terms = (data.get('q') or '').strip()
+    if not terms:
+        return make_response(jsonify({'error': 'O parametro q é obrigatório.'}), 400)
+
+    try:
+        limit = int(data.get('limit') or SEARCH_PAGE_SIZE)
+        limit = max(1, min(limit, SEARCH_MAX_PAGE_SIZE))
+        results, next_cursor = search_messages(
+            session['id_user'], terms, data.get('conversation_id'), data.get('cursor'), limit
+        )
+    except ValueError as e:
+        return make_response(jsonify({'error': f'Parametros inválidos. {e}'}), 400)
+    except Exception as e:
+        return make_response(jsonify({'message': f'Erro na busca: {e}'}), 500)
+
+    return make_response(jsonify({'results': results, 'next_cursor': next_cursor}), 200)
+
+
+@api.route('/export', methods=['POST'])
+def export():
+    """
+    Exporta o histórico das conversas do usuário em JSON Lines com gzip.
+
+    Recebe {"conversation_id": opcional}; sem ele exporta todas as conversas.
+    A resposta é gerada enquanto as mensagens são lidas do banco, uma linha
+    por mensagem; se a leitura falhar no meio, o gzip chega truncado.
+    """
+    data = request.get_json()
+
+    session['id_user'] = data['id_user']
+
+    if 'id_user' not in session:
+        return make_response(jsonify({'error': 'Você precisa estar logado para exportar mensagens.'}), 401)
+
+    user_id = session['id_user']
+    conversation_id = data.get('conversation_id')
+
+    try:
+        if conversation_id and db.session.get(UserConversation, (user_id, conversation_id)) is None:
+            return make_response(jsonify({'error': 'Conversa não encontrada.'}), 404)
+    except Exception as e:
+        return make_response(jsonify({'message': f'Erro ao exportar mensagens: {e}'}), 500)
+
+    filename = f'export-{conversation_id or "conversas"}.jsonl.gz'
+    return Response(
+        stream_with_context(gzip_jsonl(export_messages(user_id, conversation_id))),
+        mimetype='application/gzip',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
+
+@api.cli.command('export')
+@click.option('--user', 'username', required=True, help='Usuário dono das conversas.')
+@click.option('--conversation', 'conversation_id', help='Exporta só esta conversa.')
+@click.option('--output', '-o', default='-', type=click.Path(dir_okay=False, allow_dash=True),
+              help='Arquivo .jsonl.gz de saída (padrão: saída padrão).')
+def export_command(username, conversation_id, output):
+    """Exporta as conversas de um usuário em JSON Lines com gzip."""
+    user_id = resolve_user_id(username.upper())
+    if user_id is None:
+        raise click.ClickException(f'Usuário {username} não encontrado.')
+
+    with click.open_file(output, 'wb') as file:
+        for chunk in gzip_jsonl(export_messages(user_id, conversation_id)):
+            file.write(chunk)
+
+
+def notify_read(marks):
+    # Avisa os sockets da conversa que as marcas de leitura avançaram
+    for user_id, conversation_id, last_read_id in marks:
+        socket_emits.inc(('read',))
+        socketio.emit('read', {'user_id': user_id, 'conversation_id': conversation_id,
+                               'last_read_id': last_read_id}, room=conversation_id)
+
+
+# Marcas de leitura gravadas com debounce (READ_CURSOR_DEBOUNCE_MS)
+read_cursors = ReadCursorWriter(on_flush=notify_read)
+
+
+def parse_read_mark(data):
+    """Extrai (id_user, conversation_id, last_read_id) de /mark_read ou do evento mark_read."""
+    if not data or not data.get('id_user') or not data.get('conversation_id') or data.get('last_read_id') is None:
+        raise ValueError('id_user, conversation_id e last_read_id são obrigatórios.')
+    return data['id_user'], data['conversation_id'], int(data['last_read_id'])
+
+
+@api.route('/mark_read', methods=['POST'])
+def mark_read():
+    try:
+        user_id, conversation_id, last_read_id = parse_read_mark(request.get_json())
+    except (TypeError, ValueError) as e:
+        return make_response(jsonify({'status': 'error', 'message': f'Parametros inválidos. {e}'}), 400)
+
+    session['id_user'] = user_id
+
+    read_cursors.start(current_app._get_current_object())
+    read_cursors.mark(user_id, conversation_id, last_read_id)
+    return make_response(jsonify({'status': 'success'}), 202)
+
+
+@api.route('/mark_read/status', methods=['GET'])
+def mark_read_status():
+    return make_response(jsonify(read_cursors.stats()), 200)
+
+
+@api.route('/messages/<value>', methods=['POST'])
 def receive_message(value):
     data = request.get_json()
 
@@ -783,47 +1614,143 @@ def receive_message(value):
     username = data['username'].upper()
     message = data['message']
 
-    print(f'message receive from {username}: {message}')
-
-    # Emitir a mensagem para a sala correspondente ao valor
-    socketio.emit('new_message', {'username': username, 'message': message}, room=value)
+    # Emitir a mensagem para a sala correspondente ao valor (trace e idempotency_key vêm do consumidor Java)
+    if not deliver_message(value, {'username': username, 'message': message}, data.get('trace'),
+                           data.get('idempotency_key')):
+        return jsonify({'status': 'success', 'message': 'Mensagem repetida, já emitida.'}), 200
 
     return jsonify({'status': 'success', 'message': 'Mensagem recebida e emitida.'}), 200
 
 
+# Sockets abertos neste processo e conexões recusadas pelo limite
+socket_connections = {'open': 0, 'rejected': 0}
+socket_connections_lock = threading.Lock()
+
+
+@socketio.on('connect')
+def handle_connect(auth=None):
+    with socket_connections_lock:
+        if socket_connections['open'] >= current_app.config['SOCKETIO_MAX_CONNECTIONS']:
+            socket_connections['rejected'] += 1
+            return False
+        socket_connections['open'] += 1
+
+
+@api.route('/socket/status', methods=['GET'])
+def socket_status():
+    with socket_connections_lock:
+        stats = dict(socket_connections)
+    stats['max_connections'] = current_app.config['SOCKETIO_MAX_CONNECTIONS']
+    stats['async_mode'] = socketio.server.eio.async_mode
+    # Publicações e latência do fan-out entre processos (só com SOCKETIO_MESSAGE_QUEUE)
+    if hasattr(socketio.server.manager, 'stats'):
+        stats['fanout'] = socketio.server.manager.stats()
+    stats['coalescer'] = room_emitter.stats()
+    stats['coalescer_local'] = local_room_emitter.stats()
+    return make_response(jsonify(stats), 200)
+
+
+def socket_rooms():
+    # Salas do namespace padrão, sem as salas individuais de cada sid
+    rooms = socketio.server.manager.rooms.get('/', {}) if socketio.server else {}
+    sids = rooms.get(None, {})
+    return sum(1 for room in rooms if room is not None and room not in sids)
+
+
+def java_request_samples():
+    for client in _java_clients():
+        yield from client.stats.histogram.samples(service=client.base_url)
+
+
+metrics_registry.value('socketio_connected_sockets', 'gauge', 'Sockets abertos neste processo.',
+                       lambda: socket_connections['open'])
+metrics_registry.value('socketio_rejected_connections_total', 'counter',
+                       'Conexões recusadas pelo SOCKETIO_MAX_CONNECTIONS.', lambda: socket_connections['rejected'])
+metrics_registry.value('socketio_rooms', 'gauge', 'Salas com sockets neste processo.', socket_rooms)
+metrics_registry.value('socketio_coalesced_messages_total', 'counter',
+                       'Mensagens entregues às salas pelo EmitCoalescer.',
+                       lambda: room_emitter.messages + local_room_emitter.messages)
+metrics_registry.register('java_request_duration_seconds', 'histogram',
+                          'Latência das chamadas aos serviços Java por rota e resultado.', java_request_samples)
+
+
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    if not current_app.config['METRICS_ENABLED']:
+        return make_response(jsonify({'status': 'error', 'message': 'Métricas desligadas (METRICS_ENABLED=0).'}), 404)
+    return Response(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 # Evento para quando um cliente entra em uma sala
 @socketio.on('join')
 def handle_join(data):
     if 'username' not in data:
-        print("Erro: 'username' não fornecido.")
         return make_response(jsonify({'status': 'error', 'message': "Erro: 'username' não fornecido."}),400)
     
 
     if 'room' not in data:
-        print("Erro: 'room' não fornecido.")
         return make_response(jsonify({'status': 'error', 'message': "Erro: 'room' não fornecido."}),400)
     room = data['room']
     join_room(room)
-    print(f'{data["username"]} entrou na sala {room}.')
+
+    if current_app.config['CONSUME_MODE'] == 'stomp':
+        # Descobre o tipo do chat quando o cliente não informa
+        chat_type = (data.get('type') or '').upper()
+        if chat_type not in ('QUEUE', 'TOPIC'):
+            chat_type = 'QUEUE' if db.session.get(LinkQueue, room) else 'TOPIC'
+        try:
+            room_subscriber().join(request.sid, chat_type, room)
+        except Exception as e:
+            print(f'Erro ao assinar o chat {room}: {e}')
+
+# Evento para marcar mensagens como lidas (mesmo formato de /mark_read)
+@socketio.on('mark_read')
+def handle_mark_read(data):
+    try:
+        user_id, conversation_id, last_read_id = parse_read_mark(data)
+    except (TypeError, ValueError):
+        return
+
+    read_cursors.start(current_app._get_current_object())
+    read_cursors.mark(user_id, conversation_id, last_read_id)
+
 # Evento para quando um cliente sai da sala
 @socketio.on('leave')
 def handle_leave(data):
     room = data['room']
     leave_room(room)
-    print(f'{data["username"]} saiu da sala {room}.')
+    if current_app.config['CONSUME_MODE'] == 'stomp':
+        room_subscriber().leave(request.sid, room)
+
+# Evento para quando o socket do cliente é desconectado
+@socketio.on('disconnect')
+def handle_disconnect(reason=None):
+    with socket_connections_lock:
+        socket_connections['open'] -= 1
 
-@app.route('/disconnect', methods=['POST'])
+    if current_app.config['CONSUME_MODE'] == 'stomp':
+        room_subscriber().drop(request.sid)
+
+@api.route('/disconnect', methods=['POST'])
 def disconnect():
     global status
 
     if status == "connected":
         status = "disconnected"
 
+        # No modo 'stomp' as assinaturas são encerradas quando os sockets saem das salas
+        if current_app.config['CONSUME_MODE'] == 'stomp':
+            return jsonify({"status": "success", "message": "Desconectado com sucesso."}), 200
+
         payload = {
             
         }
 
-        response = requests.post(f'{API_URL[1]}/disconnect',  json=payload)
+        try:
+            response = java_api(1).post('/disconnect', json=payload)
+        except requests.exceptions.RequestException as e:
+            status = "connected"
+            return jsonify({"status": "error", "message": f'Erro de conexão com o serviço Java: {e}'}), 503
 
 
         # Retorna a resposta do serviço Java
@@ -837,5 +1764,7 @@ def disconnect():
 
 
 if __name__ == '__main__':
-    print(IP)
+    app = create_app()
+    start_background_workers(app)
+    print(local_ip())
     socketio.run(app, host='0.0.0.0', port=5000)
@@ -0,0 +1,88 @@
+"""
+Compara emits por mensagem com o agrupamento por sala (EmitCoalescer).
+
+Usa um servidor python-socketio com N membros simulados em uma sala: cada
+frame é codificado como seria para o WebSocket e contado, sem rede. Para
+cada tamanho de sala, publica mensagens a uma taxa fixa e mede frames/s
+enviados e o uso de CPU do processo.
+
+    python benchmarks/emit_coalesce.py --members 10 100 1000 --rate 200 --window-ms 25
+"""
+import argparse
+import os
+import sys
+import time
+
+import socketio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emit_coalescer import EmitCoalescer  # noqa: E402
+
+ROOM = 'grupo'
+
+
+def make_server(members):
+    server = socketio.Server(async_mode='threading')
+    counter = {'frames': 0, 'bytes': 0}
+
+    def send_packet(eio_sid, eio_pkt):
+        # Mesmo custo de codificação de um envio real, sem a escrita no socket
+        encoded = eio_pkt.encode()
+        counter['frames'] += 1
+        counter['bytes'] += len(encoded)
+
+    server.eio.send_packet = send_packet
+    for index in range(members):
+        sid = server.manager.connect(f'eio{index}', '/')
+        server.manager.enter_room(sid, '/', ROOM)
+    return server, counter
+
+
+def run(members, rate, seconds, window):
+    server, counter = make_server(members)
+    coalescer = EmitCoalescer(lambda event, data, room: server.emit(event, data, room=room),
+                              window=window)
+
+    total = int(rate * seconds)
+    cpu_start, start = time.process_time(), time.perf_counter()
+    for seq in range(total):
+        # Agenda pela hora ideal de cada mensagem para manter a taxa
+        delay = start + seq / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        coalescer.add(ROOM, {'username': 'BENCH', 'message': f'mensagem {seq}'})
+
+    # Espera a última janela ser emitida
+    while coalescer.stats()['pending']:
+        time.sleep(window or 0.001)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    return {
+        'frames_s': counter['frames'] / elapsed,
+        'kb_s': counter['bytes'] / elapsed / 1024,
+        'cpu': cpu / elapsed * 100,
+        'room_emits': coalescer.frames,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do agrupamento de emits por sala.')
+    parser.add_argument('--members', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--rate', type=float, default=200, help='mensagens por segundo na sala')
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--window-ms', type=float, default=25)
+    args = parser.parse_args()
+
+    print(f'{args.rate:.0f} msg/s por {args.seconds:.0f} s, janela de {args.window_ms:.0f} ms')
+    print(f'{"membros":>8} {"modo":>10} {"frames/s":>10} {"KiB/s":>9} {"CPU %":>6} {"emits":>6}')
+    for members in args.members:
+        for mode, window in (('por msg', 0), ('agrupado', args.window_ms / 1000)):
+            result = run(members, args.rate, args.seconds, window)
+            print(f'{members:>8} {mode:>10} {result["frames_s"]:>10.0f} {result["kb_s"]:>9.0f} '
+                  f'{result["cpu"]:>6.1f} {result["room_emits"]:>6}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Vazão e pico de memória da exportação de conversas (/export).
+
+Cria em um banco descartável uma conversa 1:1 para cada tamanho pedido e
+exporta cada uma em um processo separado, para o pico de memória (ru_maxrss)
+ser só daquela exportação. Compara o streaming (cursor no servidor + gzip em
+pedaços) com o padrão antigo: fetchall da conversa inteira e um único
+json.dumps.
+
+    DATABASE_URL=postgresql://.../bench python benchmarks/export.py --sizes 10000 100000 1000000
+"""
+import argparse
+import gzip
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from message_export import export_messages, gzip_jsonl  # noqa: E402
+from migrations import migrate  # noqa: E402
+from models import MessageQueue, User, db, select, text  # noqa: E402
+
+OWNER = 'BENCH-EXPORT'
+
+
+def seed(size):
+    """Cria (uma vez) o amigo BENCH-EXPORT-<size> e a conversa com size mensagens."""
+    params = {'owner': OWNER, 'friend': f'{OWNER}-{size}', 'size': size}
+    db.session.execute(text('''
+        INSERT INTO "User" (id, username, password_hash, is_online)
+        SELECT md5(name)::uuid::text, name, 'x', false FROM (VALUES (:owner), (:friend)) AS u(name)
+        ON CONFLICT DO NOTHING
+    '''), params)
+    db.session.execute(text('''
+        INSERT INTO link_queue (name, user_one, user_two, pair_key)
+        SELECT md5('chat-' || :friend)::uuid::text, a, b,
+               LEAST(a COLLATE "C", b COLLATE "C") || ':' || GREATEST(a COLLATE "C", b COLLATE "C")
+        FROM (SELECT md5(:owner)::uuid::text AS a, md5(:friend)::uuid::text AS b) AS pair
+        ON CONFLICT DO NOTHING
+    '''), params)
+    chat = db.session.execute(text("SELECT md5('chat-' || :friend)::uuid::text"), params).scalar()
+
+    existing = db.session.execute(text('SELECT count(*) FROM message_queue WHERE queue_name = :chat'),
+                                  {'chat': chat}).scalar()
+    if existing < size:
+        db.session.execute(text('''
+            INSERT INTO message_queue (queue_name, sender_id, timestamp, message, is_read)
+            SELECT :chat, CASE WHEN g % 2 = 0 THEN md5(:owner)::uuid::text ELSE md5(:friend)::uuid::text END,
+                   now() - ((:size - g) || ' seconds')::interval,
+                   'mensagem ' || g || ' ' || md5(g::text), false
+            FROM generate_series(:start, :size) AS g
+        '''), {**params, 'chat': chat, 'start': existing + 1})
+    db.session.commit()
+    return chat
+
+
+def run_once(chat, mode):
+    """Exporta a conversa neste processo e retorna linhas, bytes, segundos e pico de RSS."""
+    owner = db.session.execute(select(User.id).where(User.username == OWNER)).scalar()
+    start = time.perf_counter()
+    rows, size = 0, 0
+
+    if mode == 'stream':
+        def counted():
+            nonlocal rows
+            for record in export_messages(owner, chat):
+                rows += 1
+                yield record
+
+        for chunk in gzip_jsonl(counted()):
+            size += len(chunk)
+    else:
+        # Padrão antigo: a conversa inteira em memória e serializada de uma vez
+        messages = db.session.execute(
+            select(MessageQueue.id, MessageQueue.timestamp, MessageQueue.message, User.username)
+            .join(User, User.id == MessageQueue.sender_id)
+            .where(MessageQueue.queue_name == chat)
+            .order_by(MessageQueue.id)
+        ).all()
+        records = [{'id': m.id, 'timestamp': m.timestamp.isoformat(), 'username': m.username, 'message': m.message}
+                   for m in messages]
+        rows = len(records)
+        size = len(gzip.compress('\n'.join(json.dumps(r, ensure_ascii=False) for r in records).encode()))
+
+    return {
+        'rows': rows,
+        'bytes': size,
+        'seconds': time.perf_counter() - start,
+        'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da exportação de conversas.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--modes', nargs='+', default=['stream', 'fetchall'], choices=['stream', 'fetchall'])
+    parser.add_argument('--run', nargs=2, metavar=('CHAT', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    app = create_app({'SECRET_KEY': 'benchmark'})
+    with app.app_context():
+        if args.run:
+            print(json.dumps(run_once(*args.run)))
+            return
+
+        migrate(db.engine)
+        chats = {size: seed(size) for size in args.sizes}
+
+    print(f'{"mensagens":>10} {"modo":>9} {"msg/s":>9} {"gzip MiB":>9} {"pico RSS":>9}')
+    for size in args.sizes:
+        for mode in args.modes:
+            output = subprocess.run([sys.executable, __file__, '--run', chats[size], mode],
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f'{result["rows"]:>10} {mode:>9} {result["rows"] / result["seconds"]:>9.0f} '
+                  f'{result["bytes"] / 2**20:>9.1f} {result["rss_mb"]:>6.0f} MiB')
+
+
+if __name__ == '__main__':
+    main()
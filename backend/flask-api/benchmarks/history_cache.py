@@ -0,0 +1,76 @@
+"""
+Custo de uma página do histórico (/load_messages) com e sem o response_cache.
+
+Usa a conversa criada por export.py (BENCH-EXPORT x BENCH-EXPORT-<size>) e
+mede, pelo test client do Flask, três situações para a página mais recente:
+corpo fora do cache (consulta + serialização), corpo já no cache e GET
+condicional com a ETag atual (304). Mostra também o tamanho do corpo em cada
+codificação.
+
+    DATABASE_URL=postgresql://.../bench python benchmarks/export.py --sizes 10000
+    DATABASE_URL=postgresql://.../bench python benchmarks/history_cache.py --size 10000 --limits 50 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as api_module  # noqa: E402
+from app import create_app  # noqa: E402
+from models import User, db, select, text  # noqa: E402
+
+OWNER = 'BENCH-EXPORT'
+
+
+def measure(client, query, headers, before, requests):
+    latencies = []
+    for _ in range(requests):
+        before()
+        start = time.perf_counter()
+        response = client.get('/load_messages', query_string=query, headers=headers)
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies) * 1000, response
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do cache de respostas do histórico.')
+    parser.add_argument('--size', type=int, default=10000, help='conversa BENCH-EXPORT-<size> de export.py')
+    parser.add_argument('--limits', type=int, nargs='+', default=[50, 200])
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app({'SECRET_KEY': 'benchmark'})
+    client = app.test_client()
+    friend = f'{OWNER}-{args.size}'
+    with app.app_context():
+        owner = db.session.execute(select(User.id).where(User.username == OWNER)).scalar()
+        chat = db.session.execute(text("SELECT md5('chat-' || :friend)::uuid::text"), {'friend': friend}).scalar()
+    if owner is None:
+        sys.exit(f'Conversa não encontrada: rode antes benchmarks/export.py --sizes {args.size}')
+
+    def clear():
+        api_module.response_cache.bodies.invalidate_where(lambda key: True)
+
+    print(f'{"limit":>5} {"fora do cache":>14} {"no cache":>9} {"304":>8} {"identity":>9} {"gzip":>7} {"br":>7}')
+    for limit in args.limits:
+        query = {'id_user': owner, 'chat': chat, 'type': 'QUEUE', 'friend': friend, 'limit': limit}
+        miss, response = measure(client, query, {}, clear, args.requests)
+        hit, _ = measure(client, query, {}, lambda: None, args.requests)
+        etag = response.headers['ETag']
+        not_modified, _ = measure(client, query, {'If-None-Match': etag}, lambda: None, args.requests)
+
+        sizes = {}
+        for encoding in ('identity', 'gzip', 'br'):
+            encoded = client.get('/load_messages', query_string=query, headers={'Accept-Encoding': encoding})
+            sizes[encoding] = len(encoded.data) if encoded.headers.get('Content-Encoding', 'identity') == encoding else None
+
+        print(f'{limit:>5} {miss:>11.2f} ms {hit:>6.2f} ms {not_modified:>5.2f} ms '
+              + ' '.join(f'{sizes[e]:>{w}}' if sizes[e] else f'{"-":>{w}}'
+                         for e, w in (('identity', 9), ('gzip', 7), ('br', 7))))
+
+
+if __name__ == '__main__':
+    main()
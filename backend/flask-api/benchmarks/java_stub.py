@@ -0,0 +1,173 @@
+"""
+Substituto local dos serviços Java (produtor e consumidor) e do broker.
+
+Atende as duas rotas que a API chama, com as mesmas respostas dos serviços
+reais:
+
+- POST /send_message (produtor, JAVA_API_URLS[0]): aceita a mensagem e,
+  depois de --delay-ms, entrega {username, message} em POST no apiUrl do
+  chat, como o consumidor faz ao receber do broker. O trace (contexto de
+  rastreamento) e a idempotency_key voltam junto, como no consumidor real.
+- POST /connect (consumidor, JAVA_API_URLS[1]): guarda o apiUrl do chat.
+  Chats sem /connect são entregues em --callback-url/<chat>.
+
+GET /status mostra os contadores. As entregas saem de um pool de threads,
+uma por vez e na ordem de chegada em cada chat. --fail-rate faz uma fração
+dos envios responder 500, para exercitar a outbox e o circuit breaker.
+
+    python benchmarks/java_stub.py --ports 8080 8081 --callback-url http://127.0.0.1:5000/messages
+
+A API aponta para ele com JAVA_API_URLS=http://127.0.0.1:8080,http://127.0.0.1:8081
+(PUBLISH_MODE e CONSUME_MODE 'java', os padrões).
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+
+class JavaStub:
+    def __init__(self, callback_url, delay, fail_rate, workers):
+        self.callback_url = callback_url.rstrip('/')
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.api_urls = {}  # chat -> apiUrl recebido no /connect
+        # Fila por chat: uma entrega por vez em cada chat (na ordem), até workers chats em paralelo
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='entrega')
+        self.pending = {}
+        self.http = requests.Session()
+        self.lock = threading.Lock()
+        self.counters = {'connects': 0, 'received': 0, 'rejected': 0, 'delivered': 0, 'delivery_errors': 0}
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def connect(self, data):
+        if not all(data.get(field) for field in ('apiUrl', 'brokerUrl', 'name', 'type')):
+            return 400, {'status': 'error', 'message': 'Todos os campos (apiUrl, brokerUrl, name e type) devem ser fornecidos.'}
+        with self.lock:
+            self.api_urls[data['name']] = data['apiUrl']
+        self.count('connects')
+        return 200, {'status': 'success', 'message': 'Conectado com sucesso.'}
+
+    def send_message(self, data):
+        if not all(data.get(field) for field in ('username', 'message', 'type', 'brokerUrl')):
+            return 400, {'status': 'error', 'message': 'Todos os campos (username, message, type e brokerUrl) devem ser fornecidos.'}
+        if self.fail_rate and random.random() < self.fail_rate:
+            self.count('rejected')
+            return 500, {'status': 'error', 'message': 'Falha simulada no broker'}
+
+        self.count('received')
+        self.enqueue(data['name'], data['username'], data['message'], data.get('trace'), data.get('idempotencyKey'))
+        msg_type = data['type'].upper()
+        return 200, {'status': 'success', 'message': f"{msg_type} Message sent by {data['username']}: {data['message']}"}
+
+    def enqueue(self, name, username, message, trace=None, idempotency_key=None):
+        body = {'username': username, 'message': message}
+        if trace:
+            body['trace'] = trace
+        if idempotency_key:
+            body['idempotency_key'] = idempotency_key
+        with self.lock:
+            pending = self.pending.setdefault(name, deque())
+            pending.append(body)
+            if len(pending) > 1:
+                return  # O chat já tem uma entrega em andamento, que segue com esta
+        self.pool.submit(self.drain, name)
+
+    def drain(self, name):
+        while True:
+            with self.lock:
+                body = self.pending[name][0]
+                url = self.api_urls.get(name) or f'{self.callback_url}/{name}'
+
+            if self.delay:
+                time.sleep(self.delay)
+            try:
+                response = self.http.post(url, json=body, timeout=10)
+                self.count('delivered' if response.status_code == 200 else 'delivery_errors')
+            except requests.RequestException:
+                self.count('delivery_errors')
+
+            with self.lock:
+                pending = self.pending[name]
+                pending.popleft()
+                if not pending:
+                    del self.pending[name]
+                    return
+
+    def status(self):
+        with self.lock:
+            return {**self.counters, 'chats': len(self.api_urls),
+                    'pending': sum(len(pending) for pending in self.pending.values())}
+
+
+def make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/status':
+                self.reply(200, stub.status())
+            else:
+                self.reply(404, {'status': 'error', 'message': 'Rota não encontrada.'})
+
+        def do_POST(self):
+            try:
+                data = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+            except ValueError:
+                self.reply(400, {'status': 'error', 'message': 'JSON inválido.'})
+                return
+
+            if self.path == '/send_message':
+                self.reply(*stub.send_message(data))
+            elif self.path == '/connect':
+                self.reply(*stub.connect(data))
+            else:
+                self.reply(404, {'status': 'error', 'message': 'Rota não encontrada.'})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Substituto local dos serviços Java.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--ports', type=int, nargs='+', default=[8080, 8081],
+                        help='as duas rotas respondem em todas as portas')
+    parser.add_argument('--callback-url', default='http://127.0.0.1:5000/messages')
+    parser.add_argument('--delay-ms', type=float, default=0, help='atraso simulado do broker por mensagem')
+    parser.add_argument('--fail-rate', type=float, default=0, help='fração dos envios que respondem 500')
+    parser.add_argument('--workers', type=int, default=32, help='entregas simultâneas para a API')
+    args = parser.parse_args()
+
+    stub = JavaStub(args.callback_url, args.delay_ms / 1000, args.fail_rate, args.workers)
+    servers = [ThreadingHTTPServer((args.host, port), make_handler(stub)) for port in args.ports]
+    for server in servers[1:]:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f'Serviço Java simulado em {", ".join(f"{args.host}:{port}" for port in args.ports)}')
+    try:
+        servers[0].serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
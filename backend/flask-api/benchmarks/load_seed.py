@@ -0,0 +1,133 @@
+"""
+Base sintética para o teste de carga (load_test.py).
+
+Cria direto no banco (generate_series, idempotente) os usuários LOAD0..N-1,
+todos com a mesma senha, amizades em anel (cada usuário com os k
+seguintes; o trigger da migração 2 cria a volta), o chat 1:1 de cada
+amizade, grupos LOAD-GROUP-j com group_size membros consecutivos e um
+histórico de mensagens em cada chat e grupo. Os usuários 2i e 2i+1 são
+sempre amigos: são os pares usados pelo teste de carga.
+
+    DATABASE_URL=postgresql://.../load python benchmarks/load_seed.py --users 200 --history 200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import create_app  # noqa: E402
+from migrations import migrate  # noqa: E402
+from models import db, text  # noqa: E402
+from password_pool import HASH_METHOD  # noqa: E402
+
+PREFIX = 'LOAD'
+PASSWORD = 'load'
+
+
+def seed(users, friends, group_size, history, password):
+    # Um só hash para todos: o login verifica a senha como faria com qualquer usuário
+    params = {'users': users, 'k': friends, 'group_size': group_size, 'history': history,
+              'prefix': PREFIX, 'hash': generate_password_hash(password, method=HASH_METHOD)}
+
+    db.session.execute(text('''
+        INSERT INTO "User" (id, username, password_hash, is_online)
+        SELECT md5('load-user-' || i)::uuid::text, :prefix || i, :hash, false
+        FROM generate_series(0, :users - 1) AS i
+        ON CONFLICT DO NOTHING
+    '''), params)
+
+    db.session.execute(text('''
+        INSERT INTO friends (id_user, id_friend)
+        SELECT md5('load-user-' || i)::uuid::text, md5('load-user-' || ((i + k) % :users))::uuid::text
+        FROM generate_series(0, :users - 1) AS i, generate_series(1, :k) AS k
+        WHERE (i + k) % :users <> i
+        ON CONFLICT DO NOTHING
+    '''), params)
+
+    db.session.execute(text('''
+        INSERT INTO link_queue (name, user_one, user_two, pair_key)
+        SELECT md5('load-chat-' || pair_key)::uuid::text, a, b, pair_key
+        FROM (
+            SELECT DISTINCT a, b, LEAST(a COLLATE "C", b COLLATE "C") || ':' || GREATEST(a COLLATE "C", b COLLATE "C") AS pair_key
+            FROM generate_series(0, :users - 1) AS i, generate_series(1, :k) AS k,
+                 LATERAL (SELECT md5('load-user-' || i)::uuid::text AS a,
+                                 md5('load-user-' || ((i + k) % :users))::uuid::text AS b) AS pair
+            WHERE (i + k) % :users <> i
+        ) AS pairs
+        ON CONFLICT DO NOTHING
+    '''), params)
+
+    if group_size > 1:
+        db.session.execute(text('''
+            INSERT INTO message_topic (name, group_name, owner_id, created_at)
+            SELECT md5('load-group-' || j)::uuid::text, :prefix || '-GROUP-' || j,
+                   md5('load-user-' || (j * :group_size))::uuid::text, now()
+            FROM generate_series(0, :users / :group_size - 1) AS j
+            ON CONFLICT DO NOTHING
+        '''), params)
+        db.session.execute(text('''
+            INSERT INTO topic_membership (topic_id, user_id)
+            SELECT md5('load-group-' || (i / :group_size))::uuid::text, md5('load-user-' || i)::uuid::text
+            FROM generate_series(0, :users / :group_size * :group_size - 1) AS i
+            ON CONFLICT DO NOTHING
+        '''), params)
+    db.session.commit()
+
+    if history > 0:
+        # Histórico só nos chats ainda vazios, para a semeadura poder ser repetida
+        db.session.execute(text('''
+            INSERT INTO message_queue (queue_name, sender_id, timestamp, message, is_read)
+            SELECT lq.name, CASE WHEN g % 2 = 0 THEN lq.user_one ELSE lq.user_two END,
+                   now() - ((:history - g) || ' minutes')::interval, 'histórico ' || g, false
+            FROM link_queue lq, generate_series(1, :history) AS g
+            WHERE lq.name = md5('load-chat-' || lq.pair_key)::uuid::text
+              AND NOT EXISTS (SELECT 1 FROM message_queue mq WHERE mq.queue_name = lq.name)
+        '''), params)
+        db.session.execute(text('''
+            INSERT INTO group_message (topic_id, sender_id, timestamp, message, is_read)
+            SELECT t.topic_id, t.members[1 + g % cardinality(t.members)],
+                   now() - ((:history - g) || ' minutes')::interval, 'histórico ' || g, false
+            FROM (SELECT topic_id, array_agg(user_id ORDER BY user_id) AS members
+                  FROM topic_membership
+                  WHERE topic_id IN (SELECT name FROM message_topic WHERE group_name LIKE :prefix || '-GROUP-%')
+                  GROUP BY topic_id) AS t,
+                 generate_series(1, :history) AS g
+            WHERE NOT EXISTS (SELECT 1 FROM group_message gm WHERE gm.topic_id = t.topic_id)
+        '''), params)
+        db.session.commit()
+
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Base sintética do teste de carga.')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--friends', type=int, default=3, help='amigos seguintes no anel de cada usuário')
+    parser.add_argument('--group-size', type=int, default=10, help='membros por grupo (0 ou 1: sem grupos)')
+    parser.add_argument('--history', type=int, default=100, help='mensagens iniciais por chat e grupo')
+    parser.add_argument('--password', default=PASSWORD)
+    args = parser.parse_args()
+
+    app = create_app({'SECRET_KEY': 'benchmark'})
+    with app.app_context():
+        migrate(db.engine)
+        start = time.perf_counter()
+        seed(args.users, args.friends, args.group_size, args.history, args.password)
+        counts = db.session.execute(text('''
+            SELECT (SELECT count(*) FROM "User" WHERE username LIKE :prefix || '%'),
+                   (SELECT count(*) FROM link_queue),
+                   (SELECT count(*) FROM message_topic WHERE group_name LIKE :prefix || '-GROUP-%'),
+                   (SELECT count(*) FROM message_queue) + (SELECT count(*) FROM group_message)
+        '''), {'prefix': PREFIX}).one()
+
+    print(f'{counts[0]} usuários, {counts[1]} chats, {counts[2]} grupos, {counts[3]} mensagens '
+          f'({time.perf_counter() - start:.1f} s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+"""
+Teste de carga de ponta a ponta: login -> connect -> envio e recebimento.
+
+Cada usuário virtual é um usuário LOAD<i> de load_seed.py: faz login, abre o
+chat 1:1 com o par (LOAD<i xor 1>) ou, com --type TOPIC, o grupo
+LOAD-GROUP-<i / group_size>, conecta o socket e entra na sala. Quando todos
+estão na sala, cada um envia --messages mensagens por /send_message, com
+--interval segundos entre elas. A mensagem leva o instante do envio e os
+outros membros da sala medem a entrega pelo socket (envio -> new_message),
+passando pela outbox, pelo serviço Java (ou java_stub.py) e por
+/messages/<sala>.
+
+Mostra latência (p50/p95/p99/max), vazão e erros de cada operação e grava
+o resultado em JSON (--output), com o commit e os parâmetros da execução,
+para comparar execuções com --compare:
+
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --users 100 --output base.json
+    python benchmarks/load_test.py --compare base.json novo.json
+
+Requer python-socketio[client] (websocket-client) na máquina que gera a carga.
+Os instantes de envio e entrega vêm do relógio desta máquina.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+import socketio
+
+PREFIX = 'LOAD'
+PASSWORD = 'load'
+# Status esperado de cada operação HTTP
+EXPECTED_STATUS = {'login': 200, 'connect': 200, 'send_message': 202}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Recorder:
+    """Latências e erros por operação, de todas as threads."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def record(self, operation, seconds=None, error=None):
+        with self.lock:
+            if error is None:
+                self.latencies.setdefault(operation, []).append(seconds)
+            else:
+                key = f'{operation}: {error}'
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def error_count(self, operation):
+        return sum(count for key, count in self.errors.items() if key.startswith(f'{operation}:'))
+
+    def summary(self, operation, seconds):
+        values = self.latencies.get(operation, [])
+        result = {'count': len(values), 'errors': self.error_count(operation),
+                  'per_second': round(len(values) / seconds, 1) if seconds else None}
+        if values:
+            result.update({
+                'mean_ms': round(statistics.mean(values) * 1000, 2),
+                'p50_ms': round(statistics.median(values) * 1000, 2),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+                'max_ms': round(max(values) * 1000, 2),
+            })
+        return result
+
+
+class VirtualUser:
+    def __init__(self, index, args, recorder):
+        self.index = index
+        self.args = args
+        self.recorder = recorder
+        self.username = f'{PREFIX}{index}'
+        self.http = requests.Session()
+        self.client = socketio.Client(reconnection=False)
+        self.client.on('new_message', self.on_message)
+        self.client.on('new_messages', lambda data: [self.on_message(message) for message in data['messages']])
+        self.session = None
+        self.room = None
+        self.sent = 0
+
+    @property
+    def target(self):
+        if self.args.type == 'TOPIC':
+            return f'{PREFIX}-GROUP-{self.index // self.args.group_size}'
+        partner = self.index ^ 1
+        return f'{PREFIX}{partner if partner < self.args.users else self.index - 1}'
+
+    def call(self, operation, path, body):
+        start = time.perf_counter()
+        try:
+            response = self.http.post(f'{self.args.url}{path}', json=body, timeout=self.args.timeout)
+        except requests.RequestException as e:
+            self.recorder.record(operation, error=type(e).__name__)
+            return None
+        elapsed = time.perf_counter() - start
+
+        if response.status_code != EXPECTED_STATUS[operation]:
+            self.recorder.record(operation, error=response.status_code)
+            return None
+        self.recorder.record(operation, elapsed)
+        return response.json()
+
+    def setup(self):
+        """Login, connect e entrada na sala; retorna a sala ou None."""
+        data = self.call('login', '/login', {'username': self.username, 'password': self.args.password})
+        if not data:
+            return None
+        self.session = data['session']
+
+        data = self.call('connect', '/connect', {**self.session, 'name': self.target, 'type': self.args.type})
+        if not data:
+            return None
+        room = data['session']['chat']
+
+        start = time.perf_counter()
+        try:
+            self.client.connect(self.args.url, transports=['websocket'], wait_timeout=self.args.timeout)
+            self.client.emit('join', {'room': room, 'username': self.username, 'type': self.args.type})
+        except Exception as e:
+            self.recorder.record('socket_join', error=type(e).__name__)
+            return None
+        self.recorder.record('socket_join', time.perf_counter() - start)
+        self.room = room
+        return room
+
+    def run(self):
+        for seq in range(self.args.messages):
+            body = {**self.session, 'chat': self.room, 'name': self.target, 'type': self.args.type,
+                    'message': json.dumps({'vu': self.index, 'seq': seq, 't': time.time()})}
+            if self.call('send_message', '/send_message', body):
+                self.sent += 1
+            time.sleep(self.args.interval)
+
+    def on_message(self, data):
+        try:
+            message = json.loads(data['message'])
+            sender, sent_at = message['vu'], message['t']
+        except (KeyError, TypeError, ValueError):
+            return
+        if sender != self.index:
+            self.recorder.record('delivery', time.time() - sent_at)
+
+    def close(self):
+        if self.client.connected:
+            self.client.disconnect()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def fetch_status(url):
+    try:
+        return requests.get(url, timeout=5).json()
+    except (requests.RequestException, ValueError) as e:
+        return {'error': str(e)}
+
+
+def run(args):
+    recorder = Recorder()
+    users = [VirtualUser(index, args, recorder) for index in range(args.users)]
+    rooms = {}
+    started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    # Subida: os usuários entram aos poucos (--ramp por segundo) e esperam todos na sala
+    start = time.perf_counter()
+    threads = []
+    for user in users:
+        thread = threading.Thread(target=lambda user=user: user.setup())
+        thread.start()
+        threads.append(thread)
+        time.sleep(1 / args.ramp)
+    for thread in threads:
+        thread.join()
+    setup_seconds = time.perf_counter() - start
+
+    active = [user for user in users if user.room]
+    for user in active:
+        rooms[user.room] = rooms.get(user.room, 0) + 1
+    print(f'Na sala: {len(active)}/{len(users)} usuários em {setup_seconds:.1f} s')
+    # Dá tempo para os últimos 'join' chegarem antes de enviar
+    time.sleep(1)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=user.run) for user in active]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    send_seconds = time.perf_counter() - start
+
+    # Cada envio aceito deve chegar aos outros membros da sala que estão conectados
+    expected = sum(user.sent * (rooms[user.room] - 1) for user in active)
+    deadline = time.monotonic() + args.drain
+    while len(recorder.latencies.get('delivery', [])) < expected and time.monotonic() < deadline:
+        time.sleep(0.1)
+    delivery_seconds = time.perf_counter() - start
+
+    server = {path: fetch_status(f'{args.url}{path}') for path in ('/socket/status', '/outbox/status')}
+    if args.stub_url:
+        server['java_stub'] = fetch_status(f'{args.stub_url}/status')
+    for user in users:
+        user.close()
+
+    operations = {operation: recorder.summary(operation, setup_seconds)
+                  for operation in ('login', 'connect', 'socket_join')}
+    operations['send_message'] = recorder.summary('send_message', send_seconds)
+    operations['delivery'] = recorder.summary('delivery', delivery_seconds)
+    operations['delivery']['expected'] = expected
+    operations['delivery']['missing'] = max(expected - operations['delivery']['count'], 0)
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'started_at': started_at,
+            'args': {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'password')},
+        },
+        'seconds': {'setup': round(setup_seconds, 2), 'send': round(send_seconds, 2),
+                    'delivery': round(delivery_seconds, 2)},
+        'operations': operations,
+        'errors': recorder.errors,
+        'server': server,
+    }
+
+
+def print_report(result):
+    print(f'{"operação":>13} {"ok":>6} {"erros":>6} {"por s":>7} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"max ms":>8}')
+    for operation, stats in result['operations'].items():
+        print(f'{operation:>13} {stats["count"]:>6} {stats["errors"]:>6} {stats["per_second"] or 0:>7.1f} '
+              + ' '.join(f'{stats.get(column, 0):>8.1f}' for column in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms')))
+    delivery = result['operations']['delivery']
+    print(f'Entregas: {delivery["count"]}/{delivery["expected"]} ({delivery["missing"]} faltando)')
+    for key, count in sorted(result['errors'].items()):
+        print(f'  erro {key}: {count}')
+
+
+def compare(paths):
+    """Diferença de p50, p99, vazão e erros entre duas execuções (B em relação a A)."""
+    first, second = (json.load(open(path)) for path in paths)
+    print(f'A: {paths[0]} (commit {first["meta"]["commit"]})')
+    print(f'B: {paths[1]} (commit {second["meta"]["commit"]})')
+    print(f'{"operação":>13} {"métrica":>10} {"A":>9} {"B":>9} {"B/A":>7}')
+    for operation, stats in first['operations'].items():
+        other = second['operations'].get(operation, {})
+        for metric in ('p50_ms', 'p99_ms', 'per_second', 'errors'):
+            a, b = stats.get(metric), other.get(metric)
+            if a is None or b is None:
+                continue
+            ratio = f'{b / a:>6.2f}x' if a else f'{"-":>7}'
+            print(f'{operation:>13} {metric:>10} {a:>9} {b:>9} {ratio}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga de ponta a ponta.')
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--users', type=int, default=50, help='usuários virtuais (LOAD0..N-1 de load_seed.py)')
+    parser.add_argument('--type', default='QUEUE', choices=['QUEUE', 'TOPIC'])
+    parser.add_argument('--group-size', type=int, default=10, help='o mesmo de load_seed.py')
+    parser.add_argument('--messages', type=int, default=20, help='mensagens por usuário')
+    parser.add_argument('--interval', type=float, default=0.5, help='segundos entre mensagens de um usuário')
+    parser.add_argument('--ramp', type=float, default=50, help='novos usuários por segundo')
+    parser.add_argument('--drain', type=float, default=10, help='espera máxima pelas entregas depois do envio')
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('--password', default=PASSWORD)
+    parser.add_argument('--stub-url', help='java_stub.py, para incluir os contadores dele no resultado')
+    parser.add_argument('--output', help='grava o resultado em JSON')
+    parser.add_argument('--compare', nargs=2, metavar=('A.json', 'B.json'), help='compara duas execuções')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare)
+        return
+
+    result = run(args)
+    print_report(result)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(result, output, indent=2)
+        print(f'Resultado em {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark da busca textual (/search) em uma base sintética.
+
+Gera usuários, chats 1:1 e mensagens direto no banco (generate_series), com
+vocabulário de frequência desigual: poucas palavras muito comuns e uma cauda
+longa de palavras raras. Depois mede search_messages para usuários e termos
+aleatórios, separados por faixa de frequência do termo.
+
+Use um banco descartável:
+
+    DATABASE_URL=postgresql://.../bench python benchmarks/search.py --seed --messages 10000000
+    DATABASE_URL=postgresql://.../bench python benchmarks/search.py --queries 300
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from message_search import search_messages  # noqa: E402
+from migrations import migrate  # noqa: E402
+from models import db, text  # noqa: E402
+
+VOCABULARY = 20000
+BATCH = 500000
+
+# Faixas de termos: o expoente 4 do gerador concentra as mensagens nas palavras de índice baixo
+TIERS = {
+    'comum': (0, 10),
+    'media': (500, 2000),
+    'rara': (10000, VOCABULARY),
+}
+
+
+def seed(users, chats_per_user, messages):
+    db.session.execute(text('''
+        INSERT INTO "User" (id, username, password_hash, is_online)
+        SELECT md5('bench-user-' || i)::uuid::text, 'BENCH' || i, 'x', false
+        FROM generate_series(1, :users) AS i
+        ON CONFLICT DO NOTHING
+    '''), {'users': users})
+
+    # Cada usuário conversa com os k seguintes: pares distintos enquanto k < users / 2
+    db.session.execute(text('''
+        INSERT INTO link_queue (name, user_one, user_two, pair_key)
+        SELECT md5('bench-chat-' || i || '-' || k)::uuid::text, a, b,
+               LEAST(a COLLATE "C", b COLLATE "C") || ':' || GREATEST(a COLLATE "C", b COLLATE "C")
+        FROM generate_series(1, :users) AS i,
+             generate_series(1, :k) AS k,
+             LATERAL (SELECT md5('bench-user-' || i)::uuid::text AS a,
+                             md5('bench-user-' || ((i + k - 1) % :users + 1))::uuid::text AS b) AS pair
+        ON CONFLICT DO NOTHING
+    '''), {'users': users, 'k': chats_per_user})
+    db.session.commit()
+
+    chats = users * chats_per_user
+    for start in range(0, messages, BATCH):
+        count = min(BATCH, messages - start)
+        begin = time.perf_counter()
+        db.session.execute(text('''
+            INSERT INTO message_queue (queue_name, sender_id, timestamp, message, is_read)
+            SELECT lq.name, CASE WHEN g % 2 = 0 THEN lq.user_one ELSE lq.user_two END,
+                   now() - (g || ' seconds')::interval,
+                   array_to_string(ARRAY(
+                       SELECT 'p' || floor(power(random(), 4) * :vocabulary)::int
+                       FROM generate_series(1, 4 + g % 12)
+                   ), ' '), false
+            FROM generate_series(:start, :stop) AS g
+            JOIN link_queue lq ON lq.name = md5('bench-chat-' || (g % :users + 1) || '-' || (g / :users % :k + 1))::uuid::text
+        '''), {'start': start, 'stop': start + count - 1, 'vocabulary': VOCABULARY,
+               'users': users, 'k': chats_per_user})
+        db.session.commit()
+        print(f'{start + count}/{messages} mensagens ({time.perf_counter() - begin:.1f} s no lote)')
+
+    db.session.execute(text('ANALYZE message_queue'))
+    db.session.commit()
+    print(f'{users} usuários, {chats} chats, {messages} mensagens')
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_queries(users, queries, limit):
+    user_ids = [row[0] for row in db.session.execute(text('''
+        SELECT id FROM "User" WHERE username LIKE 'BENCH%' ORDER BY random() LIMIT :users
+    '''), {'users': users})]
+
+    for tier, (low, high) in TIERS.items():
+        latencies, found = [], 0
+        for _ in range(queries):
+            user_id = random.choice(user_ids)
+            term = f'p{random.randrange(low, high)}'
+            start = time.perf_counter()
+            results, next_cursor = search_messages(user_id, term, limit=limit)
+            # Segunda página pelo cursor, como faria o cliente
+            if next_cursor:
+                search_messages(user_id, term, cursor=next_cursor, limit=limit)
+            latencies.append((time.perf_counter() - start) / (2 if next_cursor else 1))
+            found += len(results)
+            db.session.rollback()
+
+        print(f'{tier:>6}: p50 {statistics.median(latencies) * 1000:.1f} ms, '
+              f'p95 {percentile(latencies, 0.95) * 1000:.1f} ms, '
+              f'max {max(latencies) * 1000:.1f} ms, {found / queries:.1f} resultados/página')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da busca textual.')
+    parser.add_argument('--seed', action='store_true', help='gera a base sintética antes de medir')
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--chats-per-user', type=int, default=5)
+    parser.add_argument('--messages', type=int, default=10_000_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app({'SECRET_KEY': 'benchmark'})
+    with app.app_context():
+        migrate(db.engine)
+        if args.seed:
+            seed(args.users, args.chats_per_user, args.messages)
+        run_queries(args.users, args.queries, args.limit)
+
+
+if __name__ == '__main__':
+    main()
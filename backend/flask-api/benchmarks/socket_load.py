@@ -0,0 +1,116 @@
+"""
+Teste de carga do Socket.IO: quantos clientes WebSocket um processo sustenta.
+
+Abre N clientes (transporte websocket), todos na mesma sala, e publica
+mensagens pela rota /messages/<sala>, a mesma usada pelo consumidor Java.
+Mede conexões aceitas/recusadas, a taxa de entrega e a latência de
+entrega (publicação -> recebimento em cada cliente).
+
+Uso (com o servidor no ar):
+
+    python benchmarks/socket_load.py --url http://localhost:5000 --clients 500
+
+Requer python-socketio[client] (websocket-client) na máquina que gera a carga.
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+
+import requests
+import socketio
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class LoadClient:
+    def __init__(self, index, url, room, latencies, lock):
+        self.index = index
+        self.url = url
+        self.room = room
+        self.latencies = latencies
+        self.lock = lock
+        self.received = 0
+        self.client = socketio.Client(reconnection=False)
+        self.client.on('new_message', self.on_message)
+
+    def on_message(self, data):
+        try:
+            sent_at = json.loads(data['message'])['t']
+        except (KeyError, TypeError, ValueError):
+            return
+        with self.lock:
+            self.latencies.append(time.time() - sent_at)
+        self.received += 1
+
+    def connect(self):
+        self.client.connect(self.url, transports=['websocket'], wait_timeout=10)
+        self.client.emit('join', {'username': f'load{self.index}', 'room': self.room})
+
+    def close(self):
+        if self.client.connected:
+            self.client.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga de clientes Socket.IO.')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--ramp', type=float, default=100, help='novas conexões por segundo')
+    parser.add_argument('--messages', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.5, help='segundos entre mensagens')
+    parser.add_argument('--room', default='loadtest')
+    args = parser.parse_args()
+
+    latencies, lock = [], threading.Lock()
+    clients, failed = [], 0
+
+    start = time.perf_counter()
+    for index in range(args.clients):
+        client = LoadClient(index, args.url, args.room, latencies, lock)
+        try:
+            client.connect()
+            clients.append(client)
+        except Exception as e:
+            failed += 1
+            if failed == 1:
+                print(f'Primeira falha de conexão: {e}')
+        time.sleep(1 / args.ramp)
+    connect_seconds = time.perf_counter() - start
+    print(f'Conectados: {len(clients)}/{args.clients} em {connect_seconds:.1f} s ({failed} falhas)')
+
+    # Dá tempo para os últimos 'join' chegarem antes de publicar
+    time.sleep(1)
+
+    for seq in range(args.messages):
+        requests.post(f'{args.url}/messages/{args.room}', json={
+            'username': 'load',
+            'message': json.dumps({'seq': seq, 't': time.time()}),
+        }, timeout=10)
+        time.sleep(args.interval)
+    time.sleep(2)
+
+    expected = len(clients) * args.messages
+    delivered = len(latencies)
+    print(f'Entregues: {delivered}/{expected} ({100 * delivered / max(expected, 1):.1f}%)')
+    if latencies:
+        print(f'Latência: p50 {statistics.median(latencies) * 1000:.0f} ms, '
+              f'p95 {percentile(latencies, 0.95) * 1000:.0f} ms, '
+              f'p99 {percentile(latencies, 0.99) * 1000:.0f} ms, '
+              f'max {max(latencies) * 1000:.0f} ms')
+
+    try:
+        print('Servidor:', requests.get(f'{args.url}/socket/status', timeout=10).json())
+    except Exception as e:
+        print(f'Falha ao consultar /socket/status: {e}')
+
+    for client in clients:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
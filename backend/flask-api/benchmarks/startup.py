@@ -0,0 +1,74 @@
+"""
+Mede o tempo de subida de um worker: import do app.py + create_app().
+
+Cada amostra roda em um processo Python novo, como um worker recém-criado.
+O import das dependências (Flask, SQLAlchemy, requests...) é medido à parte
+para separar o custo do próprio código do custo fixo das bibliotecas.
+Uso (na pasta backend/flask-api):
+
+    python benchmarks/startup.py --runs 20 --budget-ms 300
+
+Sai com código 1 se a mediana passar do orçamento.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executado em cada processo filho: imprime os tempos de cada etapa em ms
+PROBE = '''
+import time
+start = time.perf_counter()
+import flask, flask_cors, flask_socketio, flask_sqlalchemy, requests, stomp
+deps = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print((deps - start) * 1000, (imported - deps) * 1000, (created - imported) * 1000)
+'''
+
+STAGES = ('dependências', 'import app', 'create_app()')
+
+
+def sample(env):
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=API_DIR, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout.strip().splitlines()[-1]
+    return tuple(float(value) for value in output.split())
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tempo de subida do app Flask.')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=300)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('SECRET_KEY', 'benchmark')
+    env.pop('MIGRATE_ON_START', None)
+
+    samples = [sample(env) for _ in range(args.runs)]
+    totals = [sum(stages) for stages in samples]
+
+    for index, stage in enumerate(STAGES):
+        print(f'{stage + ":":14} mediana {statistics.median(s[index] for s in samples):.1f} ms')
+    print(f'{"total:":14} mediana {statistics.median(totals):.1f} ms, '
+          f'p95 {percentile(totals, 0.95):.1f} ms, max {max(totals):.1f} ms')
+
+    if statistics.median(totals) > args.budget_ms:
+        print(f'Acima do orçamento de {args.budget_ms:.0f} ms')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Latência das mensagens por trecho, a partir dos spans de TRACE_EXPORT_FILE.
+
+Lê o arquivo JSON Lines (um span Zipkin v2 por linha) gravado pela API e
+pelo relay da outbox e mostra, por trecho (send_message, outbox, publish,
+broker, emit) e para a mensagem inteira, contagem e p50/p95/p99/max. Os
+trechos se sobrepõem: 'broker' começa quando o relay começa a publicar,
+junto com 'publish'.
+
+    TRACE_EXPORT_FILE=/tmp/spans.jsonl gunicorn ... &
+    python benchmarks/load_test.py --users 20
+    python benchmarks/trace_report.py /tmp/spans.jsonl
+"""
+import argparse
+import json
+import statistics
+
+HOPS = ('send_message', 'outbox', 'publish', 'broker', 'emit', 'message')
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latência das mensagens por trecho.')
+    parser.add_argument('paths', nargs='+', help='arquivos de spans (JSON Lines)')
+    parser.add_argument('--slowest', type=int, default=0, help='mostra os trechos das N mensagens mais lentas')
+    args = parser.parse_args()
+
+    durations = {}
+    traces = {}
+    for path in args.paths:
+        with open(path, encoding='utf-8') as spans:
+            for line in spans:
+                span = json.loads(line)
+                seconds = span['duration'] / 1_000_000
+                durations.setdefault(span['name'], []).append(seconds)
+                traces.setdefault(span['traceId'], {})[span['name']] = seconds
+
+    print(f'{"trecho":>13} {"spans":>6} {"média ms":>9} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"max ms":>8}')
+    for hop in sorted(durations, key=lambda name: HOPS.index(name) if name in HOPS else len(HOPS)):
+        values = durations[hop]
+        print(f'{hop:>13} {len(values):>6} {statistics.mean(values) * 1000:>9.1f} '
+              + ' '.join(f'{value * 1000:>8.1f}' for value in (statistics.median(values), percentile(values, 0.95),
+                                                               percentile(values, 0.99), max(values))))
+
+    delivered = [hops for hops in traces.values() if 'message' in hops]
+    print(f'Mensagens entregues: {len(delivered)} de {len(traces)} rastreadas')
+
+    for trace_id, hops in sorted(traces.items(), key=lambda item: -item[1].get('message', 0))[:args.slowest]:
+        print(f'{trace_id} ' + ' '.join(f'{hop}={hops[hop] * 1000:.1f}' for hop in HOPS if hop in hops))
+
+
+if __name__ == '__main__':
+    main()
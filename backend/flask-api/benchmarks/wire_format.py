@@ -0,0 +1,84 @@
+"""
+Bytes e tempo de serialização: JSON (jsonify) x msgpack em colunas.
+
+Monta páginas do histórico com o formato de query_history (id, message,
+timestamp, username, read_by) e lotes 'new_messages' do socket, e compara o
+caminho atual em JSON com wire_format.pack e com o pacote msgpack do
+Socket.IO. Não acessa o banco.
+
+    python benchmarks/wire_format.py --rows 50 200 1000
+"""
+import argparse
+import gzip
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from socketio import packet  # noqa: E402
+
+from app import create_app  # noqa: E402
+from wire_format import msgpack_packet_class, pack  # noqa: E402
+
+WORDS = ['oi', 'tudo', 'bem', 'amanhã', 'reunião', 'projeto', 'ok', 'valeu', 'depois', 'vejo', 'isso', 'agora']
+
+
+def history_page(rows):
+    start = datetime(2024, 5, 1, 12, 0)
+    return {
+        'status': 'success',
+        'messages': [{
+            'id': 100000 + i,
+            'message': ' '.join(random.choices(WORDS, k=random.randint(2, 14))),
+            'timestamp': start + timedelta(seconds=17 * i),
+            'username': random.choice(['ALICE', 'BOB']),
+            'read_by': random.randint(0, 1),
+        } for i in range(rows)],
+        'next_cursor': 100000,
+    }
+
+
+def socket_batch(rows):
+    return ['new_messages', {'messages': [{'username': random.choice(['ALICE', 'BOB']),
+                                           'message': ' '.join(random.choices(WORDS, k=random.randint(2, 14)))}
+                                          for _ in range(rows)]}]
+
+
+def timed(encode, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        body = encode()
+    return (time.perf_counter() - start) / repeat * 1e6, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON x msgpack em colunas.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app({'SECRET_KEY': 'benchmark'})
+    json_packet, msgpack_packet = packet.Packet, msgpack_packet_class()
+
+    print(f'{"payload":>14} {"linhas":>6} {"formato":>8} {"µs/encode":>10} {"bytes":>8} {"gzip":>7}')
+    with app.app_context():
+        for rows in args.rows:
+            page = history_page(rows)
+            batch = socket_batch(rows)
+            cases = [
+                ('histórico', 'json', lambda: app.json.response(page).get_data()),
+                ('histórico', 'msgpack', lambda: pack(page)),
+                ('new_messages', 'json', lambda: json_packet(packet.EVENT, data=batch, namespace='/').encode()),
+                ('new_messages', 'msgpack', lambda: msgpack_packet(packet.EVENT, data=batch, namespace='/').encode()),
+            ]
+            for name, wire, encode in cases:
+                micros, body = timed(encode, args.repeat)
+                body = body.encode() if isinstance(body, str) else body
+                print(f'{name:>14} {rows:>6} {wire:>8} {micros:>10.1f} {len(body):>8} {len(gzip.compress(body)):>7}')
+
+
+if __name__ == '__main__':
+    main()
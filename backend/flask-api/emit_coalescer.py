@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+
+
+# Configuração padrão do agrupamento de mensagens por sala (0 desliga)
+WINDOW = float(os.getenv('EMIT_COALESCE_MS', 0)) / 1000
+# Máximo de mensagens guardadas por sala; lote cheio é emitido na hora
+MAX_BATCH = int(os.getenv('EMIT_COALESCE_MAX', 50))
+
+
+class EmitCoalescer:
+    """
+    Agrupa as mensagens entregues em cada sala e emite um único evento.
+
+    A primeira mensagem de uma sala abre uma janela de window segundos; as
+    que chegam até o fim da janela (ou até max_batch mensagens) vão juntas
+    em um 'new_messages' {'messages': [...]}, na ordem de chegada. Uma janela
+    com uma só mensagem é emitida como 'new_message', como sem o
+    agrupamento. Com window 0 cada mensagem é emitida na hora.
+
+    on_emit, se dado em add(), é chamado logo depois do emit da mensagem
+    (usado para medir a entrega das mensagens rastreadas).
+    """
+
+    def __init__(self, emit, window=WINDOW, max_batch=MAX_BATCH):
+        self.emit = emit  # emit(evento, dados, sala)
+        self.window = window
+        self.max_batch = max_batch
+
+        self._rooms = {}  # sala -> {'deadline': ..., 'messages': [...]}
+        self._cond = threading.Condition()
+        self._emit_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        self.messages = 0
+        self.frames = 0
+
+    def add(self, room, data, on_emit=None):
+        if self.window <= 0:
+            self._emit(room, [data], [on_emit] if on_emit else [])
+            return
+
+        with self._cond:
+            pending = self._rooms.get(room)
+            if pending is None:
+                pending = self._rooms[room] = {'deadline': time.monotonic() + self.window,
+                                               'messages': [], 'callbacks': []}
+                self._ensure_thread()
+                self._cond.notify()
+            pending['messages'].append(data)
+            if on_emit:
+                pending['callbacks'].append(on_emit)
+
+            if len(pending['messages']) < self.max_batch:
+                return
+            del self._rooms[room]
+            # Pega o lock de emissão antes de soltar o da fila: os lotes de uma
+            # sala saem na mesma ordem em que foram fechados
+            self._emit_lock.acquire()
+
+        try:
+            self._emit(room, pending['messages'], pending['callbacks'])
+        finally:
+            self._emit_lock.release()
+
+    def _ensure_thread(self):
+        # Uma thread por processo; recriada em processos filhos (fork)
+        if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._flush_forever, name='emit-coalescer', daemon=True)
+            self._thread.start()
+
+    def _flush_forever(self):
+        while True:
+            with self._cond:
+                while not self._rooms:
+                    self._cond.wait()
+
+                now = time.monotonic()
+                due = [room for room, pending in self._rooms.items() if pending['deadline'] <= now]
+                if not due:
+                    self._cond.wait(min(pending['deadline'] for pending in self._rooms.values()) - now)
+                    continue
+
+                batches = [(room, self._rooms.pop(room)) for room in due]
+                self._emit_lock.acquire()
+
+            try:
+                for room, pending in batches:
+                    self._emit(room, pending['messages'], pending['callbacks'])
+            except Exception as e:
+                print(f'Erro ao emitir mensagens agrupadas: {e}')
+            finally:
+                self._emit_lock.release()
+
+    def _emit(self, room, messages, callbacks):
+        if len(messages) == 1:
+            self.emit('new_message', messages[0], room)
+        else:
+            self.emit('new_messages', {'messages': messages}, room)
+        self.messages += len(messages)
+        self.frames += 1
+        for callback in callbacks:
+            callback()
+
+    def stats(self):
+        with self._cond:
+            pending = sum(len(pending['messages']) for pending in self._rooms.values())
+        return {
+            'window_ms': self.window * 1000,
+            'max_batch': self.max_batch,
+            'pending': pending,
+            'messages': self.messages,
+            'frames': self.frames,
+        }
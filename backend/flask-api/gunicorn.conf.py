@@ -0,0 +1,44 @@
+import os
+
+from dotenv import load_dotenv
+
+# As configurações abaixo (e as do app) também podem vir do .env
+load_dotenv()
+
+# Perfil de produção: gunicorn com workers 'gthread' e Flask-SocketIO no modo
+# 'threading' (WebSocket via simple-websocket). Cada conexão Socket.IO ocupa uma
+# thread do worker enquanto estiver aberta; chamadas bloqueantes (banco, serviço
+# Java, hashing de senha) rodam na thread da própria requisição e não travam as
+# demais. Uso: gunicorn -c gunicorn.conf.py 'app:create_app()'
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+worker_class = 'gthread'
+
+# Com mais de um worker o balanceador precisa de sessões fixas (sticky sessions)
+# para o Socket.IO, e as salas só são compartilhadas entre workers com
+# SOCKETIO_MESSAGE_QUEUE (Kafka) configurada
+workers = int(os.getenv('WEB_WORKERS', 1))
+
+# Threads por worker = limite de requisições + sockets simultâneos no processo.
+# SOCKETIO_MAX_CONNECTIONS (no app) deve ficar abaixo disso para sobrar threads
+# para as requisições HTTP
+threads = int(os.getenv('WEB_THREADS', 1000))
+
+# Conexões aceitas por worker, incluindo as ociosas em keep-alive; precisa ser
+# maior que threads, senão o gunicorn desliga o keep-alive
+worker_connections = int(os.getenv('WEB_WORKER_CONNECTIONS', threads + 200))
+
+# As conexões WebSocket são longas: o timeout vale só para o worker travado
+timeout = int(os.getenv('WEB_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('WEB_KEEPALIVE', 5))
+backlog = int(os.getenv('WEB_BACKLOG', 2048))
+
+accesslog = os.getenv('WEB_ACCESS_LOG') or None
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    # Threads de fundo (relay da outbox) em cada worker, já depois do fork
+    from app import start_background_workers
+    start_background_workers(worker.wsgi)
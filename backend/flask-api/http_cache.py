@@ -0,0 +1,135 @@
+import gzip
+import hashlib
+import os
+
+from flask import current_app, make_response, request
+
+from ttl_cache import TTLCache
+from wire_format import MSGPACK_MIMETYPE, msgpack, pack
+
+try:
+    import brotli
+except ImportError:  # Opcional: sem o pacote as respostas usam só gzip
+    brotli = None
+
+
+# Corpos menores que isso vão sem compressão
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('RESPONSE_BROTLI_QUALITY', 5))
+# Corpos serializados guardados por versão do conteúdo (ex.: página do histórico)
+CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 2000))
+CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 300))
+
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+# Formatos do corpo, pelo Accept; JSON é o padrão
+MIMETYPES = ('application/json', MSGPACK_MIMETYPE) if msgpack else ('application/json',)
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class ResponseCache:
+    """
+    Respostas JSON (ou msgpack) com ETag forte, 304 e compressão negociada.
+
+    respond(key, build) é para conteúdo versionado: key já traz a versão
+    (ex.: conversa, última mensagem e página) e a ETag sai dela e do formato.
+    Um GET com If-None-Match igual recebe 304 sem chamar build(); senão o
+    corpo sai do cache (serializado uma vez por formato e comprimido uma vez
+    por codificação) ou de build(). respond_payload(payload) serve conteúdo
+    sem versão: a ETag é o hash do corpo. A ETag de um corpo comprimido ganha
+    o sufixo da codificação. Com Accept: application/msgpack o corpo vai em
+    msgpack, com as listas de linhas em colunas (wire_format.pack).
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.bodies = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.not_modified = 0
+        self.compressed = 0
+
+    def respond(self, key, build):
+        mimetype = self._mimetype()
+        key = (*key, mimetype)
+        etag = self._etag(repr(key).encode())
+        if self._matches(etag):
+            return self._not_modified(etag)
+
+        entry = self.bodies.get(key)
+        if entry is None:
+            entry = {None: self._serialize(build(), mimetype)}
+            self.bodies.set(key, entry)
+        return self._response(entry, etag, mimetype)
+
+    def respond_payload(self, payload, status=200):
+        mimetype = self._mimetype()
+        body = self._serialize(payload, mimetype)
+        etag = self._etag(body)
+        if status == 200 and self._matches(etag):
+            return self._not_modified(etag)
+        return self._response({None: body}, etag, mimetype, status)
+
+    def _mimetype(self):
+        return request.accept_mimetypes.best_match(MIMETYPES, default=MIMETYPES[0])
+
+    def _serialize(self, payload, mimetype):
+        if mimetype == MSGPACK_MIMETYPE:
+            return pack(payload)
+        # Mesmo corpo que jsonify geraria
+        return current_app.json.response(payload).get_data()
+
+    def _etag(self, data):
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def _matches(self, etag):
+        # Condicional só vale para GET/HEAD; qualquer codificação da mesma versão serve
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        return any(request.if_none_match.contains(tag)
+                   for tag in (etag, *(f'{etag}-{encoding}' for encoding in ENCODINGS)))
+
+    def _not_modified(self, etag):
+        self.not_modified += 1
+        response = make_response('', 304)
+        for tag in (etag, *(f'{etag}-{encoding}' for encoding in ENCODINGS)):
+            if request.if_none_match.contains(tag):
+                response.set_etag(tag)
+                break
+        response.headers['Vary'] = 'Accept, Accept-Encoding'
+        return response
+
+    def _response(self, entry, etag, mimetype, status=200):
+        encoding = None
+        if len(entry[None]) >= COMPRESS_MIN_SIZE:
+            encoding = request.accept_encodings.best_match(ENCODINGS)
+
+        if encoding:
+            if encoding not in entry:
+                entry[encoding] = _compress(entry[None], encoding)
+            body = entry[encoding]
+            etag = f'{etag}-{encoding}'
+            self.compressed += 1
+        else:
+            body = entry[None]
+
+        response = make_response(body, status)
+        response.mimetype = mimetype
+        response.set_etag(etag)
+        # O cliente pode guardar, mas revalida (If-None-Match) antes de reaproveitar
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Vary'] = 'Accept, Accept-Encoding'
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    def stats(self):
+        return {
+            **self.bodies.stats(),
+            'not_modified': self.not_modified,
+            'compressed': self.compressed,
+            'encodings': list(ENCODINGS),
+            'mimetypes': list(MIMETYPES),
+        }
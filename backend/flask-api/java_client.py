@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import Histogram
+
+
+# Configuração padrão do cliente do serviço Java (pode ser alterada no .env)
+CONNECT_TIMEOUT = float(os.getenv('JAVA_API_CONNECT_TIMEOUT', 2))
+READ_TIMEOUT = float(os.getenv('JAVA_API_READ_TIMEOUT', 5))
+POOL_SIZE = int(os.getenv('JAVA_API_POOL_SIZE', 10))
+MAX_CONCURRENCY = int(os.getenv('JAVA_API_MAX_CONCURRENCY', 20))
+ACQUIRE_TIMEOUT = float(os.getenv('JAVA_API_ACQUIRE_TIMEOUT', 1))
+CONNECT_RETRIES = int(os.getenv('JAVA_API_CONNECT_RETRIES', 1))
+FAILURE_THRESHOLD = int(os.getenv('JAVA_API_FAILURE_THRESHOLD', 5))
+RESET_TIMEOUT = float(os.getenv('JAVA_API_RESET_TIMEOUT', 30))
+
+
+class JavaServiceUnavailable(requests.exceptions.RequestException):
+    """O serviço Java não pode ser chamado agora (circuito aberto ou sem vagas)."""
+
+
+class CircuitOpenError(JavaServiceUnavailable):
+    """O circuito está aberto: falha rápida sem chamar o serviço."""
+
+
+class JavaServiceBusy(JavaServiceUnavailable):
+    """O limite de chamadas simultâneas ao serviço foi atingido."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker simples com os estados closed, open e half-open.
+
+    Depois de failure_threshold falhas seguidas o circuito abre e as chamadas
+    falham imediatamente. Passado reset_timeout uma única chamada de teste é
+    liberada (half-open): se der certo o circuito fecha, senão abre de novo.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Libera apenas uma chamada de teste
+                self.state = self.HALF_OPEN
+                return True
+
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class LatencyStats:
+    """Estatísticas de latência por rota chamada no serviço Java."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        # Mesmas chamadas em buckets, para o /metrics
+        self.histogram = Histogram(('path', 'outcome'))
+
+    def record(self, path, elapsed, ok):
+        self.histogram.observe((path, 'ok' if ok else 'error'), elapsed)
+        with self._lock:
+            stats = self._stats.setdefault(
+                path, {'calls': 0, 'errors': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0}
+            )
+            stats['calls'] += 1
+            stats['total'] += elapsed
+            stats['max'] = max(stats['max'], elapsed)
+            stats['last'] = elapsed
+            if not ok:
+                stats['errors'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                path: dict(stats, avg=stats['total'] / stats['calls'] if stats['calls'] else 0.0)
+                for path, stats in self._stats.items()
+            }
+
+
+class JavaClient:
+    """
+    Cliente HTTP de um serviço Java (uma entrada de API_URL).
+
+    Mantém um pool de conexões keep-alive, aplica timeouts de conexão e
+    leitura, limita as chamadas simultâneas e protege o Flask com um
+    circuit breaker quando o serviço está lento ou fora do ar.
+    """
+
+    def __init__(self, base_url, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 pool_size=POOL_SIZE, max_concurrency=MAX_CONCURRENCY,
+                 acquire_timeout=ACQUIRE_TIMEOUT, connect_retries=CONNECT_RETRIES,
+                 breaker=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.acquire_timeout = acquire_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = LatencyStats()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+        # Repete apenas falhas de conexão: a requisição não chegou ao serviço,
+        # então não há risco de publicar a mesma mensagem duas vezes
+        retry = Retry(total=connect_retries, connect=connect_retries, read=0,
+                      status=0, other=0, allowed_methods=None)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def request(self, method, path, **kwargs):
+        # A vaga vem antes do breaker: a chamada de teste do half-open só é
+        # liberada quando pode de fato rodar e registrar sucesso ou falha
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise JavaServiceBusy(f'Serviço Java {self.base_url} ocupado, tente novamente.')
+
+        if not self.breaker.allow():
+            self._slots.release()
+            raise CircuitOpenError(f'Serviço Java {self.base_url} indisponível (circuito aberto).')
+
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.request(method, f'{self.base_url}{path}', **kwargs)
+            ok = response.status_code < 500
+            return response
+        finally:
+            self._slots.release()
+            self.stats.record(path, time.perf_counter() - start, ok)
+            if ok:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+    def close(self):
+        self.session.close()
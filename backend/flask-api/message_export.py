@@ -0,0 +1,81 @@
+import json
+import os
+import zlib
+
+from models import GroupMessage, MessageQueue, User, UserConversation, db, select
+
+
+# Linhas trazidas por vez do cursor no servidor
+BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 2000))
+# Bytes comprimidos acumulados antes de entregar um pedaço da resposta
+CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_KB', 64)) * 1024
+GZIP_LEVEL = int(os.getenv('EXPORT_GZIP_LEVEL', 6))
+
+
+def export_messages(user_id, conversation_id=None):
+    """
+    Gera as mensagens das conversas do usuário (ou só de conversation_id).
+
+    As conversas saem em ordem de tipo e id, e as mensagens de cada uma por
+    id. Cada conversa é lida pelo índice (chat, id) com cursor no servidor
+    (yield_per): no máximo BATCH_SIZE linhas ficam em memória, qualquer que
+    seja o tamanho do histórico. Precisa de app context durante a iteração.
+    """
+    conversations = db.session.execute(
+        select(UserConversation.conversation_id, UserConversation.conversation_type, UserConversation.title)
+        .where(UserConversation.user_id == user_id,
+               *([UserConversation.conversation_id == conversation_id] if conversation_id else []))
+        .order_by(UserConversation.conversation_type, UserConversation.conversation_id)
+    ).all()
+
+    for conversation in conversations:
+        if conversation.conversation_type == 'QUEUE':
+            model, chat_column = MessageQueue, MessageQueue.queue_name
+        else:
+            model, chat_column = GroupMessage, GroupMessage.topic_id
+
+        rows = db.session.execute(
+            select(model.id, model.timestamp, model.message, User.username)
+            .join(User, User.id == model.sender_id)
+            .where(chat_column == conversation.conversation_id)
+            .order_by(model.id)
+            .execution_options(yield_per=BATCH_SIZE)
+        )
+        try:
+            for row in rows:
+                yield {
+                    'conversation_id': conversation.conversation_id,
+                    'type': conversation.conversation_type,
+                    'title': conversation.title,
+                    'id': row.id,
+                    'timestamp': row.timestamp.isoformat() if row.timestamp else None,
+                    'username': row.username,
+                    'message': row.message,
+                }
+        finally:
+            # Fecha o cursor no servidor mesmo se o cliente desistir no meio
+            rows.close()
+
+
+def gzip_jsonl(records):
+    """
+    Serializa os registros em JSON Lines comprimido com gzip, em pedaços.
+
+    Gera bytes de ~CHUNK_SIZE conforme os registros chegam. O arquivo só fica
+    completo com o último pedaço (rodapé do gzip): uma exportação
+    interrompida é detectada pelo cliente como gzip truncado.
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # 16+: formato gzip
+    pending, size = [], 0
+
+    for record in records:
+        data = compressor.compress(json.dumps(record, ensure_ascii=False).encode() + b'\n')
+        if data:
+            pending.append(data)
+            size += len(data)
+            if size >= CHUNK_SIZE:
+                yield b''.join(pending)
+                pending, size = [], 0
+
+    pending.append(compressor.flush())
+    yield b''.join(pending)
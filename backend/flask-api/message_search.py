@@ -0,0 +1,102 @@
+import os
+
+from sqlalchemy import literal, tuple_, union_all
+
+from models import SEARCH_CONFIG, GroupMessage, MessageQueue, User, UserConversation, db, select
+
+
+# Configuração padrão da busca de mensagens
+PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', 20))
+MAX_PAGE_SIZE = int(os.getenv('SEARCH_MAX_PAGE_SIZE', 100))
+# Opções do ts_headline para o trecho destacado de cada resultado
+HEADLINE_OPTIONS = 'StartSel=<mark>, StopSel=</mark>, MaxWords=30, MinWords=10, MaxFragments=2'
+
+
+def encode_cursor(row):
+    return f'{row.rank!r}:{row.type}:{row.id}'
+
+
+def decode_cursor(cursor):
+    """Cursor 'rank:tipo:id' do último resultado da página anterior."""
+    rank, msg_type, message_id = cursor.split(':')
+    if msg_type not in ('QUEUE', 'TOPIC'):
+        raise ValueError('Cursor inválido.')
+    return float(rank), msg_type, int(message_id)
+
+
+def _escape_html(column):
+    # O trecho volta com <mark>; o texto da mensagem é escapado antes do ts_headline
+    return db.func.replace(db.func.replace(db.func.replace(column, '&', '&amp;'), '<', '&lt;'), '>', '&gt;')
+
+
+def search_messages(user_id, terms, conversation_id=None, cursor=None, limit=PAGE_SIZE):
+    """
+    Busca textual nas mensagens das conversas do usuário, por relevância.
+
+    terms usa a sintaxe do websearch_to_tsquery ("frase exata", -excluir, or).
+    As conversas vêm de user_conversation, que espelha link_queue e
+    topic_membership. A paginação é por cursor (rank, tipo, id) e o trecho
+    destacado só é gerado para a página retornada. Retorna (resultados,
+    next_cursor).
+    """
+    query = db.func.websearch_to_tsquery(SEARCH_CONFIG, terms)
+
+    conversations = select(UserConversation.conversation_id).where(UserConversation.user_id == user_id)
+    if conversation_id:
+        conversations = conversations.where(UserConversation.conversation_id == conversation_id)
+
+    hits = union_all(*[
+        select(
+            literal(msg_type).label('type'),
+            model.id.label('id'),
+            chat_column.label('conversation_id'),
+            db.func.ts_rank(model.search_vector, query).label('rank'),
+        ).where(model.search_vector.op('@@')(query), chat_column.in_(conversations))
+        for msg_type, model, chat_column in (('QUEUE', MessageQueue, MessageQueue.queue_name),
+                                             ('TOPIC', GroupMessage, GroupMessage.topic_id))
+    ]).subquery('hits')
+
+    page = select(hits)
+    if cursor:
+        rank, msg_type, message_id = decode_cursor(cursor)
+        # ts_rank é real (float4): o cursor também, senão ranks iguais não batem
+        page = page.where(tuple_(hits.c.rank, hits.c.type, hits.c.id)
+                          < tuple_(db.cast(rank, db.REAL), msg_type, message_id))
+    # Um registro a mais para saber se existe uma próxima página
+    page = page.order_by(hits.c.rank.desc(), hits.c.type.desc(), hits.c.id.desc()).limit(limit + 1).subquery('page')
+
+    # Texto, autor e trecho destacado só para as linhas da página
+    queue_message = db.aliased(MessageQueue)
+    group_message = db.aliased(GroupMessage)
+    message = db.func.coalesce(queue_message.message, group_message.message)
+
+    rows = db.session.execute(
+        select(
+            page.c.type, page.c.id, page.c.conversation_id, page.c.rank,
+            message.label('message'),
+            db.func.coalesce(queue_message.timestamp, group_message.timestamp).label('timestamp'),
+            User.username,
+            db.func.ts_headline(SEARCH_CONFIG, _escape_html(message), query, HEADLINE_OPTIONS).label('highlight'),
+        )
+        .select_from(page)
+        .outerjoin(queue_message, (page.c.type == 'QUEUE') & (queue_message.id == page.c.id))
+        .outerjoin(group_message, (page.c.type == 'TOPIC') & (group_message.id == page.c.id))
+        .join(User, User.id == db.func.coalesce(queue_message.sender_id, group_message.sender_id))
+        .order_by(page.c.rank.desc(), page.c.type.desc(), page.c.id.desc())
+    ).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    results = [{
+        'type': row.type,
+        'id': row.id,
+        'conversation_id': row.conversation_id,
+        'message': row.message,
+        'highlight': row.highlight,
+        'timestamp': row.timestamp,
+        'username': row.username,
+        'rank': row.rank,
+    } for row in rows]
+
+    return results, encode_cursor(rows[-1]) if has_more else None
@@ -0,0 +1,230 @@
+import bisect
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+
+# Limites (segundos) dos buckets de latência
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Limites do número de consultas por requisição
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+# A mesma consulta repetida isso (ou mais) vezes em uma requisição conta como suspeita de N+1
+REPEATED_QUERY_THRESHOLD = int(os.getenv('METRICS_REPEATED_QUERY_THRESHOLD', 10))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Histograma com buckets fixos por combinação de labels.
+
+    observe() só acha o bucket (bisect) e soma, sob um lock; os valores
+    acumulados do formato Prometheus são calculados em samples(), na coleta.
+    """
+
+    def __init__(self, labels, buckets=LATENCY_BUCKETS):
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # valores dos labels -> [contagem por bucket..., +Inf, soma]
+        self._lock = threading.Lock()
+
+    def observe(self, values, amount):
+        index = bisect.bisect_left(self.buckets, amount)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += amount
+
+    def samples(self, **extra):
+        with self._lock:
+            series = {values: list(counts) for values, counts in self._series.items()}
+
+        for values, counts in series.items():
+            labels = {**extra, **dict(zip(self.labels, values))}
+            total = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                total += count
+                yield '_bucket', {**labels, 'le': _format_value(bound)}, total
+            yield '_sum', labels, counts[-1]
+            yield '_count', labels, total
+
+
+class Counter:
+    def __init__(self, labels):
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, values, amount=1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def samples(self, **extra):
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in values.items():
+            yield '', {**extra, **dict(zip(self.labels, label_values))}, value
+
+
+class Registry:
+    """
+    Métricas do processo no formato texto do Prometheus.
+
+    Cada métrica é (nome, tipo, ajuda, samples): samples() é chamado só na
+    coleta, então métricas derivadas de stats() existentes (sockets, caches)
+    não custam nada entre uma coleta e outra.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, name, kind, help, samples):
+        self._metrics.append((name, kind, help, samples))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        histogram = Histogram(labels, buckets)
+        self.register(name, 'histogram', help, histogram.samples)
+        return histogram
+
+    def counter(self, name, help, labels=()):
+        counter = Counter(labels)
+        self.register(name, 'counter', help, counter.samples)
+        return counter
+
+    def value(self, name, kind, help, read):
+        # Gauge ou counter lido na coleta: read() retorna um número ou {labels: valor}
+        def samples():
+            result = read()
+            if not isinstance(result, dict):
+                result = {(): result}
+            for labels, value in result.items():
+                yield '', dict(labels), value
+        self.register(name, kind, help, samples)
+
+    def render(self):
+        lines = []
+        for name, kind, help, samples in self._metrics:
+            try:
+                collected = [f'{name}{suffix}{_format_labels(labels)} {_format_value(value)}'
+                             for suffix, labels, value in samples()]
+            except Exception as e:
+                lines.append(f'# Erro ao coletar {name}: {_escape(e)}')
+                continue
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(collected)
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_duration = registry.histogram(
+    'http_request_duration_seconds', 'Latência das requisições HTTP por rota e status.',
+    ('method', 'route', 'status'))
+db_duration = registry.histogram(
+    'db_query_duration_seconds', 'Latência de cada consulta ao banco (request ou background).',
+    ('origin',))
+db_queries = registry.histogram(
+    'db_queries_per_request', 'Consultas ao banco em cada requisição HTTP.',
+    ('route',), QUERY_COUNT_BUCKETS)
+db_seconds = registry.counter(
+    'db_query_seconds_total', 'Tempo total em consultas ao banco por rota.', ('route',))
+db_repeated = registry.counter(
+    'db_repeated_query_requests_total',
+    f'Requisições que repetiram a mesma consulta {REPEATED_QUERY_THRESHOLD}+ vezes (suspeita de N+1).',
+    ('route',))
+
+
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'other'
+
+
+def _before_request():
+    g.metrics = {'start': time.perf_counter(), 'queries': 0, 'db_seconds': 0.0, 'statements': {}}
+
+
+def _after_request(response):
+    _finish(response.status_code)
+    return response
+
+
+def _teardown_request(exc):
+    # Exceção não tratada: after_request não roda, registra como 500
+    if exc is not None:
+        _finish(500)
+
+
+_reported = set()
+
+
+def _finish(status):
+    state = g.pop('metrics', None)
+    if state is None:
+        return
+    route = _route()
+    http_duration.observe((request.method, route, str(status)), time.perf_counter() - state['start'])
+    db_queries.observe((route,), state['queries'])
+    if state['db_seconds']:
+        db_seconds.inc((route,), state['db_seconds'])
+
+    if state['statements']:
+        statement, repeats = max(state['statements'].items(), key=lambda item: item[1])
+        if repeats >= REPEATED_QUERY_THRESHOLD:
+            db_repeated.inc((route,))
+            # Avisa uma vez por rota e consulta (por processo)
+            if (route, statement) not in _reported:
+                _reported.add((route, statement))
+                print(f'Possível N+1 em {route}: consulta repetida {repeats} vezes: {statement[:200]}')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['metrics_start'].pop()
+    state = g.get('metrics') if has_request_context() else None
+    db_duration.observe(('request' if state is not None else 'background',), elapsed)
+    if state is not None:
+        state['queries'] += 1
+        state['db_seconds'] += elapsed
+        statements = state['statements']
+        statements[statement] = statements.get(statement, 0) + 1
+
+
+def _handle_error(context):
+    # Consulta com erro não passa pelo after_cursor_execute: descarta o início dela
+    if context.connection is not None and context.connection.info.get('metrics_start'):
+        context.connection.info['metrics_start'].pop()
+
+
+def instrument(app, engines):
+    """Liga os ganchos de requisição do app e os eventos das engines do banco."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    for engine in engines:
+        if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(engine, 'handle_error', _handle_error)
@@ -0,0 +1,750 @@
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+
+from models import text
+
+
+# Chave do advisory lock: apenas um processo aplica migrações por vez
+LOCK_KEY = 7300002
+
+
+# Migrações em ordem: (versão, descrição, passos). Cada passo é um SQL ou uma
+# função que recebe a conexão. Uma versão aplicada nunca é alterada; mudanças
+# no esquema entram sempre como uma nova versão no fim da lista.
+MIGRATIONS = [
+    # Esquema base: as tabelas como estavam quando as migrações foram criadas, em
+    # SQL fixo (não segue os modelos). IF NOT EXISTS preserva bancos mais antigos
+    # que as migrações, criados pelo create_all no boot.
+    (1, 'tabelas dos modelos', [
+        '''
+        CREATE TABLE IF NOT EXISTS "User" (
+            id VARCHAR(36) NOT NULL,
+            username VARCHAR(80) NOT NULL,
+            password_hash VARCHAR(256) NOT NULL,
+            is_online BOOLEAN,
+            PRIMARY KEY (id),
+            UNIQUE (username)
+        );
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id SERIAL NOT NULL,
+            idempotency_key VARCHAR(36) NOT NULL,
+            chat_name VARCHAR(36) NOT NULL,
+            msg_type VARCHAR(5) NOT NULL,
+            message_id INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            published_at TIMESTAMP WITHOUT TIME ZONE,
+            attempts INTEGER NOT NULL,
+            last_error TEXT,
+            PRIMARY KEY (id),
+            UNIQUE (idempotency_key)
+        );
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS ix_outbox_pending ON outbox (id) WHERE published_at IS NULL;
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS friend_list (
+            user_id VARCHAR(36) NOT NULL,
+            PRIMARY KEY (user_id),
+            FOREIGN KEY(user_id) REFERENCES "User" (id)
+        );
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS link_queue (
+            name VARCHAR(36) NOT NULL,
+            user_one VARCHAR(36) NOT NULL,
+            user_two VARCHAR(36) NOT NULL,
+            pair_key VARCHAR(73) NOT NULL,
+            PRIMARY KEY (name),
+            FOREIGN KEY(user_one) REFERENCES "User" (id),
+            FOREIGN KEY(user_two) REFERENCES "User" (id),
+            UNIQUE (pair_key)
+        );
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS message_topic (
+            name VARCHAR(36) NOT NULL,
+            group_name VARCHAR(100) NOT NULL,
+            owner_id VARCHAR(36) NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            PRIMARY KEY (name),
+            UNIQUE (group_name),
+            FOREIGN KEY(owner_id) REFERENCES "User" (id)
+        );
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_conversation (
+            user_id VARCHAR(36) NOT NULL,
+            conversation_id VARCHAR(36) NOT NULL,
+            conversation_type VARCHAR(5) NOT NULL,
+            peer_id VARCHAR(36),
+            title VARCHAR(100) NOT NULL,
+            last_message_id INTEGER,
+            last_message_preview VARCHAR(200),
+            last_message_at TIMESTAMP WITHOUT TIME ZONE,
+            unread_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, conversation_id),
+            FOREIGN KEY(user_id) REFERENCES "User" (id) ON DELETE CASCADE
+        );
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS ix_user_conversation_peer_id ON user_conversation (peer_id);
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS ix_user_conversation_recent ON user_conversation (user_id, last_message_at DESC NULLS LAST);
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS friends (
+            id_user VARCHAR(36) NOT NULL,
+            id_friend VARCHAR(36) NOT NULL,
+            PRIMARY KEY (id_user, id_friend),
+            FOREIGN KEY(id_user) REFERENCES friend_list (user_id),
+            FOREIGN KEY(id_friend) REFERENCES "User" (id)
+        );
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS group_message (
+            id SERIAL NOT NULL,
+            topic_id VARCHAR(36) NOT NULL,
+            sender_id VARCHAR(36) NOT NULL,
+            message TEXT NOT NULL,
+            timestamp TIMESTAMP WITHOUT TIME ZONE,
+            is_read BOOLEAN,
+            PRIMARY KEY (id),
+            FOREIGN KEY(topic_id) REFERENCES message_topic (name),
+            FOREIGN KEY(sender_id) REFERENCES "User" (id)
+        );
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS ix_group_message_topic_id_id ON group_message (topic_id, id);
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS message_queue (
+            id SERIAL NOT NULL,
+            queue_name VARCHAR(36) NOT NULL,
+            sender_id VARCHAR(36) NOT NULL,
+            timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            message TEXT NOT NULL,
+            is_read BOOLEAN,
+            PRIMARY KEY (id),
+            FOREIGN KEY(queue_name) REFERENCES link_queue (name),
+            FOREIGN KEY(sender_id) REFERENCES "User" (id)
+        );
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS ix_message_queue_queue_name_id ON message_queue (queue_name, id);
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS topic_membership (
+            topic_id VARCHAR(36) NOT NULL,
+            user_id VARCHAR(36) NOT NULL,
+            PRIMARY KEY (topic_id, user_id),
+            FOREIGN KEY(topic_id) REFERENCES message_topic (name),
+            FOREIGN KEY(user_id) REFERENCES "User" (id)
+        );
+        ''',
+    ]),
+    (2, 'friend_list automática e amizade mútua', [
+        '''
+        DROP TRIGGER IF EXISTS after_user_insert ON "User";
+        ''',
+        # Função e trigger para criar a friend_list quando um novo usuário for inserido
+        '''
+        CREATE OR REPLACE FUNCTION create_friend_list()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO friend_list (user_id) VALUES (NEW.id);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+        '''
+        CREATE TRIGGER after_user_insert
+        AFTER INSERT ON "User"
+        FOR EACH ROW
+        EXECUTE FUNCTION create_friend_list();
+        ''',
+        '''
+        DROP TRIGGER IF EXISTS after_friend_insert ON friends;
+        ''',
+        # Função para adicionar amigo mutuo
+        '''
+        CREATE OR REPLACE FUNCTION add_mutual_friend()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            -- Verifica se a relação inversa já existe
+            IF NOT EXISTS (
+                SELECT 1 FROM friends 
+                WHERE id_user = NEW.id_friend AND id_friend = NEW.id_user
+            ) THEN
+                -- Adiciona o usuário à lista de amigos do amigo recém-adicionado
+                INSERT INTO friends (id_user, id_friend) 
+                VALUES (NEW.id_friend, NEW.id_user);
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+        # Criar o trigger que chama a função após inserção na tabela friends
+        '''
+        CREATE TRIGGER after_friend_insert
+        AFTER INSERT ON friends
+        FOR EACH ROW
+        EXECUTE FUNCTION add_mutual_friend();
+        ''',
+    ]),
+    (3, 'view v_message_queue', [
+        # Remover a view se ela já existir
+        '''
+        DROP VIEW IF EXISTS v_message_queue;
+        ''',
+        # Criar a view
+        '''
+        CREATE OR REPLACE VIEW v_message_queue AS
+        SELECT 
+            mq.id,
+            mq.message,
+            mq.timestamp,
+            u.username,
+            mq.queue_name  -- Certifique-se de incluir queue_name na view
+        FROM 
+            message_queue mq
+        JOIN 
+            "User" u ON mq.sender_id = u.id;
+        ''',
+    ]),
+    (4, 'índices do histórico (paginação por cursor)', [
+        # Bancos anteriores às migrações já tinham as tabelas, sem estes índices
+        '''
+        CREATE INDEX IF NOT EXISTS ix_message_queue_queue_name_id
+        ON message_queue (queue_name, id);
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS ix_group_message_topic_id_id
+        ON group_message (topic_id, id);
+        ''',
+    ]),
+    (5, 'chave canônica do par em link_queue', [
+        # Migração da chave canônica do par em link_queue para linhas existentes
+        '''
+        ALTER TABLE link_queue ADD COLUMN IF NOT EXISTS pair_key VARCHAR(73);
+        ''',
+        # COLLATE "C" garante a mesma ordenação usada por make_pair_key
+        '''
+        UPDATE link_queue
+        SET pair_key = LEAST(user_one COLLATE "C", user_two COLLATE "C")
+            || ':' || GREATEST(user_one COLLATE "C", user_two COLLATE "C")
+        WHERE pair_key IS NULL;
+        ''',
+        '''
+        ALTER TABLE link_queue ALTER COLUMN pair_key SET NOT NULL;
+        ''',
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS link_queue_pair_key_key
+        ON link_queue (pair_key);
+        ''',
+    ]),
+    (6, 'resumo das conversas em user_conversation', [
+        # Remove os triggers, funções, views e tabelas de última mensagem,
+        # substituídos pelo resumo em user_conversation
+        '''
+        DROP VIEW IF EXISTS user_queue_info;
+        DROP VIEW IF EXISTS user_topic_info;
+        DROP TRIGGER IF EXISTS insert_last_message_topic ON message_topic;
+        DROP TRIGGER IF EXISTS insert_last_message_queue ON link_queue;
+        DROP TRIGGER IF EXISTS update_last_message_topic ON group_message;
+        DROP TRIGGER IF EXISTS update_last_message_queue ON message_queue;
+        DROP FUNCTION IF EXISTS insert_last_message_topic_function();
+        DROP FUNCTION IF EXISTS insert_last_message_queue_function();
+        DROP FUNCTION IF EXISTS update_last_message_topic_function();
+        DROP FUNCTION IF EXISTS update_last_message_queue_function();
+        DROP TABLE IF EXISTS last_message_topic;
+        DROP TABLE IF EXISTS last_message_queue;
+        ''',
+        '''
+        DROP TRIGGER IF EXISTS insert_user_conversation_queue ON link_queue;
+        ''',
+        # Cria o resumo da conversa para os dois usuários de um novo chat 1:1
+        '''
+        CREATE OR REPLACE FUNCTION insert_user_conversation_queue_function()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO user_conversation (user_id, conversation_id, conversation_type, peer_id, title, unread_count)
+            SELECT NEW.user_one, NEW.name, 'QUEUE', NEW.user_two, username, 0
+            FROM "User" WHERE id = NEW.user_two
+            ON CONFLICT DO NOTHING;
+
+            INSERT INTO user_conversation (user_id, conversation_id, conversation_type, peer_id, title, unread_count)
+            SELECT NEW.user_two, NEW.name, 'QUEUE', NEW.user_one, username, 0
+            FROM "User" WHERE id = NEW.user_one
+            ON CONFLICT DO NOTHING;
+
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+        '''
+        CREATE TRIGGER insert_user_conversation_queue
+        AFTER INSERT ON link_queue
+        FOR EACH ROW
+        EXECUTE FUNCTION insert_user_conversation_queue_function();
+        ''',
+        '''
+        DROP TRIGGER IF EXISTS delete_user_conversation_queue ON link_queue;
+        ''',
+        # Remove o resumo dos dois usuários quando o chat 1:1 é apagado
+        '''
+        CREATE OR REPLACE FUNCTION delete_user_conversation_queue_function()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            DELETE FROM user_conversation WHERE conversation_id = OLD.name;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+        '''
+        CREATE TRIGGER delete_user_conversation_queue
+        AFTER DELETE ON link_queue
+        FOR EACH ROW
+        EXECUTE FUNCTION delete_user_conversation_queue_function();
+        ''',
+        '''
+        DROP TRIGGER IF EXISTS insert_user_conversation_topic ON topic_membership;
+        ''',
+        # Cria o resumo da conversa quando um usuário entra em um grupo
+        '''
+        CREATE OR REPLACE FUNCTION insert_user_conversation_topic_function()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO user_conversation (user_id, conversation_id, conversation_type, title, unread_count)
+            SELECT NEW.user_id, NEW.topic_id, 'TOPIC', group_name, 0
+            FROM message_topic WHERE name = NEW.topic_id
+            ON CONFLICT DO NOTHING;
+
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+        '''
+        CREATE TRIGGER insert_user_conversation_topic
+        AFTER INSERT ON topic_membership
+        FOR EACH ROW
+        EXECUTE FUNCTION insert_user_conversation_topic_function();
+        ''',
+        '''
+        DROP TRIGGER IF EXISTS delete_user_conversation_topic ON topic_membership;
+        ''',
+        # Remove o resumo quando o usuário sai do grupo
+        '''
+        CREATE OR REPLACE FUNCTION delete_user_conversation_topic_function()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            DELETE FROM user_conversation
+            WHERE user_id = OLD.user_id AND conversation_id = OLD.topic_id;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+        '''
+        CREATE TRIGGER delete_user_conversation_topic
+        AFTER DELETE ON topic_membership
+        FOR EACH ROW
+        EXECUTE FUNCTION delete_user_conversation_topic_function();
+        ''',
+        '''
+        DROP TRIGGER IF EXISTS update_user_conversation_queue ON message_queue;
+        ''',
+        # Atualiza última mensagem e não lidas dos participantes do chat 1:1.
+        # Trigger por comando (transition table): um INSERT de várias linhas
+        # atualiza cada resumo uma única vez
+        '''
+        CREATE OR REPLACE FUNCTION update_user_conversation_queue_function()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            WITH last AS (
+                SELECT DISTINCT ON (queue_name) queue_name, id, message, timestamp
+                FROM new_rows
+                ORDER BY queue_name, id DESC
+            ),
+            per_sender AS (
+                SELECT queue_name, sender_id, COUNT(*) AS total
+                FROM new_rows
+                GROUP BY queue_name, sender_id
+            )
+            UPDATE user_conversation uc
+            SET last_message_id = last.id,
+                last_message_preview = LEFT(last.message, 200),
+                last_message_at = last.timestamp,
+                -- Soma as mensagens novas enviadas pelos outros participantes
+                unread_count = uc.unread_count + (
+                    SELECT COALESCE(SUM(ps.total), 0) FROM per_sender ps
+                    WHERE ps.queue_name = uc.conversation_id AND ps.sender_id <> uc.user_id
+                )
+            FROM last
+            WHERE uc.conversation_id = last.queue_name;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+        '''
+        CREATE TRIGGER update_user_conversation_queue
+        AFTER INSERT ON message_queue
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION update_user_conversation_queue_function();
+        ''',
+        '''
+        DROP TRIGGER IF EXISTS update_user_conversation_topic ON group_message;
+        ''',
+        # Atualiza última mensagem e não lidas dos membros do grupo.
+        # Trigger por comando (transition table): um INSERT de várias linhas
+        # atualiza cada resumo uma única vez
+        '''
+        CREATE OR REPLACE FUNCTION update_user_conversation_topic_function()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            WITH last AS (
+                SELECT DISTINCT ON (topic_id) topic_id, id, message, timestamp
+                FROM new_rows
+                ORDER BY topic_id, id DESC
+            ),
+            per_sender AS (
+                SELECT topic_id, sender_id, COUNT(*) AS total
+                FROM new_rows
+                GROUP BY topic_id, sender_id
+            )
+            UPDATE user_conversation uc
+            SET last_message_id = last.id,
+                last_message_preview = LEFT(last.message, 200),
+                last_message_at = last.timestamp,
+                -- Soma as mensagens novas enviadas pelos outros participantes
+                unread_count = uc.unread_count + (
+                    SELECT COALESCE(SUM(ps.total), 0) FROM per_sender ps
+                    WHERE ps.topic_id = uc.conversation_id AND ps.sender_id <> uc.user_id
+                )
+            FROM last
+            WHERE uc.conversation_id = last.topic_id;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+        '''
+        CREATE TRIGGER update_user_conversation_topic
+        AFTER INSERT ON group_message
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION update_user_conversation_topic_function();
+        ''',
+        # Preenche user_conversation para chats que já existiam
+        '''
+        INSERT INTO user_conversation (user_id, conversation_id, conversation_type, peer_id, title, unread_count)
+        SELECT lq.user_one, lq.name, 'QUEUE', lq.user_two, u.username, 0
+        FROM link_queue lq JOIN "User" u ON u.id = lq.user_two
+        UNION ALL
+        SELECT lq.user_two, lq.name, 'QUEUE', lq.user_one, u.username, 0
+        FROM link_queue lq JOIN "User" u ON u.id = lq.user_one
+        UNION ALL
+        SELECT tm.user_id, tm.topic_id, 'TOPIC', NULL, mt.group_name, 0
+        FROM topic_membership tm JOIN message_topic mt ON mt.name = tm.topic_id
+        ON CONFLICT DO NOTHING;
+        ''',
+        '''
+        UPDATE user_conversation uc
+        SET last_message_id = mq.id,
+            last_message_preview = LEFT(mq.message, 200),
+            last_message_at = mq.timestamp
+        FROM message_queue mq
+        WHERE uc.last_message_id IS NULL
+          AND uc.conversation_type = 'QUEUE'
+          AND mq.id = (SELECT MAX(id) FROM message_queue WHERE queue_name = uc.conversation_id);
+        ''',
+        '''
+        UPDATE user_conversation uc
+        SET last_message_id = gm.id,
+            last_message_preview = LEFT(gm.message, 200),
+            last_message_at = gm.timestamp
+        FROM group_message gm
+        WHERE uc.last_message_id IS NULL
+          AND uc.conversation_type = 'TOPIC'
+          AND gm.id = (SELECT MAX(id) FROM group_message WHERE topic_id = uc.conversation_id);
+        ''',
+    ]),
+    (7, 'marcas de leitura em read_cursor', [
+        '''
+        CREATE TABLE IF NOT EXISTS read_cursor (
+            user_id VARCHAR(36) NOT NULL,
+            conversation_id VARCHAR(36) NOT NULL,
+            last_read_id INTEGER NOT NULL,
+            updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+            PRIMARY KEY (user_id, conversation_id),
+            FOREIGN KEY(user_id) REFERENCES "User" (id) ON DELETE CASCADE
+        );
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS ix_read_cursor_conversation ON read_cursor (conversation_id, last_read_id);
+        ''',
+        # Sair do grupo ou apagar o chat 1:1 também remove as marcas de leitura
+        '''
+        CREATE OR REPLACE FUNCTION delete_user_conversation_queue_function()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            DELETE FROM user_conversation WHERE conversation_id = OLD.name;
+            DELETE FROM read_cursor WHERE conversation_id = OLD.name;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+        '''
+        CREATE OR REPLACE FUNCTION delete_user_conversation_topic_function()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            DELETE FROM user_conversation
+            WHERE user_id = OLD.user_id AND conversation_id = OLD.topic_id;
+            DELETE FROM read_cursor
+            WHERE user_id = OLD.user_id AND conversation_id = OLD.topic_id;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+        # Conversas sem mensagens não lidas começam com a marca na última mensagem
+        '''
+        INSERT INTO read_cursor (user_id, conversation_id, last_read_id, updated_at)
+        SELECT user_id, conversation_id, last_message_id, now()
+        FROM user_conversation
+        WHERE unread_count = 0 AND last_message_id IS NOT NULL
+        ON CONFLICT DO NOTHING;
+        ''',
+    ]),
+    # Coluna gerada: ADD COLUMN reescreve a tabela, rode fora do horário de pico
+    (8, 'busca textual (tsvector + GIN)', [
+        '''
+        ALTER TABLE message_queue ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('portuguese', message)) STORED;
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS ix_message_queue_search
+        ON message_queue USING GIN (search_vector);
+        ''',
+        '''
+        ALTER TABLE group_message ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('portuguese', message)) STORED;
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS ix_group_message_search
+        ON group_message USING GIN (search_vector);
+        ''',
+    ]),
+    (9, 'resumo das conversas: índice por conversa e triggers lineares', [
+        # Os triggers de mensagem e a exclusão de chats procuram os resumos por conversa
+        '''
+        CREATE INDEX IF NOT EXISTS ix_user_conversation_conversation
+        ON user_conversation (conversation_id);
+        ''',
+        # A soma das não lidas era uma subconsulta por resumo sobre o lote
+        # inteiro (quadrática em INSERTs grandes); agora agrega por remetente
+        # e junta uma vez com os resumos da conversa
+        '''
+        CREATE OR REPLACE FUNCTION update_user_conversation_queue_function()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            WITH last AS (
+                SELECT DISTINCT ON (queue_name) queue_name, id, message, timestamp
+                FROM new_rows
+                ORDER BY queue_name, id DESC
+            ),
+            per_sender AS (
+                SELECT queue_name, sender_id, COUNT(*) AS total
+                FROM new_rows
+                GROUP BY queue_name, sender_id
+            ),
+            -- Mensagens novas enviadas pelos outros participantes, por resumo
+            unread AS (
+                SELECT uc.user_id, uc.conversation_id,
+                       COALESCE(SUM(ps.total) FILTER (WHERE ps.sender_id <> uc.user_id), 0) AS total
+                FROM per_sender ps
+                JOIN user_conversation uc ON uc.conversation_id = ps.queue_name
+                GROUP BY uc.user_id, uc.conversation_id
+            )
+            UPDATE user_conversation uc
+            SET last_message_id = last.id,
+                last_message_preview = LEFT(last.message, 200),
+                last_message_at = last.timestamp,
+                unread_count = uc.unread_count + unread.total
+            FROM unread JOIN last ON last.queue_name = unread.conversation_id
+            WHERE uc.user_id = unread.user_id AND uc.conversation_id = unread.conversation_id;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+        '''
+        CREATE OR REPLACE FUNCTION update_user_conversation_topic_function()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            WITH last AS (
+                SELECT DISTINCT ON (topic_id) topic_id, id, message, timestamp
+                FROM new_rows
+                ORDER BY topic_id, id DESC
+            ),
+            per_sender AS (
+                SELECT topic_id, sender_id, COUNT(*) AS total
+                FROM new_rows
+                GROUP BY topic_id, sender_id
+            ),
+            -- Mensagens novas enviadas pelos outros participantes, por resumo
+            unread AS (
+                SELECT uc.user_id, uc.conversation_id,
+                       COALESCE(SUM(ps.total) FILTER (WHERE ps.sender_id <> uc.user_id), 0) AS total
+                FROM per_sender ps
+                JOIN user_conversation uc ON uc.conversation_id = ps.topic_id
+                GROUP BY uc.user_id, uc.conversation_id
+            )
+            UPDATE user_conversation uc
+            SET last_message_id = last.id,
+                last_message_preview = LEFT(last.message, 200),
+                last_message_at = last.timestamp,
+                unread_count = uc.unread_count + unread.total
+            FROM unread JOIN last ON last.topic_id = unread.conversation_id
+            WHERE uc.user_id = unread.user_id AND uc.conversation_id = unread.conversation_id;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+    ]),
+    (10, 'outbox: espera entre tentativas e estado de falha', [
+        '''
+        ALTER TABLE outbox ADD COLUMN IF NOT EXISTS retry_at TIMESTAMP,
+                           ADD COLUMN IF NOT EXISTS failed_at TIMESTAMP;
+        ''',
+        '''
+        DROP INDEX IF EXISTS ix_outbox_pending;
+        ''',
+        '''
+        CREATE INDEX ix_outbox_pending ON outbox (id) WHERE published_at IS NULL AND failed_at IS NULL;
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS ix_outbox_retry ON outbox (chat_name)
+        WHERE published_at IS NULL AND failed_at IS NULL AND retry_at IS NOT NULL;
+        ''',
+    ]),
+    (11, 'versão dos perfis (ETag do histórico)', [
+        # Avança quando um usuário muda de nome ou é apagado: os nomes vão nas páginas do histórico
+        '''
+        CREATE SEQUENCE IF NOT EXISTS profile_version;
+        ''',
+    ]),
+    (12, 'group_message.timestamp obrigatório', [
+        # Já é NOT NULL nas tabelas particionadas (partitions.py) e no modelo
+        '''
+        UPDATE group_message SET timestamp = now() WHERE timestamp IS NULL;
+        ''',
+        '''
+        ALTER TABLE group_message ALTER COLUMN timestamp SET NOT NULL;
+        ''',
+    ]),
+]
+
+
+def _ensure_version_table(conn):
+    conn.execute(text('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR(200) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT now()
+        );
+    '''))
+
+
+def _applied_versions(conn):
+    # Não cria nada: um banco sem schema_version não tem migrações aplicadas
+    if conn.execute(text("SELECT to_regclass('schema_version')")).scalar() is None:
+        return set()
+    return set(conn.execute(text('SELECT version FROM schema_version')).scalars())
+
+
+def pending_migrations(engine):
+    """Lista as migrações ainda não aplicadas, sem executar nenhum DDL."""
+    with engine.connect() as conn:
+        applied = _applied_versions(conn)
+    return [(version, description) for version, description, _ in MIGRATIONS if version not in applied]
+
+
+def migrate(engine):
+    """
+    Aplica as migrações pendentes e retorna as versões aplicadas.
+
+    O advisory lock de sessão serializa processos que migram ao mesmo tempo:
+    quem chega depois espera e, ao obter o lock, já encontra as versões
+    registradas. Cada versão roda na sua própria transação junto com o
+    registro em schema_version, então uma falha não deixa versão pela metade.
+    """
+    applied_now = []
+    with engine.connect() as conn:
+        conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': LOCK_KEY})
+        conn.commit()
+        try:
+            with conn.begin():
+                _ensure_version_table(conn)
+            applied = _applied_versions(conn)
+            conn.commit()
+
+            for version, description, steps in MIGRATIONS:
+                if version in applied:
+                    continue
+
+                with conn.begin():
+                    for step in steps:
+                        if callable(step):
+                            step(conn)
+                        else:
+                            conn.execute(text(step))
+                    conn.execute(
+                        text('INSERT INTO schema_version (version, description) VALUES (:version, :description)'),
+                        {'version': version, 'description': description},
+                    )
+                print(f'Migração {version} aplicada: {description}')
+                applied_now.append(version)
+        finally:
+            conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': LOCK_KEY})
+            conn.commit()
+
+    return applied_now
+
+
+def database_url():
+    # Mesma regra do app: DB_URL no Docker, DATABASE_URL no ambiente local
+    return os.environ.get('DB_URL') or os.getenv('DATABASE_URL')
+
+
+if __name__ == '__main__':
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description='Aplica as migrações pendentes do banco.')
+    parser.add_argument('--check', action='store_true',
+                        help='apenas lista as migrações pendentes (sai com código 1 se houver alguma)')
+    args = parser.parse_args()
+
+    engine = create_engine(database_url())
+    try:
+        if args.check:
+            pending = pending_migrations(engine)
+            for version, description in pending:
+                print(f'Pendente: {version} - {description}')
+            if not pending:
+                print('Banco atualizado, nenhuma migração pendente.')
+            sys.exit(1 if pending else 0)
+
+        if not migrate(engine):
+            print('Banco atualizado, nenhuma migração pendente.')
+    finally:
+        engine.dispose()
@@ -2,12 +2,16 @@ import uuid
 
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import joinedload
-from sqlalchemy import text, and_, or_, distinct
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy import text, and_, or_, distinct, insert, select, values, column, true
 from werkzeug.security import generate_password_hash
 
 
 db = SQLAlchemy()
 
+# Configuração de idioma da busca textual (colunas search_vector e consultas do /search)
+SEARCH_CONFIG = 'portuguese'
+
 
 class User(db.Model):
     __tablename__ = 'User'
@@ -35,9 +39,10 @@ class User(db.Model):
                                           cascade='all, delete-orphan')
 
 
-    def __init__(self, username, password):
+    def __init__(self, username, password=None, password_hash=None):
         self.username = username
-        self.password_hash = generate_password_hash(password)
+        # O hash pode vir pronto (calculado no pool de hashing da API)
+        self.password_hash = password_hash or generate_password_hash(password)
 
 class FriendList(db.Model):
     __tablename__ = 'friend_list'
@@ -58,23 +63,43 @@ class Friends(db.Model):
         self.id_friend = id_friend
 
 
+def make_pair_key(user_a, user_b):
+    # Chave canônica do par de usuários, independente da ordem (menor:maior)
+    return ':'.join(sorted((user_a, user_b)))
+
+
 class LinkQueue(db.Model):
     __tablename__ = 'link_queue'
 
     name = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_one = db.Column(db.String(36), db.ForeignKey('User.id'), nullable=False)
     user_two = db.Column(db.String(36), db.ForeignKey('User.id'), nullable=False) 
+    # Par ordenado (user_one, user_two) com índice único, usado na busca do chat 1:1
+    pair_key = db.Column(db.String(73), unique=True, nullable=False)
+
+    def __init__(self, user_one, user_two):
+        self.user_one = user_one
+        self.user_two = user_two
+        self.pair_key = make_pair_key(user_one, user_two)
 
 
 class MessageQueue(db.Model):
     __tablename__ = 'message_queue'
+    __table_args__ = (
+        # Índice para paginação por cursor (keyset) do histórico de uma fila
+        db.Index('ix_message_queue_queue_name_id', 'queue_name', 'id'),
+        # Índice da busca textual (/search)
+        db.Index('ix_message_queue_search', 'search_vector', postgresql_using='gin'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)  # ID numérico e autoincrementado
     queue_name = db.Column(db.String(36), db.ForeignKey('link_queue.name'), nullable=False)  # Chave estrangeira para a tabela 'link_queue'
     sender_id = db.Column(db.String(36), db.ForeignKey('User.id'), nullable=False)  # Chave estrangeira para a tabela 'User'
     timestamp = db.Column(db.DateTime, default=db.func.current_timestamp(), nullable=False)  # Timestamp da mensagem
     message = db.Column(db.Text, nullable=False)  # Conteúdo da mensagem
-    is_read = db.Column(db.Boolean, default=False)  # Status de leitura da mensagem
+    # Vetor da busca textual, mantido pelo próprio banco (coluna gerada)
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(f"to_tsvector('{SEARCH_CONFIG}', message)", persisted=True)))
+    is_read = db.Column(db.Boolean, default=False)  # Não usado: a leitura fica em read_cursor
 
     # Definindo o relacionamento com a tabela User
     sender = db.relationship('User', backref='messages')
@@ -117,6 +142,12 @@ class TopicMembership(db.Model):
 
 class GroupMessage(db.Model):
     __tablename__ = 'group_message'
+    __table_args__ = (
+        # Índice para paginação por cursor (keyset) do histórico de um tópico
+        db.Index('ix_group_message_topic_id_id', 'topic_id', 'id'),
+        # Índice da busca textual (/search)
+        db.Index('ix_group_message_search', 'search_vector', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     topic_id = db.Column(
@@ -126,8 +157,10 @@ class GroupMessage(db.Model):
         db.String(36), db.ForeignKey('User.id'), nullable=False
     )
     message = db.Column(db.Text, nullable=False)
-    timestamp = db.Column(db.DateTime, default=db.func.current_timestamp())
-    is_read = db.Column(db.Boolean, default=False)
+    timestamp = db.Column(db.DateTime, default=db.func.current_timestamp(), nullable=False)  # Chave das partições mensais (partitions.py)
+    # Vetor da busca textual, mantido pelo próprio banco (coluna gerada)
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(f"to_tsvector('{SEARCH_CONFIG}', message)", persisted=True)))
+    is_read = db.Column(db.Boolean, default=False)  # Não usado: a leitura fica em read_cursor
 
     def __init__(self, topic_id, sender_id, message):
         self.topic_id = topic_id
@@ -135,262 +168,87 @@ class GroupMessage(db.Model):
         self.message = message
 
 
-class LastMessageTopic(db.Model):
-    __tablename__ = 'last_message_topic'
-
-    id_from = db.Column(db.String(36), db.ForeignKey('message_topic.name'), primary_key=True) # UUID
-    id_last_message = db.Column(db.Integer, db.ForeignKey('group_message.id'), nullable=True)
-
-
-class LastMessageQueue(db.Model):
-    __tablename__ = 'last_message_queue'
-
-    id_from = db.Column(db.String(36), db.ForeignKey('link_queue.name'), primary_key=True) # UUID
-    id_last_message = db.Column(db.Integer, db.ForeignKey('message_queue.id'), nullable=True)
-
-
-def create_triggers(db):
-    session = db.session()  # Iniciar sessão
-    try:
-
-        # Remover o trigger se ele já existir
-        session.execute(text('''
-            DROP TRIGGER IF EXISTS insert_last_message_topic ON message_topic;
-        '''))
-
-        # Função para a tabela message_topic
-        session.execute(text('''
-            CREATE OR REPLACE FUNCTION insert_last_message_topic_function()
-            RETURNS TRIGGER AS $$
-            BEGIN
-                INSERT INTO last_message_topic (id_from)
-                VALUES (NEW.name);
-                RETURN NEW;
-            END;
-            $$ LANGUAGE plpgsql;
-        '''))
-
-        # Trigger que chama a função insert_last_message_topic_function
-        session.execute(text('''
-            CREATE TRIGGER insert_last_message_topic
-            AFTER INSERT ON message_topic
-            FOR EACH ROW
-            EXECUTE FUNCTION insert_last_message_topic_function();
-        '''))
-
-        session.execute(text('''
-        DROP TRIGGER IF EXISTS insert_last_message_queue ON link_queue;
-        '''))
-
-        # Função para a tabela link_queue
-        session.execute(text('''
-            CREATE OR REPLACE FUNCTION insert_last_message_queue_function()
-            RETURNS TRIGGER AS $$
-            BEGIN
-                INSERT INTO last_message_queue (id_from)
-                VALUES (NEW.name);
-                RETURN NEW;
-            END;
-            $$ LANGUAGE plpgsql;
-        '''))
-
-        # Trigger que chama a função insert_last_message_queue_function
-        session.execute(text('''
-            CREATE TRIGGER insert_last_message_queue
-            AFTER INSERT ON link_queue
-            FOR EACH ROW
-            EXECUTE FUNCTION insert_last_message_queue_function();
-        '''))
-
-
-        session.execute(text('''
-        DROP TRIGGER IF EXISTS update_last_message_topic ON group_message;
-        '''))
-
-        # Função para atualizar a tabela last_message_topic
-        session.execute(text("""
-            CREATE OR REPLACE FUNCTION update_last_message_topic_function()
-            RETURNS TRIGGER AS $$
-            BEGIN
-                -- Atualiza o campo id_last_message na tabela last_message_topic
-                UPDATE last_message_topic
-                SET id_last_message = NEW.id
-                WHERE id_from = NEW.topic_id;
-
-                RETURN NEW;
-            END;
-            $$ LANGUAGE plpgsql;
-        """))
-
-        # Trigger para a função de update da tabela group_message
-        session.execute(text("""
-            CREATE TRIGGER update_last_message_topic
-            AFTER INSERT ON group_message
-            FOR EACH ROW
-            EXECUTE FUNCTION update_last_message_topic_function();
-        """))
-
-
-        session.execute(text('''
-        DROP TRIGGER IF EXISTS update_last_message_queue ON message_queue;
-        '''))
-
-        # Função para atualizar a tabela last_message_queue
-        session.execute(text("""
-            CREATE OR REPLACE FUNCTION update_last_message_queue_function()
-            RETURNS TRIGGER AS $$
-            BEGIN
-                -- Atualiza o campo id_last_message na tabela last_message_queue
-                UPDATE last_message_queue
-                SET id_last_message = NEW.id
-                WHERE id_from = NEW.queue_name;
-
-                RETURN NEW;
-            END;
-            $$ LANGUAGE plpgsql;
-        """))
-
-        # Trigger para a função de update da tabela message_queue
-        session.execute(text("""
-            CREATE TRIGGER update_last_message_queue
-            AFTER INSERT ON message_queue
-            FOR EACH ROW
-            EXECUTE FUNCTION update_last_message_queue_function();
-        """))
-
-        session.execute(text('''
-        DROP TRIGGER IF EXISTS after_user_insert ON "User";
-        '''))
-
-        # Função e trigger para criar a friend_list quando um novo usuário for inserido
-        session.execute(text('''
-            CREATE OR REPLACE FUNCTION create_friend_list()
-            RETURNS TRIGGER AS $$
-            BEGIN
-                INSERT INTO friend_list (user_id) VALUES (NEW.id);
-                RETURN NEW;
-            END;
-            $$ LANGUAGE plpgsql;
-        '''))
-
-        session.execute(text('''
-            CREATE TRIGGER after_user_insert
-            AFTER INSERT ON "User"
-            FOR EACH ROW
-            EXECUTE FUNCTION create_friend_list();
-        '''))
-
-        session.execute(text('''
-        DROP TRIGGER IF EXISTS after_friend_insert ON friends;
-        '''))
-
-        # Função para adicionar amigo mutuo
-        session.execute(text('''
-            CREATE OR REPLACE FUNCTION add_mutual_friend()
-            RETURNS TRIGGER AS $$
-            BEGIN
-                -- Verifica se a relação inversa já existe
-                IF NOT EXISTS (
-                    SELECT 1 FROM friends 
-                    WHERE id_user = NEW.id_friend AND id_friend = NEW.id_user
-                ) THEN
-                    -- Adiciona o usuário à lista de amigos do amigo recém-adicionado
-                    INSERT INTO friends (id_user, id_friend) 
-                    VALUES (NEW.id_friend, NEW.id_user);
-                END IF;
-                RETURN NEW;
-            END;
-            $$ LANGUAGE plpgsql;
-        '''))
-
-        # Criar o trigger que chama a função após inserção na tabela friends
-        session.execute(text('''
-            CREATE TRIGGER after_friend_insert
-            AFTER INSERT ON friends
-            FOR EACH ROW
-            EXECUTE FUNCTION add_mutual_friend();
-        '''))
-
-
-        # Remover a view se ela já existir
-        session.execute(text('DROP VIEW IF EXISTS v_message_queue;'))
-
-        # Criar a view
-        session.execute(text('''
-            CREATE OR REPLACE VIEW v_message_queue AS
-            SELECT 
-                mq.id,
-                mq.message,
-                mq.timestamp,
-                u.username,
-                mq.queue_name  -- Certifique-se de incluir queue_name na view
-            FROM 
-                message_queue mq
-            JOIN 
-                "User" u ON mq.sender_id = u.id;
-        '''))
-
-        # Remover a view se ela já existir
-        session.execute(text('DROP VIEW IF EXISTS user_queue_info;'))
-
-
-        session.execute(text('''
-        CREATE OR REPLACE VIEW user_queue_info AS
-        SELECT 
-            u.username AS user_username,
-            lq.name AS queue_name,
-            mq.message AS last_message,
-            mq.timestamp AS last_message_timestamp,
-            CASE 
-                WHEN u.id = lq.user_one THEN u2.username  -- Se o usuário for user_one, pegar o username do user_two
-                ELSE u.username  -- Caso contrário, pegar o próprio username
-            END AS friend_name
-        FROM 
-            "User" u
-        JOIN 
-            link_queue lq ON u.id = lq.user_one OR u.id = lq.user_two
-        LEFT JOIN 
-            last_message_queue lmq ON lq.name = lmq.id_from
-        LEFT JOIN 
-            message_queue mq ON lmq.id_last_message = mq.id
-        LEFT JOIN 
-            "User" u2 ON (u2.id = lq.user_one OR u2.id = lq.user_two) AND u2.id != u.id;  -- Juntar novamente para pegar o outro usuário
-
-        '''))
-
-        # Remover a view se ela já existir
-        session.execute(text('DROP VIEW IF EXISTS user_topic_info;'))
-
-
-        session.execute(text('''
-        CREATE OR REPLACE VIEW user_topic_info AS
-        SELECT 
-            u.username AS user_username,
-            mt.group_name AS topic_name,
-            gm.message AS last_message,
-            gm.timestamp AS last_message_timestamp
-        FROM 
-            "User" u
-        JOIN 
-            topic_membership tm ON u.id = tm.user_id
-        JOIN 
-            message_topic mt ON tm.topic_id = mt.name
-        LEFT JOIN 
-            last_message_topic lmt ON mt.name = lmt.id_from
-        LEFT JOIN 
-            group_message gm ON lmt.id_last_message = gm.id;
-
-        '''))
-
-
-        # Confirmar a transação
-        session.commit()
-
-    except Exception as e:
-        # Em caso de erro, reverter a transação
-        session.rollback()
-        raise e
-
-    finally:
-        # Fechar a sessão
-        session.close()
+class UserConversation(db.Model):
+    __tablename__ = 'user_conversation'
+
+    # Resumo de cada conversa (QUEUE ou TOPIC) de um usuário, mantido pelos triggers
+    user_id = db.Column(db.String(36), db.ForeignKey('User.id', ondelete='CASCADE'), primary_key=True)
+    conversation_id = db.Column(db.String(36), primary_key=True)  # LinkQueue.name ou MessageTopic.name
+    conversation_type = db.Column(db.String(5), nullable=False)  # QUEUE ou TOPIC
+    peer_id = db.Column(db.String(36), nullable=True, index=True)  # Amigo da conversa (apenas QUEUE)
+    title = db.Column(db.String(100), nullable=False)  # Nome do amigo ou do grupo
+    last_message_id = db.Column(db.Integer, nullable=True)
+    last_message_preview = db.Column(db.String(200), nullable=True)
+    last_message_at = db.Column(db.DateTime, nullable=True)
+    unread_count = db.Column(db.Integer, default=0, nullable=False)
+
+    def json(self):
+        chat = {
+            'conversation_id': self.conversation_id,
+            'type': self.conversation_type,
+            'last_message': self.last_message_preview,
+            'last_message_id': self.last_message_id,
+            'timestamp': self.last_message_at.isoformat() if self.last_message_at else None,
+            'unread_count': self.unread_count,
+        }
+        if self.conversation_type == 'QUEUE':
+            chat.update({'queue_name': self.conversation_id, 'friend_name': self.title})
+        else:
+            chat.update({'topic_name': self.title})
+        return chat
+
+
+# Caixa de entrada do usuário ordenada pela atividade mais recente
+db.Index(
+    'ix_user_conversation_recent',
+    UserConversation.user_id,
+    UserConversation.last_message_at.desc().nulls_last(),
+)
+
+# Resumos de uma conversa (triggers de mensagem e exclusão do chat)
+db.Index('ix_user_conversation_conversation', UserConversation.conversation_id)
+
+
+class ReadCursor(db.Model):
+    __tablename__ = 'read_cursor'
+
+    # Marca de leitura: id da última mensagem lida pelo usuário em cada conversa (QUEUE ou TOPIC)
+    user_id = db.Column(db.String(36), db.ForeignKey('User.id', ondelete='CASCADE'), primary_key=True)
+    conversation_id = db.Column(db.String(36), primary_key=True)  # LinkQueue.name ou MessageTopic.name
+    last_read_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False)
+
+
+# Marcas de uma conversa, para contar quantos membros leram cada mensagem
+db.Index('ix_read_cursor_conversation', ReadCursor.conversation_id, ReadCursor.last_read_id)
+
+
+class Outbox(db.Model):
+    __tablename__ = 'outbox'
+    __table_args__ = (
+        # Índice parcial com apenas as mensagens que ainda não foram publicadas (nem falharam)
+        db.Index('ix_outbox_pending', 'id', postgresql_where=db.text('published_at IS NULL AND failed_at IS NULL')),
+        # Chats esperando para tentar de novo uma mensagem que falhou
+        db.Index('ix_outbox_retry', 'chat_name',
+                 postgresql_where=db.text('published_at IS NULL AND failed_at IS NULL AND retry_at IS NOT NULL')),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    idempotency_key = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
+    chat_name = db.Column(db.String(36), nullable=False)  # LinkQueue.name ou MessageTopic.name
+    msg_type = db.Column(db.String(5), nullable=False)  # QUEUE ou TOPIC
+    message_id = db.Column(db.Integer, nullable=False)  # ID em message_queue ou group_message
+    payload = db.Column(db.Text, nullable=False)  # Payload (JSON) enviado ao broker
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp(), nullable=False)
+    published_at = db.Column(db.DateTime, nullable=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    retry_at = db.Column(db.DateTime, nullable=True)  # Próxima tentativa depois de uma falha
+    failed_at = db.Column(db.DateTime, nullable=True)  # Desistiu após OUTBOX_MAX_ATTEMPTS tentativas
+
+    def __init__(self, chat_name, msg_type, message_id, payload):
+        self.idempotency_key = str(uuid.uuid4())
+        self.chat_name = chat_name
+        self.msg_type = msg_type
+        self.message_id = message_id
+        self.payload = payload
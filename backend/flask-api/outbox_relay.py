@@ -0,0 +1,223 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from models import db, text
+
+
+# Configuração padrão do relay da outbox
+BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 100))
+POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 0.5))
+# Chats publicados em paralelo (a ordem dentro de cada chat é mantida)
+PUBLISH_WORKERS = int(os.getenv('OUTBOX_PUBLISH_WORKERS', 8))
+# Tentativas até a mensagem ir para o estado de falha (failed_at), liberando o chat
+MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 10))
+# Espera antes de tentar de novo o chat com falha: RETRY_BASE * 2^(tentativas - 1), até RETRY_MAX
+RETRY_BASE = float(os.getenv('OUTBOX_RETRY_BASE', 1))
+RETRY_MAX = float(os.getenv('OUTBOX_RETRY_MAX', 60))
+
+# Chave do advisory lock: apenas um relay publica por vez, mantendo a ordem por chat
+LOCK_KEY = 7300001
+
+
+class OutboxRelay:
+    """
+    Publica no broker as mensagens gravadas na tabela outbox.
+
+    As mensagens pendentes são lidas em lotes, em ordem de id, e agrupadas
+    por chat: chats diferentes são publicados em paralelo e, dentro de cada
+    chat, uma mensagem por vez e em ordem. Nenhuma transação fica aberta
+    durante a publicação; o resultado do lote é gravado depois, em um único
+    commit. Um advisory lock de sessão garante um só relay ativo.
+
+    Se a publicação de uma mensagem falhar, as próximas do mesmo chat ficam
+    para depois e o chat espera (retry_at) com backoff exponencial; os chats
+    em espera ficam fora dos lotes seguintes, então não travam os demais.
+    Depois de max_attempts a mensagem vai para o estado de falha (failed_at)
+    e o chat segue. A entrega é at-least-once: cada payload leva a
+    idempotency_key da outbox para descarte de duplicadas.
+    """
+
+    def __init__(self, publish, batch_size=BATCH_SIZE, poll_interval=POLL_INTERVAL,
+                 workers=PUBLISH_WORKERS, max_attempts=MAX_ATTEMPTS):
+        self.publish = publish  # publish(payload) deve levantar exceção em caso de falha
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.workers = workers
+        self.max_attempts = max_attempts
+
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pool = None
+
+        self.published = 0
+        self.failures = 0
+        self.dead = 0
+        self.last_batch_seconds = 0.0
+
+    def run_once(self):
+        """Processa um lote. Retorna quantas mensagens foram lidas do lote."""
+        start = time.perf_counter()
+        lock_conn = db.engine.connect()
+        try:
+            locked = lock_conn.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': LOCK_KEY}).scalar()
+            lock_conn.commit()
+            if not locked:
+                return 0
+            try:
+                return self._process_batch()
+            finally:
+                lock_conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': LOCK_KEY})
+                lock_conn.commit()
+        finally:
+            lock_conn.close()
+            self.last_batch_seconds = time.perf_counter() - start
+
+    def _process_batch(self):
+        # Leitura curta: pendentes em ordem de id, sem os chats em espera por uma falha
+        rows = db.session.execute(text('''
+            SELECT id, chat_name, idempotency_key, payload, attempts
+            FROM outbox
+            WHERE published_at IS NULL AND failed_at IS NULL
+              AND chat_name NOT IN (
+                  SELECT chat_name FROM outbox
+                  WHERE published_at IS NULL AND failed_at IS NULL AND retry_at > now()
+              )
+            ORDER BY id
+            LIMIT :limit
+        '''), {'limit': self.batch_size}).all()
+        db.session.commit()
+        if not rows:
+            return 0
+
+        chats = {}
+        for row in rows:
+            chats.setdefault(row.chat_name, []).append(row)
+
+        app = current_app._get_current_object()
+        results = list(self._executor().map(lambda entries: self._publish_chat(app, entries), chats.values()))
+
+        published = [entry_id for ids, _ in results for entry_id in ids]
+        failed = [failure for _, failure in results if failure is not None]
+        self._record(published, failed)
+        return len(rows)
+
+    def _executor(self):
+        # Pool recriado em processos filhos (fork)
+        if self._pool is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='outbox-publish')
+        return self._pool
+
+    def _publish_chat(self, app, entries):
+        """Publica as mensagens de um chat em ordem; para na primeira falha."""
+        published = []
+        with app.app_context():
+            for entry in entries:
+                payload = json.loads(entry.payload)
+                payload['idempotencyKey'] = entry.idempotency_key
+                try:
+                    self.publish(payload)
+                except Exception as e:
+                    return published, (entry, str(e))
+                published.append(entry.id)
+        return published, None
+
+    def _record(self, published, failed):
+        try:
+            if published:
+                db.session.execute(text('''
+                    UPDATE outbox SET published_at = now(), attempts = attempts + 1,
+                                      last_error = NULL, retry_at = NULL
+                    WHERE id = ANY(:ids)
+                '''), {'ids': published})
+
+            for entry, error in failed:
+                attempts = entry.attempts + 1
+                dead = attempts >= self.max_attempts
+                delay = min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+                db.session.execute(text('''
+                    UPDATE outbox SET attempts = :attempts, last_error = :error,
+                                      retry_at = CASE WHEN :dead THEN NULL
+                                                      ELSE now() + make_interval(secs => :delay) END,
+                                      failed_at = CASE WHEN :dead THEN now() END
+                    WHERE id = :id
+                '''), {'id': entry.id, 'attempts': attempts, 'error': error, 'dead': dead, 'delay': delay})
+                if dead:
+                    self.dead += 1
+                    print(f'Outbox: mensagem {entry.id} do chat {entry.chat_name} falhou '
+                          f'{attempts} vezes e foi para o estado de falha: {error}')
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        self.published += len(published)
+        self.failures += len(failed)
+
+    def requeue_failed(self):
+        """Devolve para a fila as mensagens no estado de falha. Retorna quantas."""
+        count = db.session.execute(text('''
+            UPDATE outbox SET failed_at = NULL, retry_at = NULL, attempts = 0
+            WHERE failed_at IS NOT NULL AND published_at IS NULL
+        ''')).rowcount
+        db.session.commit()
+        return count
+
+    def run_forever(self, app):
+        while True:
+            try:
+                with app.app_context():
+                    processed = self.run_once()
+            except Exception as e:
+                print(f'Erro no relay da outbox: {e}')
+                processed = 0
+
+            # Lote cheio: ainda há pendentes, continua sem esperar
+            if processed < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def start(self, app):
+        """Inicia o relay em uma thread do processo atual (uma vez por processo)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._pool = None
+            self._thread = threading.Thread(target=self.run_forever, args=(app,), name='outbox-relay', daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        # Acorda o relay logo após o commit de uma nova mensagem
+        self._wakeup.set()
+
+    def stats(self):
+        # Lag = idade da mensagem pendente mais antiga, calculada no próprio banco
+        pending, lag, retrying, failed = db.session.execute(text('''
+            SELECT count(*) FILTER (WHERE failed_at IS NULL),
+                   extract(epoch FROM now() - min(created_at) FILTER (WHERE failed_at IS NULL)),
+                   count(*) FILTER (WHERE failed_at IS NULL AND retry_at > now()),
+                   count(*) FILTER (WHERE failed_at IS NOT NULL)
+            FROM outbox
+            WHERE published_at IS NULL
+        ''')).one()
+
+        return {
+            'pending': pending,
+            'lag_seconds': max(float(lag or 0), 0.0),
+            'retrying': retrying,
+            'failed': failed,
+            'published': self.published,
+            'failures': self.failures,
+            'dead_lettered': self.dead,
+            'workers': self.workers,
+            'max_attempts': self.max_attempts,
+            'last_batch_seconds': self.last_batch_seconds,
+        }
@@ -0,0 +1,386 @@
+"""
+Particionamento mensal e arquivamento das tabelas de mensagens.
+
+Opcional: `enable` converte message_queue e group_message em tabelas
+particionadas por mês (RANGE em timestamp). A tabela atual vira a partição
+<tabela>_initial, sem copiar linhas; os meses seguintes ganham partições
+<tabela>_pAAAA_MM e <tabela>_default recebe o que cair fora delas.
+
+    python partitions.py enable                   # converte (uma vez, com lock exclusivo)
+    python partitions.py maintain                 # cria as partições dos próximos meses
+    python partitions.py maintain --every 86400   # idem, em loop
+    python partitions.py archive --dir /arquivo   # exporta e remove as partições antigas
+    python partitions.py status
+
+Cada partição arquivada vira <nome>.csv.gz (CSV com cabeçalho, colunas
+armazenadas). Para consultar de novo: crie uma tabela com LIKE e use
+`\\copy <tabela> (colunas) FROM PROGRAM 'gunzip -c <arquivo>' CSV HEADER`.
+"""
+import argparse
+import gzip
+import os
+import re
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+
+from migrations import LOCK_KEY, database_url
+from models import db, text
+
+# As configurações abaixo também podem vir do .env
+load_dotenv()
+
+# Tabelas de mensagens particionáveis (chave: coluna timestamp)
+TABLES = ('message_queue', 'group_message')
+# Meses à frente que já ficam com partição criada
+MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', 3))
+# Partições que terminam antes do início do mês de tantos meses atrás são arquivadas
+ARCHIVE_AFTER_MONTHS = int(os.getenv('ARCHIVE_AFTER_MONTHS', 12))
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'archive')
+
+BOUNDS = re.compile(r"FROM \((.+)\) TO \((.+)\)")
+
+
+def month_start(value, months=0):
+    """Primeiro dia do mês de value deslocado de months meses."""
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, start):
+    return f'{table}_p{start:%Y_%m}'
+
+
+def hot_since(months):
+    """Expressão SQL do início da janela quente: o mês corrente e os months - 1 anteriores."""
+    return db.func.date_trunc('month', db.func.localtimestamp()) - db.func.make_interval(0, months - 1)
+
+
+def is_partitioned(conn, table):
+    return conn.execute(text('''
+        SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))
+    '''), {'table': table}).scalar()
+
+
+def _bound(value):
+    # MINVALUE/MAXVALUE viram None; os demais são literais de timestamp
+    if value in ('MINVALUE', 'MAXVALUE'):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+def list_partitions(conn, table):
+    """Partições de table em ordem: dicionários com name, lower, upper, default e rows (estimativa)."""
+    rows = conn.execute(text('''
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:table)
+    '''), {'table': table}).all()
+
+    partitions = []
+    for name, bounds, rows_estimate in rows:
+        match = BOUNDS.search(bounds)
+        partitions.append({
+            'name': name,
+            'lower': _bound(match.group(1)) if match else None,
+            'upper': _bound(match.group(2)) if match else None,
+            'default': match is None,
+            'rows': max(int(rows_estimate), 0),
+        })
+    return sorted(partitions, key=lambda p: (p['default'], p['lower'] or datetime.min))
+
+
+def _stored_columns(conn, table):
+    # Colunas gravadas de fato (sem as geradas, que não aceitam INSERT nem precisam de export)
+    names = conn.execute(text('''
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = to_regclass(:table) AND attnum > 0 AND NOT attisdropped AND attgenerated = ''
+        ORDER BY attnum
+    '''), {'table': table}).scalars()
+    return ', '.join(f'"{name}"' for name in names)
+
+
+def enable_partitioning(conn, table):
+    """
+    Converte table em particionada por mês, sem copiar as linhas.
+
+    A tabela atual vira a partição <table>_initial com tudo até o fim do mês
+    corrente (ou do mês da mensagem mais nova). Índices e FKs equivalentes são
+    reaproveitados no ATTACH; só a chave primária (id, timestamp), exigida
+    pelo particionamento, é construída. Triggers e views que dependem da
+    tabela são recriados sobre a tabela particionada. Retorna False se table
+    já é particionada. Não faz commit.
+    """
+    if is_partitioned(conn, table):
+        return False
+
+    initial = f'{table}_initial'
+    params = {'table': table}
+    conn.execute(text(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE'))
+
+    views = conn.execute(text('''
+        SELECT DISTINCT v.relname, pg_get_viewdef(v.oid)
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid
+        JOIN pg_class v ON v.oid = r.ev_class
+        WHERE d.refobjid = to_regclass(:table) AND v.relkind = 'v'
+    '''), params).all()
+    triggers = conn.execute(text('''
+        SELECT tgname, pg_get_triggerdef(oid) FROM pg_trigger
+        WHERE tgrelid = to_regclass(:table) AND NOT tgisinternal
+    '''), params).all()
+    foreign_keys = conn.execute(text('''
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = to_regclass(:table) AND contype = 'f'
+    '''), params).all()
+    indexes = conn.execute(text('''
+        SELECT i.relname, pg_get_indexdef(x.indexrelid), x.indisprimary
+        FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = to_regclass(:table)
+    '''), params).all()
+
+    # Views e triggers voltam sobre a tabela nova (trigger com transition table não pode ficar na partição)
+    for name, _ in views:
+        conn.execute(text(f'DROP VIEW {name}'))
+    for name, _ in triggers:
+        conn.execute(text(f'DROP TRIGGER {name} ON {table}'))
+
+    # A chave de partição não aceita NULL: linhas antigas sem horário ficam com o mais antigo
+    conn.execute(text(f'''
+        UPDATE {table} SET "timestamp" = COALESCE((SELECT MIN("timestamp") FROM {table}), localtimestamp)
+        WHERE "timestamp" IS NULL
+    '''))
+    conn.execute(text(f'ALTER TABLE {table} ALTER COLUMN "timestamp" SET NOT NULL'))
+    upper = conn.execute(text(f'''
+        SELECT GREATEST(date_trunc('month', localtimestamp), date_trunc('month', MAX("timestamp")))
+               + interval '1 month'
+        FROM {table}
+    ''')).scalar()
+
+    conn.execute(text(f'ALTER TABLE {table} RENAME TO {initial}'))
+    for name, _, primary in indexes:
+        if primary:
+            conn.execute(text(f'ALTER TABLE {initial} DROP CONSTRAINT {name}'))
+        else:
+            conn.execute(text(f'ALTER INDEX {name} RENAME TO {name}_initial'))
+
+    conn.execute(text(f'''
+        CREATE TABLE {table} (LIKE {initial} INCLUDING DEFAULTS INCLUDING GENERATED)
+        PARTITION BY RANGE ("timestamp")
+    '''))
+    conn.execute(text(f'ALTER TABLE {table} ADD PRIMARY KEY (id, "timestamp")'))
+    for name, definition, primary in indexes:
+        if not primary:
+            conn.execute(text(definition))
+    for name, definition in foreign_keys:
+        conn.execute(text(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}'))
+
+    # A sequência do id passa a pertencer à tabela particionada (apagar partições não a remove)
+    sequence = conn.execute(text('SELECT pg_get_serial_sequence(:table, :column)'),
+                            {'table': initial, 'column': 'id'}).scalar()
+    if sequence:
+        conn.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id'))
+
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {initial} FOR VALUES FROM (MINVALUE) TO ('{upper:%Y-%m-%d}')"))
+    conn.execute(text(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT'))
+
+    for _, definition in triggers:
+        conn.execute(text(definition))
+    for name, definition in views:
+        conn.execute(text(f'CREATE VIEW {name} AS {definition}'))
+
+    return True
+
+
+def ensure_partitions(conn, table, months_ahead=MONTHS_AHEAD):
+    """
+    Cria as partições mensais que faltam: do mês corrente até months_ahead
+    meses à frente e dos meses que já têm linhas em <table>_default (movidas
+    para a partição nova). Retorna os nomes criados. Não faz commit.
+    """
+    default = f'{table}_default'
+    now = conn.execute(text('SELECT localtimestamp')).scalar()
+    months = {month_start(now, offset) for offset in range(months_ahead + 1)}
+    months.update(conn.execute(text(f'''
+        SELECT DISTINCT date_trunc('month', "timestamp") FROM {default}
+    ''')).scalars())
+
+    partitions = [p for p in list_partitions(conn, table) if not p['default']]
+    created = []
+    for start in sorted(months):
+        end = month_start(start, 1)
+        if any((p['lower'] is None or p['lower'] < end) and (p['upper'] is None or p['upper'] > start)
+               for p in partitions):
+            continue
+
+        name = partition_name(table, start)
+        bounds = f"FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+        window = {'start': start, 'end': end}
+        pending = conn.execute(text(f'''
+            SELECT EXISTS (SELECT 1 FROM {default} WHERE "timestamp" >= :start AND "timestamp" < :end)
+        '''), window).scalar()
+
+        if not pending:
+            conn.execute(text(f'CREATE TABLE {name} PARTITION OF {table} FOR VALUES {bounds}'))
+        else:
+            # O mês já tem linhas na default: move para a tabela nova antes do ATTACH
+            columns = _stored_columns(conn, table)
+            conn.execute(text(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING GENERATED)'))
+            conn.execute(text(f'''
+                WITH moved AS (
+                    DELETE FROM {default} WHERE "timestamp" >= :start AND "timestamp" < :end
+                    RETURNING {columns}
+                )
+                INSERT INTO {name} ({columns}) SELECT {columns} FROM moved
+            '''), window)
+            conn.execute(text(f'ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES {bounds}'))
+
+        partitions.append({'name': name, 'lower': start, 'upper': end})
+        created.append(name)
+    return created
+
+
+def _export(conn, name, directory):
+    # Grava em .part e renomeia só depois do fsync: um arquivo .csv.gz está sempre completo
+    path = os.path.join(directory, f'{name}.csv.gz')
+    columns = _stored_columns(conn, name)
+    with open(f'{path}.part', 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as file:
+            with conn.connection.cursor() as cursor:
+                cursor.copy_expert(f'COPY (SELECT {columns} FROM {name} ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER)', file)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(f'{path}.part', path)
+    return path
+
+
+def archive_partitions(conn, table, directory=ARCHIVE_DIR, after_months=ARCHIVE_AFTER_MONTHS):
+    """
+    Arquiva as partições de table que terminam antes do corte.
+
+    Cada partição é desanexada (commit), exportada para <nome>.csv.gz em
+    directory e só então apagada. Se a exportação falhar, a tabela
+    desanexada continua no banco e é exportada na próxima execução. A
+    partição default nunca é arquivada. Retorna os arquivos gravados.
+    """
+    with conn.begin():
+        if not is_partitioned(conn, table):
+            return []
+        cutoff = month_start(conn.execute(text('SELECT localtimestamp')).scalar(), -after_months)
+        for partition in list_partitions(conn, table):
+            if not partition['default'] and partition['upper'] is not None and partition['upper'] <= cutoff:
+                conn.execute(text(f'ALTER TABLE {table} DETACH PARTITION {partition["name"]}'))
+
+    # Desanexadas agora ou numa execução anterior que não terminou
+    with conn.begin():
+        detached = conn.execute(text('''
+            SELECT relname FROM pg_class
+            WHERE relkind = 'r' AND NOT relispartition AND pg_table_is_visible(oid) AND relname ~ :pattern
+            ORDER BY relname
+        '''), {'pattern': f'^{table}_(initial|p[0-9]{{4}}_[0-9]{{2}})$'}).scalars().all()
+
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name in detached:
+        with conn.begin():
+            path = _export(conn, name, directory)
+        with conn.begin():
+            conn.execute(text(f'DROP TABLE {name}'))
+        print(f'Partição {name} arquivada em {path}')
+        paths.append(path)
+    return paths
+
+
+@contextmanager
+def schema_lock(engine):
+    """Conexão com o advisory lock das migrações: uma alteração de esquema por vez."""
+    with engine.connect() as conn:
+        conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': LOCK_KEY})
+        conn.commit()
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+            conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': LOCK_KEY})
+            conn.commit()
+
+
+def maintain(engine, months_ahead=MONTHS_AHEAD):
+    """Cria as partições que faltam nas tabelas particionadas. Retorna os nomes criados."""
+    created = []
+    with schema_lock(engine) as conn:
+        for table in TABLES:
+            with conn.begin():
+                if is_partitioned(conn, table):
+                    created += ensure_partitions(conn, table, months_ahead)
+    for name in created:
+        print(f'Partição {name} criada')
+    return created
+
+
+def print_status(engine):
+    with engine.connect() as conn:
+        for table in TABLES:
+            if not is_partitioned(conn, table):
+                print(f'{table}: não particionada')
+                continue
+            print(f'{table}:')
+            for partition in list_partitions(conn, table):
+                if partition['default']:
+                    bounds = 'DEFAULT'
+                else:
+                    lower = f'{partition["lower"]:%Y-%m-%d}' if partition['lower'] else 'início'
+                    bounds = f'{lower} a {partition["upper"]:%Y-%m-%d}'
+                print(f'  {partition["name"]:<32} {bounds:<26} ~{partition["rows"]} linhas')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Particionamento mensal e arquivamento das mensagens.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    enable = commands.add_parser('enable', help='converte as tabelas de mensagens em particionadas')
+    enable.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD)
+    maintain_parser = commands.add_parser('maintain', help='cria as partições dos próximos meses')
+    maintain_parser.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD)
+    maintain_parser.add_argument('--every', type=float, help='repete a cada tantos segundos')
+    archive = commands.add_parser('archive', help='exporta e remove as partições antigas')
+    archive.add_argument('--dir', default=ARCHIVE_DIR)
+    archive.add_argument('--after-months', type=int, default=ARCHIVE_AFTER_MONTHS)
+    commands.add_parser('status', help='lista as partições')
+    args = parser.parse_args()
+
+    engine = create_engine(database_url())
+    try:
+        if args.command == 'enable':
+            with schema_lock(engine) as conn:
+                for table in TABLES:
+                    with conn.begin():
+                        if enable_partitioning(conn, table):
+                            ensure_partitions(conn, table, args.months_ahead)
+                            print(f'{table} particionada por mês')
+                        else:
+                            print(f'{table} já é particionada')
+
+        elif args.command == 'maintain':
+            while True:
+                try:
+                    maintain(engine, args.months_ahead)
+                except Exception as e:
+                    if not args.every:
+                        raise
+                    print(f'Erro ao criar partições: {e}')
+                if not args.every:
+                    break
+                time.sleep(args.every)
+
+        elif args.command == 'archive':
+            with schema_lock(engine) as conn:
+                for table in TABLES:
+                    archive_partitions(conn, table, args.dir, args.after_months)
+
+        else:
+            print_status(engine)
+    finally:
+        engine.dispose()
@@ -0,0 +1,113 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from java_client import LatencyStats
+
+
+# Configuração padrão do pool de hashing de senhas
+# O método deve ser completo (ex.: 'pbkdf2:sha256:600000'): ele é comparado ao
+# prefixo dos hashes salvos para decidir quando refazer o hash no login
+HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+WORKERS = int(os.getenv('PASSWORD_POOL_WORKERS', 2))
+MAX_PENDING = int(os.getenv('PASSWORD_POOL_MAX_PENDING', 32))
+TIMEOUT = float(os.getenv('PASSWORD_POOL_TIMEOUT', 10))
+# Processos do pool criados pelo forkserver (ou spawn, onde não há forkserver): um fork
+# direto do worker copiaria as threads, locks e conexões abertas dele
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+class PasswordPoolBusy(Exception):
+    """Fila do pool de hashing cheia: a requisição deve responder 503."""
+
+
+class PasswordPool:
+    """
+    Executa o hashing e a verificação de senhas em um pool de processos.
+
+    O KDF do Werkzeug é lento de propósito; rodando fora do worker do
+    Flask-SocketIO ele não trava a entrega de mensagens. O número de
+    operações pendentes é limitado e, acima do limite, as chamadas falham
+    com PasswordPoolBusy em vez de enfileirar indefinidamente.
+    """
+
+    def __init__(self, method=HASH_METHOD, workers=WORKERS, max_pending=MAX_PENDING, timeout=TIMEOUT):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.stats = LatencyStats()
+        self.rejected = 0
+
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # O pool é criado sob demanda e recriado em processos filhos (fork)
+        if self._executor is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context(START_METHOD))
+        return self._executor
+
+    def _run(self, name, func, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordPoolBusy('Muitas requisições de autenticação, tente novamente.')
+            self._pending += 1
+            executor = self._get_executor()
+
+        start = time.perf_counter()
+        try:
+            future = executor.submit(func, *args)
+        except Exception:
+            self._release()
+            raise
+        # A vaga só volta quando o job termina de fato: depois de um timeout ele
+        # continua rodando no pool e ainda conta como pendente
+        future.add_done_callback(self._release)
+
+        ok = False
+        try:
+            result = future.result(timeout=self.timeout)
+            ok = True
+            return result
+        except FutureTimeoutError:
+            future.cancel()  # Só tem efeito se o job ainda estiver na fila
+            raise PasswordPoolBusy('Tempo esgotado na autenticação, tente novamente.')
+        finally:
+            self.stats.record(name, time.perf_counter() - start, ok)
+
+    def _release(self, future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def hash_password(self, password):
+        return self._run('hash', generate_password_hash, password, self.method)
+
+    def check_password(self, pwhash, password):
+        return self._run('check', check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        # O prefixo do hash ("metodo:parametros$salt$hash") guarda os parâmetros usados
+        return pwhash.split('$', 1)[0] != self.method
+
+    def status(self):
+        with self._lock:
+            pending = self._pending
+        return {
+            'method': self.method,
+            'workers': self.workers,
+            'pending': pending,
+            'max_pending': self.max_pending,
+            'rejected': self.rejected,
+            'latency': self.stats.snapshot(),
+        }
@@ -0,0 +1,196 @@
+import bisect
+import os
+import threading
+
+from sqlalchemy import case, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models import (GroupMessage, MessageQueue, ReadCursor, UserConversation, db,
+                    column, select, values)
+
+
+# Configuração padrão da gravação das marcas de leitura
+DEBOUNCE = float(os.getenv('READ_CURSOR_DEBOUNCE_MS', 1000)) / 1000
+# Acima deste número de marcas pendentes a gravação é antecipada
+MAX_PENDING = int(os.getenv('READ_CURSOR_MAX_PENDING', 5000))
+
+
+def _unread_after(model, chat_column, cursors):
+    # Mensagens de outros participantes acima da marca de leitura
+    return (
+        select(db.func.count(model.id))
+        .where(chat_column == UserConversation.conversation_id,
+               model.id > cursors.c.last_read_id,
+               model.sender_id != UserConversation.user_id)
+        .scalar_subquery()
+    )
+
+
+def save_read_cursors(marks):
+    """
+    Grava as marcas [(user_id, conversation_id, last_read_id)] e ajusta unread_count.
+
+    Um único upsert para todas as marcas: a marca só avança (GREATEST) e só é
+    gravada para conversas do próprio usuário. Em seguida unread_count é
+    recalculado a partir da marca, contando apenas as mensagens acima dela.
+    Retorna as marcas efetivamente gravadas. Não faz commit.
+    """
+    if not marks:
+        return []
+
+    marks_table = values(
+        column('user_id', db.String), column('conversation_id', db.String), column('last_read_id', db.Integer),
+        name='marks',
+    ).data(marks)
+
+    stmt = pg_insert(ReadCursor).from_select(
+        ['user_id', 'conversation_id', 'last_read_id'],
+        select(marks_table.c.user_id, marks_table.c.conversation_id, marks_table.c.last_read_id)
+        .join(UserConversation, (UserConversation.user_id == marks_table.c.user_id)
+              & (UserConversation.conversation_id == marks_table.c.conversation_id)),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ReadCursor.user_id, ReadCursor.conversation_id],
+        set_={
+            'last_read_id': db.func.greatest(ReadCursor.last_read_id, stmt.excluded.last_read_id),
+            'updated_at': db.func.now(),
+        },
+    ).returning(ReadCursor.user_id, ReadCursor.conversation_id, ReadCursor.last_read_id)
+    saved = [tuple(row) for row in db.session.execute(stmt)]
+
+    if saved:
+        cursors = values(
+            column('user_id', db.String), column('conversation_id', db.String), column('last_read_id', db.Integer),
+            name='cursors',
+        ).data(saved)
+        db.session.execute(
+            update(UserConversation)
+            .where(UserConversation.user_id == cursors.c.user_id,
+                   UserConversation.conversation_id == cursors.c.conversation_id)
+            .values(unread_count=case(
+                (UserConversation.conversation_type == 'QUEUE',
+                 _unread_after(MessageQueue, MessageQueue.queue_name, cursors)),
+                else_=_unread_after(GroupMessage, GroupMessage.topic_id, cursors),
+            ))
+            .execution_options(synchronize_session=False)
+        )
+
+    return saved
+
+
+def read_counts(conversation_id, messages):
+    """
+    Preenche 'read_by' em cada mensagem: quantos participantes (fora o
+    remetente) já têm a marca de leitura nela ou depois.
+
+    messages são dicionários com 'id' e 'sender_id'. Uma consulta pelas marcas
+    da conversa, independente do tamanho da página.
+    """
+    if not messages:
+        return messages
+
+    cursors = dict(
+        db.session.query(ReadCursor.user_id, ReadCursor.last_read_id)
+        .filter(ReadCursor.conversation_id == conversation_id,
+                ReadCursor.last_read_id >= min(message['id'] for message in messages))
+        .all()
+    )
+    watermarks = sorted(cursors.values())
+
+    for message in messages:
+        read_by = len(watermarks) - bisect.bisect_left(watermarks, message['id'])
+        if cursors.get(message['sender_id'], 0) >= message['id']:
+            read_by -= 1
+        message['read_by'] = read_by
+    return messages
+
+
+class ReadCursorWriter:
+    """
+    Agrupa as marcas de leitura e grava com debounce.
+
+    mark() só guarda em memória a maior marca de cada (usuário, conversa); a
+    cada window segundos uma thread grava as pendentes com save_read_cursors.
+    Ler um backlog inteiro, com várias marcas enviadas durante a rolagem,
+    vira um único upsert por conversa. Depois de gravar, on_flush(marcas) é
+    chamado (ex.: avisar a sala que a mensagem foi lida).
+    """
+
+    def __init__(self, on_flush=None, window=DEBOUNCE, max_pending=MAX_PENDING):
+        self.on_flush = on_flush
+        self.window = window
+        self.max_pending = max_pending
+
+        self._pending = {}  # (user_id, conversation_id) -> last_read_id
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+        self.marks = 0
+        self.saved = 0
+        self.flushes = 0
+
+    def mark(self, user_id, conversation_id, last_read_id):
+        key = (user_id, conversation_id)
+        with self._lock:
+            self.marks += 1
+            if last_read_id > self._pending.get(key, 0):
+                self._pending[key] = last_read_id
+            if len(self._pending) >= self.max_pending:
+                self._wakeup.set()
+
+    def flush(self):
+        """Grava as marcas pendentes (precisa de app context). Retorna as gravadas."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return []
+
+        try:
+            saved = save_read_cursors([(user_id, name, last_read_id) for (user_id, name), last_read_id in pending.items()])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Devolve as marcas para a próxima tentativa sem perder marcas mais novas
+            with self._lock:
+                for key, last_read_id in pending.items():
+                    if last_read_id > self._pending.get(key, 0):
+                        self._pending[key] = last_read_id
+            raise
+
+        self.saved += len(saved)
+        self.flushes += 1
+        if self.on_flush and saved:
+            self.on_flush(saved)
+        return saved
+
+    def run_forever(self, app):
+        while True:
+            self._wakeup.wait(self.window)
+            self._wakeup.clear()
+            try:
+                with app.app_context():
+                    self.flush()
+            except Exception as e:
+                print(f'Erro ao gravar marcas de leitura: {e}')
+
+    def start(self, app):
+        """Inicia a gravação em uma thread do processo atual (uma vez por processo)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.run_forever, args=(app,), name='read-cursors', daemon=True)
+            self._thread.start()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'window_ms': self.window * 1000,
+            'pending': pending,
+            'marks': self.marks,
+            'saved': self.saved,
+            'flushes': self.flushes,
+        }
@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+
+import stomp
+
+from stomp_publisher import destination_for
+
+
+# Configuração padrão do consumidor de mensagens dentro do processo Flask
+HEARTBEATS = int(os.getenv('STOMP_HEARTBEAT_MS', 10000))
+RECONNECT_DELAY = float(os.getenv('STOMP_RECONNECT_DELAY', 2))
+
+
+class RoomSubscriber(stomp.ConnectionListener):
+    """
+    Consome as filas e tópicos dos chats direto do ActiveMQ via STOMP.
+
+    Cada chat é assinado uma única vez por processo, enquanto houver ao
+    menos um socket na sala correspondente, e cada mensagem recebida é
+    repassada para on_message(sala, dados, trace, idempotency_key, tópico),
+    com tópico=True para mensagens de grupo (cada assinante recebe a sua
+    cópia). Quando o último socket sai da sala a assinatura é cancelada.
+    """
+
+    def __init__(self, host, port, on_message, username=None, password=None,
+                 heartbeats=HEARTBEATS, reconnect_delay=RECONNECT_DELAY):
+        self.host_and_ports = [(host, int(port))]
+        self.on_message_callback = on_message
+        self.username = username
+        self.password = password
+        self.heartbeats = (heartbeats, heartbeats)
+        self.reconnect_delay = reconnect_delay
+
+        self._rooms = {}  # nome do chat -> {'destination': ..., 'sids': set()}
+        self._lock = threading.RLock()
+        self._conn = None
+        self._reconnecting = False
+
+    def _ensure_connected(self):
+        """Conecta ao broker se preciso. Retorna True se (re)conectou."""
+        if self._conn is not None and self._conn.is_connected():
+            return False
+
+        conn = stomp.Connection(self.host_and_ports, heartbeats=self.heartbeats)
+        conn.set_listener('room_subscriber', self)
+        conn.connect(self.username, self.password, wait=True)
+        self._conn = conn
+
+        # Refaz as assinaturas das salas ativas na nova conexão
+        for name, room in self._rooms.items():
+            conn.subscribe(room['destination'], id=name, ack='auto')
+        return True
+
+    def join(self, sid, msg_type, name):
+        with self._lock:
+            room = self._rooms.setdefault(
+                name, {'destination': destination_for(msg_type, name), 'sids': set()}
+            )
+            first = not room['sids']
+            room['sids'].add(sid)
+
+            if not self._ensure_connected() and first:
+                self._conn.subscribe(room['destination'], id=name, ack='auto')
+
+    def leave(self, sid, name):
+        with self._lock:
+            room = self._rooms.get(name)
+            if not room:
+                return
+
+            room['sids'].discard(sid)
+            if room['sids']:
+                return
+
+            del self._rooms[name]
+            if self._conn is not None and self._conn.is_connected():
+                self._conn.unsubscribe(id=name)
+
+    def drop(self, sid):
+        # Socket desconectado: sai de todas as salas em que estava
+        with self._lock:
+            for name in [name for name, room in self._rooms.items() if sid in room['sids']]:
+                self.leave(sid, name)
+
+    def rooms(self):
+        with self._lock:
+            return {name: len(room['sids']) for name, room in self._rooms.items()}
+
+    def on_message(self, frame):
+        name = frame.headers.get('subscription')
+        username = frame.headers.get('username')
+        message = frame.headers.get('message')
+        trace = frame.headers.get('trace')
+
+        # Mensagens publicadas pelo StompPublisher também trazem o payload no corpo
+        if (username is None or message is None) and frame.body:
+            try:
+                body = json.loads(frame.body)
+                username = body.get('username')
+                message = body.get('message')
+                trace = trace or body.get('trace')
+            except (TypeError, ValueError):
+                pass
+
+        if name is None or username is None or message is None:
+            return
+
+        # A chave de idempotência vai junto para o descarte de duplicadas na entrega
+        topic = (frame.headers.get('destination') or '').startswith('/topic/')
+        self.on_message_callback(name, {'username': username.upper(), 'message': message}, trace,
+                                 frame.headers.get('idempotency_key'), topic)
+
+    def on_disconnected(self):
+        with self._lock:
+            if self._reconnecting or not self._rooms:
+                return
+            self._reconnecting = True
+
+        threading.Thread(target=self._reconnect, daemon=True).start()
+
+    def _reconnect(self):
+        while True:
+            time.sleep(self.reconnect_delay)
+            with self._lock:
+                if not self._rooms:
+                    break
+                try:
+                    self._ensure_connected()
+                    break
+                except Exception as e:
+                    print(f'Falha ao reconectar no broker STOMP: {e}')
+
+        with self._lock:
+            self._reconnecting = False
+
+    def close(self):
+        with self._lock:
+            self._rooms.clear()
+            if self._conn is not None and self._conn.is_connected():
+                self._conn.disconnect()
+            self._conn = None
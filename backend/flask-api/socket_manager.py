@@ -0,0 +1,182 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import socketio
+
+from java_client import LatencyStats
+
+
+# Configuração padrão do fan-out do Socket.IO entre processos
+CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'flask-socketio')
+# Janela para agrupar publicações no broker (0 publica cada emit na hora)
+BATCH_WINDOW = float(os.getenv('SOCKETIO_BATCH_WINDOW_MS', 5)) / 1000
+BATCH_MAX = int(os.getenv('SOCKETIO_BATCH_MAX', 100))
+
+
+class BatchingMixin:
+    """
+    Agrupa as publicações de um manager pub/sub e mede o fan-out.
+
+    Os emits para salas que chegam dentro da janela são publicados em um
+    único envelope {'method': 'batch', 'messages': [...]}, na ordem em que
+    foram feitos, e cada nó expande o envelope ao receber. O envelope leva a
+    hora da publicação, usada para medir a latência do fan-out entre nós.
+    """
+
+    def _init_batching(self, window=BATCH_WINDOW, max_batch=BATCH_MAX):
+        self.batch_window = window
+        self.batch_max = max_batch
+        self.fanout = LatencyStats()
+        self.published = 0
+        self.batches = 0
+        self.received = 0
+
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flusher = None
+
+    def _publish(self, data):
+        # Callbacks e mensagens de controle (salas, desconexão) não esperam a janela, mas
+        # saem no mesmo envelope e depois dos emits já agrupados: um emit seguido de
+        # leave_room/disconnect chega aos outros nós nessa ordem
+        if self.batch_window <= 0 or data.get('method') != 'emit' or data.get('callback'):
+            with self._flush_lock:
+                with self._pending_lock:
+                    pending, self._pending = self._pending, []
+                self._send(pending + [data])
+            return
+
+        with self._pending_lock:
+            self._pending.append(data)
+            full = len(self._pending) >= self.batch_max
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._flush_forever, name='socketio-batch', daemon=True)
+                self._flusher.start()
+
+        if full:
+            self.flush()
+        else:
+            self._wakeup.set()
+
+    def _flush_forever(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.batch_window)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Publica imediatamente tudo o que estiver na janela."""
+        # _flush_lock mantém a ordem entre o flush da thread e o de um lote cheio
+        with self._flush_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, []
+            if pending:
+                self._send(pending)
+
+    def _send(self, messages):
+        envelope = {'method': 'batch', 'messages': messages, 'sent_at': time.time()}
+        start = time.perf_counter()
+        ok = False
+        try:
+            self._publish_envelope(envelope)
+            ok = True
+        finally:
+            self.fanout.record('publish', time.perf_counter() - start, ok)
+        with self._pending_lock:
+            self.published += len(messages)
+            self.batches += 1
+
+    def _listen(self):
+        for message in self._receive():
+            if not isinstance(message, dict):
+                try:
+                    message = json.loads(message)
+                except (TypeError, ValueError):
+                    continue
+
+            if message.get('method') != 'batch':
+                yield message
+                continue
+
+            self.fanout.record('deliver', max(time.time() - message.get('sent_at', time.time()), 0.0), True)
+            self.received += len(message['messages'])
+            yield from message['messages']
+
+    def stats(self):
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {
+            'manager': self.name,
+            'channel': self.channel,
+            'batch_window_ms': self.batch_window * 1000,
+            'batch_max': self.batch_max,
+            'pending': pending,
+            'published': self.published,
+            'batches': self.batches,
+            'received': self.received,
+            'latency': self.fanout.snapshot(),
+        }
+
+
+class KafkaManager(BatchingMixin, socketio.KafkaManager):
+    """Fan-out pelo Kafka: cada nó consome o tópico inteiro (sem group_id)."""
+
+    def __init__(self, url, channel=CHANNEL, write_only=False, window=BATCH_WINDOW, max_batch=BATCH_MAX):
+        super().__init__(url, channel=channel, write_only=write_only)
+        self._init_batching(window, max_batch)
+
+    def _publish_envelope(self, envelope):
+        # Um flush por lote em vez de um flush por emit
+        self.producer.send(self.channel, value=json.dumps(envelope).encode())
+        self.producer.flush()
+
+    def _receive(self):
+        yield from socketio.KafkaManager._listen(self)
+
+
+class MemoryManager(BatchingMixin, socketio.PubSubManager):
+    """
+    Substituto em memória do broker, para testes e benchmarks.
+
+    Todos os managers do mesmo processo e canal recebem as publicações uns
+    dos outros, como vários workers ligados ao mesmo tópico do Kafka.
+    """
+
+    name = 'memory'
+    _subscribers = {}  # canal -> filas dos managers inscritos
+    _subscribers_lock = threading.Lock()
+
+    def __init__(self, url='memory://', channel=CHANNEL, write_only=False, window=BATCH_WINDOW, max_batch=BATCH_MAX):
+        super().__init__(channel=channel, write_only=write_only)
+        self._init_batching(window, max_batch)
+        self._queue = queue.Queue()
+        if not write_only:
+            with self._subscribers_lock:
+                self._subscribers.setdefault(self.channel, []).append(self._queue)
+
+    def _publish_envelope(self, envelope):
+        # Serializa como faria um broker real: nenhum nó compartilha objetos
+        payload = json.dumps(envelope)
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers.get(self.channel, []))
+        for subscriber in subscribers:
+            subscriber.put(payload)
+
+    def _receive(self):
+        while True:
+            yield self._queue.get()
+
+
+def client_manager(url, **kwargs):
+    """Cria o manager para SOCKETIO_MESSAGE_QUEUE ('kafka://host:porta' ou 'memory://')."""
+    if url.startswith('kafka://'):
+        return KafkaManager(url, **kwargs)
+    if url.startswith('memory://'):
+        return MemoryManager(url, **kwargs)
+    raise ValueError(f'SOCKETIO_MESSAGE_QUEUE inválida: {url}')
@@ -0,0 +1,136 @@
+import json
+import os
+import queue
+import threading
+
+import stomp
+
+
+# Configuração padrão da publicação direta no ActiveMQ via STOMP
+POOL_SIZE = int(os.getenv('STOMP_POOL_SIZE', 4))
+HEARTBEATS = int(os.getenv('STOMP_HEARTBEAT_MS', 10000))
+CONNECT_TIMEOUT = float(os.getenv('STOMP_CONNECT_TIMEOUT', 2))
+ACQUIRE_TIMEOUT = float(os.getenv('STOMP_ACQUIRE_TIMEOUT', 1))
+RECONNECT_ATTEMPTS = int(os.getenv('STOMP_RECONNECT_ATTEMPTS', 3))
+
+
+class BrokerUnavailable(Exception):
+    """Não foi possível publicar a mensagem no broker."""
+
+
+def destination_for(msg_type, name):
+    # QUEUE -> /queue/<LinkQueue.name> e TOPIC -> /topic/<MessageTopic.name>
+    if msg_type == 'QUEUE':
+        return f'/queue/{name}'
+    return f'/topic/{name}'
+
+
+class StompPublisher:
+    """
+    Publica mensagens direto no ActiveMQ usando conexões STOMP persistentes.
+
+    Cada processo (worker) mantém o seu próprio pool de até pool_size
+    conexões, criadas sob demanda e reaproveitadas entre requisições. As
+    conexões usam heartbeats e são recriadas quando o broker cai.
+    """
+
+    def __init__(self, host, port, username=None, password=None, pool_size=POOL_SIZE,
+                 heartbeats=HEARTBEATS, connect_timeout=CONNECT_TIMEOUT,
+                 acquire_timeout=ACQUIRE_TIMEOUT, reconnect_attempts=RECONNECT_ATTEMPTS):
+        self.host_and_ports = [(host, int(port))]
+        self.username = username
+        self.password = password
+        self.pool_size = pool_size
+        self.heartbeats = (heartbeats, heartbeats)
+        self.connect_timeout = connect_timeout
+        self.acquire_timeout = acquire_timeout
+        self.reconnect_attempts = reconnect_attempts
+        self._reset()
+
+    def _reset(self):
+        # Depois de um fork as conexões do processo pai não podem ser usadas
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+
+    def _connect(self):
+        conn = stomp.Connection(
+            self.host_and_ports,
+            heartbeats=self.heartbeats,
+            reconnect_attempts_max=self.reconnect_attempts,
+            timeout=self.connect_timeout,
+        )
+        conn.connect(self.username, self.password, wait=True)
+        return conn
+
+    def _acquire(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise BrokerUnavailable('Nenhuma conexão STOMP livre, tente novamente.')
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+
+        try:
+            if conn is None or not conn.is_connected():
+                conn = self._connect()
+        except Exception as e:
+            self._slots.release()
+            raise BrokerUnavailable(f'Falha ao conectar no broker STOMP: {e}')
+
+        return conn
+
+    def _release(self, conn, broken=False):
+        if broken:
+            self._disconnect(conn)
+        else:
+            self._idle.put(conn)
+        self._slots.release()
+
+    @staticmethod
+    def _disconnect(conn):
+        try:
+            conn.disconnect()
+        except Exception:
+            pass
+
+    def publish(self, msg_type, name, username, message, extra=None):
+        """
+        Publica uma mensagem na fila ou tópico do chat.
+
+        username e message vão como headers (propriedades JMS), no mesmo
+        formato usado pelos produtores Java, e o corpo leva o payload em JSON.
+        """
+        destination = destination_for(msg_type, name)
+        payload = dict(extra or {}, name=name, username=username, message=message, type=msg_type)
+        body = json.dumps(payload)
+        headers = {'username': username, 'message': message, 'persistent': 'true'}
+        if payload.get('idempotencyKey'):
+            headers['idempotency_key'] = payload['idempotencyKey']
+        if payload.get('trace'):
+            headers['trace'] = payload['trace']
+
+        # Uma segunda tentativa com conexão nova cobre conexões derrubadas pelo broker
+        for attempt in range(2):
+            conn = self._acquire()
+            try:
+                conn.send(destination=destination, body=body,
+                          content_type='application/json', headers=headers)
+            except Exception as e:
+                self._release(conn, broken=True)
+                if attempt == 1:
+                    raise BrokerUnavailable(f'Falha ao publicar no broker STOMP: {e}')
+            else:
+                self._release(conn)
+                return
+
+    def close(self):
+        while True:
+            try:
+                self._disconnect(self._idle.get_nowait())
+            except queue.Empty:
+                break
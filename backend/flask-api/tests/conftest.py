@@ -0,0 +1,11 @@
+"""
+Testes dos clientes de serviços externos (serviço Java, broker STOMP), contra servidores locais.
+
+    pip install -r requirements-dev.txt
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+# Os módulos da API ficam na raiz de flask-api (sem pacote)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,196 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+import urllib3.connection
+import urllib3.exceptions
+
+from java_client import CircuitBreaker, CircuitOpenError, JavaClient, JavaServiceBusy
+
+
+class StubService:
+    """Serviço Java simulado: /ok responde 200, /fail 500 e /slow demora `delay` segundos."""
+
+    def __init__(self):
+        self.hits = {}
+        self.delay = 0.5
+        self.lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                with stub.lock:
+                    stub.hits[self.path] = stub.hits.get(self.path, 0) + 1
+                if self.path == '/slow':
+                    time.sleep(stub.delay)
+                status = 500 if self.path == '/fail' else 200
+                body = b'{"status": "ok"}'
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    service = StubService()
+    yield service
+    service.close()
+
+
+def make_client(url, **kwargs):
+    breaker = CircuitBreaker(failure_threshold=kwargs.pop('failure_threshold', 2),
+                             reset_timeout=kwargs.pop('reset_timeout', 0.2))
+    kwargs.setdefault('connect_timeout', 0.5)
+    kwargs.setdefault('read_timeout', 0.2)
+    kwargs.setdefault('acquire_timeout', 0.1)
+    return JavaClient(url, breaker=breaker, **kwargs)
+
+
+def test_read_timeout_is_not_retried(stub):
+    client = make_client(stub.url, connect_retries=2)
+
+    # Com read=0 no Retry o urllib3 desiste na hora e o requests devolve ConnectionError
+    with pytest.raises(requests.exceptions.ConnectionError) as error:
+        client.post('/slow', json={})
+    assert isinstance(error.value.args[0].reason, urllib3.exceptions.ReadTimeoutError)
+
+    # Só falhas de conexão são repetidas: a requisição lenta chegou uma única vez
+    assert stub.hits['/slow'] == 1
+    assert client.stats.snapshot()['/slow']['errors'] == 1
+
+
+def test_server_error_is_not_retried(stub):
+    client = make_client(stub.url, connect_retries=2, failure_threshold=5)
+
+    assert client.post('/fail', json={}).status_code == 500
+    assert stub.hits['/fail'] == 1
+
+
+def test_connection_errors_are_retried(monkeypatch):
+    attempts = []
+    new_conn = urllib3.connection.HTTPConnection._new_conn
+
+    def counting_new_conn(self):
+        attempts.append(self.port)
+        return new_conn(self)
+
+    monkeypatch.setattr(urllib3.connection.HTTPConnection, '_new_conn', counting_new_conn)
+
+    # Porta sem ninguém escutando: conexão recusada
+    server = ThreadingHTTPServer(('127.0.0.1', 0), BaseHTTPRequestHandler)
+    port = server.server_port
+    server.server_close()
+
+    client = make_client(f'http://127.0.0.1:{port}', connect_retries=2)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.post('/send_message', json={})
+
+    assert len(attempts) == 3
+
+
+def test_breaker_opens_after_consecutive_failures(stub):
+    client = make_client(stub.url, failure_threshold=2, reset_timeout=60)
+
+    client.post('/fail', json={})
+    client.post('/fail', json={})
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    # Aberto: falha rápida, sem chamar o serviço
+    with pytest.raises(CircuitOpenError):
+        client.post('/ok', json={})
+    assert '/ok' not in stub.hits
+
+
+def test_half_open_probe_success_closes_breaker(stub):
+    client = make_client(stub.url, failure_threshold=1, reset_timeout=0.1)
+
+    client.post('/fail', json={})
+    assert client.breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.15)
+
+    assert client.post('/ok', json={}).status_code == 200
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    assert client.breaker.failures == 0
+
+
+def test_half_open_probe_failure_reopens_breaker(stub):
+    client = make_client(stub.url, failure_threshold=1, reset_timeout=0.1)
+
+    client.post('/fail', json={})
+    time.sleep(0.15)
+
+    client.post('/fail', json={})
+    assert client.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        client.post('/ok', json={})
+
+
+def test_half_open_allows_a_single_probe(stub):
+    stub.delay = 0.3
+    client = make_client(stub.url, failure_threshold=1, reset_timeout=0.1, read_timeout=1, max_concurrency=5)
+
+    client.post('/fail', json={})
+    time.sleep(0.15)
+
+    probe = threading.Thread(target=client.post, args=('/slow',), kwargs={'json': {}})
+    probe.start()
+    time.sleep(0.1)
+    # Com a chamada de teste em andamento, as demais continuam falhando rápido
+    with pytest.raises(CircuitOpenError):
+        client.post('/ok', json={})
+    probe.join()
+
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_concurrency_cap_rejects_when_all_slots_are_busy(stub):
+    stub.delay = 0.4
+    client = make_client(stub.url, max_concurrency=1, read_timeout=1)
+
+    busy = threading.Thread(target=client.post, args=('/slow',), kwargs={'json': {}})
+    busy.start()
+    time.sleep(0.1)
+    with pytest.raises(JavaServiceBusy):
+        client.post('/ok', json={})
+    busy.join()
+
+    # Vaga liberada: a chamada seguinte passa
+    assert client.post('/ok', json={}).status_code == 200
+
+
+def test_busy_slot_does_not_leave_breaker_half_open(stub):
+    client = make_client(stub.url, max_concurrency=1, failure_threshold=1, reset_timeout=0.1)
+
+    client.post('/fail', json={})
+    time.sleep(0.15)
+
+    # reset_timeout passou, mas a única vaga está ocupada: a chamada de teste não roda
+    client._slots.acquire()
+    with pytest.raises(JavaServiceBusy):
+        client.post('/ok', json={})
+    assert client.breaker.state == CircuitBreaker.OPEN
+    client._slots.release()
+
+    # Com a vaga livre a chamada de teste acontece e fecha o circuito
+    assert client.post('/ok', json={}).status_code == 200
+    assert client.breaker.state == CircuitBreaker.CLOSED
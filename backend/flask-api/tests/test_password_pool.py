@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from password_pool import PasswordPool, PasswordPoolBusy
+
+
+def slow(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def pool():
+    pool = PasswordPool(method='pbkdf2:sha256:1000', workers=1, max_pending=2, timeout=0.2)
+    yield pool
+    pool._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def test_hash_and_check(pool):
+    pwhash = pool.hash_password('segredo')
+    assert pool.check_password(pwhash, 'segredo')
+    assert not pool.check_password(pwhash, 'outra')
+    assert wait_until(lambda: pool.status()['pending'] == 0)
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes(pool):
+    with pytest.raises(PasswordPoolBusy):
+        pool._run('slow', slow, 1)
+
+    # O job continua rodando no pool: a vaga segue ocupada
+    assert pool.status()['pending'] == 1
+
+    # Com o limite (2) atingido pelos jobs que ainda rodam, o próximo é recusado
+    with pytest.raises(PasswordPoolBusy):
+        pool._run('slow', slow, 1)
+    assert pool.status()['pending'] == 2
+    with pytest.raises(PasswordPoolBusy, match='Muitas requisições'):
+        pool.hash_password('segredo')
+
+    # Com os jobs terminados, as vagas voltam
+    assert wait_until(lambda: pool.status()['pending'] == 0)
+    assert pool._run('slow', slow, 0) == 0
+
@@ -0,0 +1,183 @@
+import json
+import socket
+import socketserver
+import threading
+import time
+
+import pytest
+
+from stomp_publisher import BrokerUnavailable, StompPublisher
+
+
+def parse_frame(raw):
+    lines = raw.decode('utf-8').split('\n')
+    command = lines[0]
+    headers = {}
+    index = 1
+    while index < len(lines) and lines[index]:
+        key, _, value = lines[index].partition(':')
+        headers.setdefault(key, value)
+        index += 1
+    return command, headers, '\n'.join(lines[index + 1:])
+
+
+def build_frame(command, headers=None):
+    head = ''.join(f'{key}:{value}\n' for key, value in (headers or {}).items())
+    return f'{command}\n{head}\n'.encode('utf-8') + b'\x00'
+
+
+class FakeBroker:
+    """
+    Broker STOMP mínimo em memória: responde CONNECT, guarda os SEND e
+    confirma os receipts. drop() derruba as conexões abertas.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._sockets = []
+
+        broker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                with broker.lock:
+                    broker.connections += 1
+                    broker._sockets.append(self.request)
+                buffer = b''
+                while True:
+                    try:
+                        chunk = self.request.recv(4096)
+                    except OSError:
+                        return
+                    if not chunk:
+                        return
+                    buffer += chunk
+                    while b'\x00' in buffer:
+                        raw, buffer = buffer.split(b'\x00', 1)
+                        raw = raw.lstrip(b'\r\n')  # heartbeats e quebras entre frames
+                        if raw and not broker.handle_frame(self.request, *parse_frame(raw)):
+                            return
+
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def handle_frame(self, sock, command, headers, body):
+        if command in ('CONNECT', 'STOMP'):
+            sock.sendall(build_frame('CONNECTED', {'version': '1.2', 'heart-beat': '0,0'}))
+        elif command == 'SEND':
+            with self.lock:
+                self.sent.append((headers['destination'], headers, body))
+        if 'receipt' in headers:
+            sock.sendall(build_frame('RECEIPT', {'receipt-id': headers['receipt']}))
+        return command != 'DISCONNECT'
+
+    def drop(self):
+        with self.lock:
+            sockets, self._sockets = self._sockets, []
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def close(self):
+        self.drop()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def broker():
+    fake = FakeBroker()
+    yield fake
+    fake.close()
+
+
+def make_publisher(port, **kwargs):
+    kwargs.setdefault('heartbeats', 0)
+    kwargs.setdefault('connect_timeout', 1)
+    kwargs.setdefault('acquire_timeout', 0.1)
+    kwargs.setdefault('reconnect_attempts', 1)
+    return StompPublisher('127.0.0.1', port, **kwargs)
+
+
+def wait_until(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_publish_sends_frame_to_chat_destination(broker):
+    publisher = make_publisher(broker.port)
+    try:
+        publisher.publish('QUEUE', 'chat-1', 'ALICE', 'oi', extra={'idempotencyKey': 'k1', 'trace': 't1'})
+        publisher.publish('TOPIC', 'grupo', 'ALICE', 'olá')
+        assert wait_until(lambda: len(broker.sent) == 2)
+    finally:
+        publisher.close()
+
+    (queue_dest, headers, body), (topic_dest, _, _) = broker.sent
+    assert queue_dest == '/queue/chat-1'
+    assert topic_dest == '/topic/grupo'
+    assert headers['username'] == 'ALICE'
+    assert headers['idempotency_key'] == 'k1'
+    assert headers['trace'] == 't1'
+    assert json.loads(body)['message'] == 'oi'
+
+    # A conexão do pool foi reaproveitada entre as publicações
+    assert broker.connections == 1
+
+
+def test_publish_reconnects_after_dropped_connection(broker):
+    publisher = make_publisher(broker.port, pool_size=1)
+    try:
+        publisher.publish('QUEUE', 'chat-1', 'ALICE', 'antes')
+        assert wait_until(lambda: len(broker.sent) == 1)
+        conn = publisher._idle.queue[0]
+
+        broker.drop()
+        assert wait_until(lambda: not conn.is_connected())
+
+        publisher.publish('QUEUE', 'chat-1', 'ALICE', 'depois')
+        assert wait_until(lambda: len(broker.sent) == 2)
+    finally:
+        publisher.close()
+
+    assert json.loads(broker.sent[1][2])['message'] == 'depois'
+    assert broker.connections == 2
+
+
+def test_pool_exhaustion_raises_broker_unavailable(broker):
+    publisher = make_publisher(broker.port, pool_size=1)
+    try:
+        # A única conexão do pool está em uso
+        conn = publisher._acquire()
+        with pytest.raises(BrokerUnavailable):
+            publisher.publish('QUEUE', 'chat-1', 'ALICE', 'oi')
+        publisher._release(conn)
+
+        # Conexão devolvida: a publicação seguinte passa
+        publisher.publish('QUEUE', 'chat-1', 'ALICE', 'oi')
+        assert wait_until(lambda: len(broker.sent) == 1)
+    finally:
+        publisher.close()
+
+
+def test_unreachable_broker_raises_broker_unavailable(broker):
+    port = broker.port
+    broker.close()
+
+    publisher = make_publisher(port)
+    with pytest.raises(BrokerUnavailable):
+        publisher.publish('QUEUE', 'chat-1', 'ALICE', 'oi')
+
+    # A vaga do pool é devolvida mesmo com a falha de conexão
+    assert publisher._slots.acquire(timeout=0)
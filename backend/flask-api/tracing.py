@@ -0,0 +1,190 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+
+import requests
+
+from metrics import registry
+
+
+# Configuração padrão do rastreamento das mensagens (envio -> entrega no socket)
+ENABLED = os.getenv('TRACE_ENABLED', '1') == '1'
+# Fração das mensagens rastreadas (as demais seguem sem o campo trace)
+SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 1))
+# Destinos dos spans (formato JSON do Zipkin v2); sem nenhum, só os histogramas do /metrics
+EXPORT_FILE = os.getenv('TRACE_EXPORT_FILE')
+COLLECTOR_URL = os.getenv('TRACE_COLLECTOR_URL')  # ex.: http://127.0.0.1:9411/api/v2/spans
+SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'flask-api')
+# Spans aguardando exportação; com a fila cheia os novos são descartados
+QUEUE_SIZE = int(os.getenv('TRACE_QUEUE_SIZE', 10000))
+BATCH_SIZE = int(os.getenv('TRACE_BATCH_SIZE', 200))
+
+hop_duration = registry.histogram(
+    'message_hop_duration_seconds',
+    'Tempo de cada trecho de uma mensagem: send_message, outbox, publish, broker e emit.', ('hop',))
+delivery_duration = registry.histogram(
+    'message_delivery_seconds', 'Do send_message até o emit na sala (mensagens rastreadas).')
+
+
+def _micros(at):
+    return int(at * 1_000_000)
+
+
+def start_trace(now=None):
+    """
+    Contexto de uma nova mensagem: '<trace_id>-<enviada em µs>' ou None.
+
+    O contexto é uma string para atravessar o serviço Java e o broker como
+    uma propriedade JMS (ou header STOMP) qualquer.
+    """
+    if not ENABLED or (SAMPLE_RATE < 1 and random.random() >= SAMPLE_RATE):
+        return None
+    return f'{uuid.uuid4().hex}-{_micros(time.time() if now is None else now)}'
+
+
+def mark_published(trace, now=None):
+    """Acrescenta ao contexto o instante em que o relay começou a publicar."""
+    return f'{trace}-{_micros(time.time() if now is None else now)}'
+
+
+def parse(trace):
+    """Lê o contexto recebido; None se ausente ou malformado."""
+    if not trace or not isinstance(trace, str):
+        return None
+    parts = trace.split('-')
+    if len(parts) not in (2, 3) or len(parts[0]) != 32:
+        return None
+    try:
+        int(parts[0], 16)
+        stamps = [int(part) / 1_000_000 for part in parts[1:]]
+    except ValueError:
+        return None
+    return {'trace_id': parts[0], 'sent_at': stamps[0],
+            'published_at': stamps[1] if len(stamps) > 1 else None}
+
+
+def record(context, hop, start, end=None, **tags):
+    """Registra um trecho da mensagem no histograma e, se configurado, como span."""
+    end = time.time() if end is None else end
+    # Trechos entre processos usam o relógio de cada máquina: diferenças negativas viram 0
+    duration = max(end - start, 0.0)
+    hop_duration.observe((hop,), duration)
+    exporter.export(context['trace_id'], hop, start, duration, tags, parent=True)
+
+
+def record_delivery(context, arrived_at, **tags):
+    """Fecha o rastro: trecho 'emit' (chegada -> sala) e o span raiz da mensagem."""
+    now = time.time()
+    record(context, 'emit', arrived_at, now)
+    duration = max(now - context['sent_at'], 0.0)
+    delivery_duration.observe((), duration)
+    exporter.export(context['trace_id'], 'message', context['sent_at'], duration, tags, parent=False)
+
+
+class SpanExporter:
+    """
+    Exporta spans no formato JSON do Zipkin v2, fora do caminho da mensagem.
+
+    export() só enfileira; uma thread por processo junta lotes de até
+    batch_size spans e grava uma linha JSON por span no arquivo e/ou envia
+    o lote ao coletor (Zipkin, ou o receptor zipkin de um OpenTelemetry
+    Collector). Os spans de uma mensagem têm como pai o span 'message',
+    cujo id é derivado do trace_id, então processos diferentes (API, relay)
+    montam o mesmo rastro sem trocar ids.
+    """
+
+    def __init__(self, path=EXPORT_FILE, url=COLLECTOR_URL, service=SERVICE_NAME,
+                 queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE):
+        self.path = path
+        self.url = url
+        self.service = service
+        self.batch_size = batch_size
+        self.enabled = bool(path or url)
+
+        self._queue = queue.Queue(queue_size)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._http = None
+
+        self.exported = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def export(self, trace_id, name, start, duration, tags, parent):
+        if not self.enabled:
+            return
+        span = {
+            'traceId': trace_id,
+            'id': trace_id[:16] if not parent else uuid.uuid4().hex[:16],
+            'name': name,
+            'timestamp': _micros(start),
+            'duration': max(_micros(duration), 1),
+            'localEndpoint': {'serviceName': self.service},
+        }
+        if parent:
+            span['parentId'] = trace_id[:16]
+        if tags:
+            span['tags'] = {key: str(value) for key, value in tags.items()}
+
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_thread(self):
+        # Uma thread por processo; recriada em processos filhos (fork)
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._export_forever, name='span-exporter', daemon=True)
+                self._thread.start()
+
+    def _export_forever(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+                self.exported += len(batch)
+            except Exception as e:
+                self.errors += 1
+                print(f'Erro ao exportar {len(batch)} spans: {e}')
+
+    def _write(self, batch):
+        if self.path:
+            # Uma escrita por lote: processos diferentes podem dividir o mesmo arquivo
+            with open(self.path, 'a', encoding='utf-8') as output:
+                output.write(''.join(json.dumps(span) + '\n' for span in batch))
+        if self.url:
+            if self._http is None:
+                self._http = requests.Session()
+            self._http.post(self.url, json=batch, timeout=5).raise_for_status()
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'queued': self._queue.qsize(),
+            'exported': self.exported,
+            'dropped': self.dropped,
+            'errors': self.errors,
+        }
+
+
+exporter = SpanExporter()
+
+registry.value('trace_spans_exported_total', 'counter', 'Spans exportados para o arquivo ou coletor.',
+               lambda: exporter.exported)
+registry.value('trace_spans_dropped_total', 'counter', 'Spans descartados com a fila de exportação cheia.',
+               lambda: exporter.dropped)
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+# Configuração padrão do cache de resoluções (usuário, amizade e chat)
+MAX_SIZE = int(os.getenv('RESOLVE_CACHE_SIZE', 10000))
+TTL = float(os.getenv('RESOLVE_CACHE_TTL', 60))
+
+
+class TTLCache:
+    """
+    Cache LRU com tempo de expiração (TTL) e contadores de hit/miss.
+
+    O cache é local ao processo: alterações feitas em outro worker só são
+    vistas aqui depois que a entrada expira, por isso o TTL deve ser curto.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, maxsize=MAX_SIZE, ttl=TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, self._MISSING)
+            if entry is self._MISSING or entry[0] < time.monotonic():
+                if entry is not self._MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def add(self, key, value=True):
+        """Guarda key se ainda não estiver no cache; retorna False se já estava."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] >= time.monotonic():
+                return False
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return True
+
+    def get_or_load(self, key, loader):
+        """Retorna o valor em cache ou chama loader(); None não é guardado."""
+        value = self.get(key, self._MISSING)
+        if value is self._MISSING:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        # Remove todas as entradas cuja chave satisfaz predicate(chave)
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,69 @@
+from datetime import datetime, timezone
+
+try:
+    import msgpack
+except ImportError:  # Opcional: sem o pacote só há JSON
+    msgpack = None
+
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+
+def columnar(payload):
+    """
+    Troca as listas de dicts do primeiro nível por colunas.
+
+    {'messages': [{'id': 1, 'message': 'a'}, {'id': 2, 'message': 'b'}]}
+    vira {'messages': {'id': [1, 2], 'message': ['a', 'b']}}: os nomes dos
+    campos vão uma vez por lista em vez de uma vez por linha. Campos
+    ausentes em alguma linha ficam None naquela posição; listas vazias e
+    outros valores ficam como estão.
+    """
+    if not isinstance(payload, dict):
+        return payload
+
+    result = {}
+    for key, value in payload.items():
+        if value and isinstance(value, list) and all(isinstance(row, dict) for row in value):
+            columns = {}
+            for row in value:
+                for column in row:
+                    columns.setdefault(column, None)
+            value = {column: [row.get(column) for row in value] for column in columns}
+        result[key] = value
+    return result
+
+
+def _default(value):
+    # Datas do banco vêm sem fuso (UTC, como no JSON); vão como timestamp do msgpack
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return msgpack.Timestamp.from_datetime(value)
+    raise TypeError(f'Tipo não serializável em msgpack: {type(value).__name__}')
+
+
+def pack(payload):
+    """Serializa o payload em msgpack, com as listas de linhas em colunas."""
+    return msgpack.packb(columnar(payload), default=_default)
+
+
+def msgpack_packet_class():
+    """
+    Serializador msgpack para o Socket.IO (o cliente usa socket.io-msgpack-parser).
+
+    Os argumentos dos eventos passam por columnar(): um 'new_messages' leva
+    {'messages': {'username': [...], 'message': [...]}}.
+    """
+    from socketio.msgpack_packet import MsgPackPacket
+
+    # encode() próprio em vez de MsgPackPacket.configure(), que só existe a partir
+    # do python-socketio 5.12: assim funciona com qualquer 5.x
+    class ColumnarMsgPackPacket(MsgPackPacket):
+        def encode(self):
+            packet = self._to_dict()
+            if isinstance(packet.get('data'), list):
+                packet['data'] = [columnar(arg) for arg in packet['data']]
+            return msgpack.packb(packet, default=_default)
+
+    return ColumnarMsgPackPacket
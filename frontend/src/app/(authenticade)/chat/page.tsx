@@ -2,7 +2,7 @@
 
 import ThemeSwitcher from "@/components/my/theme-switch";
 import { SendHorizontal } from "lucide-react";
-import { useEffect, useState } from "react";
+import { useCallback, useEffect, useRef, useState } from "react";
 import {
   Sidebar,
   SidebarContent,
@@ -27,8 +27,9 @@ import {
 import { Avatar, AvatarFallback } from "@radix-ui/react-avatar";
 import { AvatarImage } from "@/components/ui/avatar";
 import { ScrollArea } from "@/components/ui/scroll-area";
-import { fetchDataPost } from "@/controler/controler";
+import { fetchDataGet, fetchDataPost } from "@/controler/controler";
 import { io, Socket } from "socket.io-client";
+import { linhas, socketOptions } from "@/controler/wire";
 
 interface Message {
   id: number;
@@ -64,6 +65,10 @@ export default function Chat() {
     status: "",
   });
   const [inputValue, setInputValue] = useState("");
+  // Cursor para buscar mensagens mais antigas (null quando não há mais páginas)
+  const [nextCursor, setNextCursor] = useState<number | null>(null);
+  const [carregando, setCarregando] = useState(false);
+  const topoRef = useRef<HTMLDivElement>(null);
 
   useEffect(() => {
     const storedMessages = localStorage.getItem("messages");
@@ -76,10 +81,10 @@ export default function Chat() {
 
   useEffect(() => {
     if (dest && sessao && chat) {
-      const newSocket = io("http://192.168.0.110:5000");
+      const newSocket = io("http://192.168.0.110:5000", socketOptions);
 
       // Conecta e entra na sala
-      newSocket.emit("join", { room: chat, username: sessao.username });
+      newSocket.emit("join", { room: chat, username: sessao.username, type });
 
       // Configura o listener para novas mensagens
       newSocket.on("new_message", (data: Message) => {
@@ -89,6 +94,15 @@ export default function Chat() {
         }));
       });
 
+      // Lote de mensagens agrupadas pelo servidor: uma única renderização por lote
+      // (com msgpack o lote chega em colunas)
+      newSocket.on("new_messages", (data: { messages: Message[] }) => {
+        setConversa((prevConversa) => ({
+          ...prevConversa,
+          messages: [...prevConversa.messages, ...linhas(data.messages)],
+        }));
+      });
+
       setSocket(newSocket);
 
       // Cleanup: sair da sala e desconectar
@@ -97,7 +111,51 @@ export default function Chat() {
         newSocket.disconnect();
       };
     }
-  }, [dest, sessao, chat]);
+  }, [dest, sessao, chat, type]);
+
+  const carregaAnteriores = useCallback(async () => {
+    if (nextCursor === null || carregando || !sessao || !dest) return;
+
+    setCarregando(true);
+    try {
+      const params = {
+        type: type,
+        ...(type === "QUEUE" ? { friend: dest } : { name: dest }),
+        id_user: sessao.id_user,
+        username: sessao.username,
+        chat: chat,
+        before_id: nextCursor,
+      };
+
+      const response = await fetchDataGet("/load_messages", params);
+      const anteriores: Message[] = response?.data?.messages || [];
+
+      setConversa((prevConversa) => ({
+        ...prevConversa,
+        messages: [...anteriores, ...prevConversa.messages],
+      }));
+      setNextCursor(response?.data?.next_cursor ?? null);
+    } catch (error) {
+      console.error("Erro ao carregar mensagens anteriores:", error);
+    } finally {
+      setCarregando(false);
+    }
+  }, [nextCursor, carregando, sessao, dest, type, chat]);
+
+  // Carrega a página anterior quando o topo da conversa fica visível
+  useEffect(() => {
+    const topo = topoRef.current;
+    if (!topo || nextCursor === null) return;
+
+    const observer = new IntersectionObserver((entries) => {
+      if (entries[0].isIntersecting) {
+        carregaAnteriores();
+      }
+    });
+    observer.observe(topo);
+
+    return () => observer.disconnect();
+  }, [nextCursor, carregaAnteriores]);
 
   const handleSendMessage = async (e: React.FormEvent<HTMLFormElement>) => {
     e.preventDefault();
@@ -149,6 +207,7 @@ export default function Chat() {
             session: sessao || { id_user: "", username: "" },
             status: response?.data?.status || "",
           });
+          setNextCursor(response?.data?.next_cursor ?? null);
           setChat(response?.data?.session.chat || "");
         })
         .catch((error) => {
@@ -232,6 +291,11 @@ export default function Chat() {
         </header>
         <main className="bg-muted w-full h-[84vh]">
           <ScrollArea className="w-full h-[84vh] rounded-md border p-4">
+            {nextCursor !== null && (
+              <div ref={topoRef} className="text-center text-muted-foreground py-2">
+                {carregando ? "Carregando..." : ""}
+              </div>
+            )}
             {conversa.messages.length > 0 ? (
               conversa.messages.map((item) => (
                 <div
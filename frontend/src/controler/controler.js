@@ -1,15 +1,25 @@
 import axios from "axios";
+import { decodificaMsgpack, usaMsgpack } from "./wire";
 
 const host = process.env.NEXT_PUBLIC_HOST_API;
 const port = process.env.NEXT_PUBLIC_PORT_API;
 
-export async function fetchDataGet(rota){
+export async function fetchDataGet(rota, params) {
   try {
+    // GET deixa o navegador revalidar com If-None-Match (304 reaproveita o corpo em cache)
     const response = await axios.get(
-      `http://${host}:${port}${rota}`
+      `http://${host}:${port}${rota}`,
+      usaMsgpack
+        ? {
+            params,
+            headers: { Accept: "application/msgpack" },
+            responseType: "arraybuffer",
+            transformResponse: (dados) => decodificaMsgpack(dados),
+          }
+        : { params }
     );
 
-    return {response};
+    return response;
   } catch (error) {
     console.error("Erro ao obter os dados:", error);
   }
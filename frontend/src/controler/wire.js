@@ -0,0 +1,34 @@
+import { decode } from "@msgpack/msgpack";
+import msgpackParser from "socket.io-msgpack-parser";
+
+// Formato binário opcional (NEXT_PUBLIC_WIRE_FORMAT=msgpack). Para o socket o
+// servidor precisa rodar com SOCKETIO_SERIALIZER=msgpack.
+export const usaMsgpack = process.env.NEXT_PUBLIC_WIRE_FORMAT === "msgpack";
+
+// Opções do io(): com msgpack os pacotes usam o mesmo parser do servidor
+export const socketOptions = usaMsgpack ? { parser: msgpackParser } : {};
+
+// Volta as colunas ({id: [...], message: [...]}) para uma lista de linhas
+export function linhas(valor) {
+  if (!valor || Array.isArray(valor)) return valor || [];
+
+  const colunas = Object.keys(valor);
+  const total = colunas.length ? valor[colunas[0]].length : 0;
+  return Array.from({ length: total }, (_, i) =>
+    Object.fromEntries(colunas.map((coluna) => [coluna, valor[coluna][i]]))
+  );
+}
+
+// Corpo msgpack de uma resposta: listas de linhas chegam em colunas
+export function decodificaMsgpack(buffer) {
+  const dados = decode(new Uint8Array(buffer));
+  return Object.fromEntries(
+    Object.entries(dados).map(([chave, valor]) => [
+      chave,
+      valor && typeof valor === "object" && !Array.isArray(valor) && !(valor instanceof Date) &&
+      Object.values(valor).every(Array.isArray) && Object.keys(valor).length
+        ? linhas(valor)
+        : valor,
+    ])
+  );
+}